@@ -5,3 +5,5 @@
 from blenderproc.python.camera.CameraValidation import perform_obstacle_in_view_check, visible_objects, \
     scene_coverage_score, decrease_interest_score, check_novel_pose
 from blenderproc.python.camera.LensDistortionUtility import set_lens_distortion, set_camera_parameters_from_config_file
+from blenderproc.python.camera.CameraPoseSampling import sample_valid_poses, ProximityCheck, VisibilityCheck, \
+    CoverageCheck, NoveltyCheck
@@ -1,7 +1,7 @@
 from blenderproc.python.loader.AMASSLoader import load_AMASS
 from blenderproc.python.loader.BlendLoader import load_blend
 from blenderproc.python.loader.BopLoader import load_bop_objs, load_bop_scene, load_bop_intrinsics
-from blenderproc.python.loader.CCMaterialLoader import load_ccmaterials
+from blenderproc.python.loader.CCMaterialLoader import load_ccmaterials, fill_lazy_materials
 from blenderproc.python.loader.Front3DLoader import load_front3d
 from blenderproc.python.loader.HavenMaterialLoader import load_haven_mat
 from blenderproc.python.loader.IKEALoader import load_ikea
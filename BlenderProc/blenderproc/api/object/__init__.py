@@ -2,9 +2,11 @@
 from blenderproc.python.object.ObjectPoseSampler import sample_poses
 from blenderproc.python.object.ObjectMerging import merge_objects
 from blenderproc.python.object.ObjectReplacer import replace_objects
-from blenderproc.python.object.OnSurfaceSampler import sample_poses_on_surface
+from blenderproc.python.object.OnSurfaceSampler import sample_poses_on_surface, sample_poses_on_surface_batched
 from blenderproc.python.object.PhysicsSimulation import simulate_physics_and_fix_final_poses, simulate_physics
 from blenderproc.python.types.MeshObjectUtility import get_all_mesh_objects, convert_to_meshes, \
     create_from_blender_mesh, create_with_empty_mesh, create_primitive, disable_all_rigid_bodies, \
-    create_bvh_tree_multi_objects, compute_poi, scene_ray_cast
-from blenderproc.python.types.EntityUtility import create_empty, delete_multiple, convert_to_entities
+    create_bvh_tree_multi_objects, compute_poi, scene_ray_cast, bvh_ray_cast_batch, \
+    BatchedRayCaster, get_bound_boxes
+from blenderproc.python.types.EntityUtility import create_empty, delete_multiple, convert_to_entities, \
+    get_local2world_mats
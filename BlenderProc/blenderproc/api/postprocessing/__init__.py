@@ -2,3 +2,4 @@
     remove_segmap_noise, trim_redundant_channels, depth2dist, add_kinect_azure_noise, add_gaussian_shifts
 from blenderproc.python.postprocessing.StereoGlobalMatching import stereo_global_matching
 from blenderproc.python.camera.LensDistortionUtility import apply_lens_distortion
+from blenderproc.python.postprocessing.PostProcessingPipeline import PostProcessingPipeline
@@ -2,3 +2,6 @@
 from blenderproc.python.writer.BopWriterUtility import write_bop
 from blenderproc.python.writer.CocoWriterUtility import write_coco_annotations
 from blenderproc.python.writer.WriterUtility import write_hdf5
+from blenderproc.python.writer.Hdf5StreamWriter import Hdf5StreamWriter
+from blenderproc.python.writer.ShardWriterUtility import write_shards, compact_shards
+from blenderproc.python.writer.Hdf5Reader import Hdf5Reader, Hdf5Frame, read_shard_index
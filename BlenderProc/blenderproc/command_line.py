@@ -28,6 +28,10 @@ def cli():
         "extract": {
             'hdf5': "Extracts images out of an hdf5 file into separate image files."
         },
+        "benchmark": {
+            'hdf5': "Compares the size and speed of different compression settings on .hdf5 files.",
+            'postprocessing': "Measures the speed of the segmap noise removal and the oil paint filter."
+        },
         "download": {
             'blenderkit': "Downloads materials and models from blenderkit.",
             'cc_textures': "Downloads textures from cc0textures.com.",
@@ -68,6 +72,9 @@ def cli():
     parser_extract = subparsers.add_parser('extract', help="Extract the raw images from generated containers such "
                                                            "as hdf5. \nOptions: {', '.join(options['extract'])}",
                                            formatter_class=argparse.RawTextHelpFormatter)
+    parser_benchmark = subparsers.add_parser('benchmark', help=f"Benchmark the storage of generated containers. "
+                                                               f"\nOptions: {', '.join(options['benchmark'])}",
+                                             formatter_class=argparse.RawTextHelpFormatter)
     parser_pip = subparsers.add_parser('pip', help="Can be used to install/uninstall pip packages in the Blender "
                                                    "python environment. \nOptions: {', '.join(options['pip'])}",
                                        formatter_class=argparse.RawTextHelpFormatter)
@@ -84,6 +91,10 @@ def cli():
     for cmd, help_str in options['extract'].items():
         sub_parser_extract.add_parser(cmd, help=help_str, add_help=False)
 
+    sub_parser_benchmark = parser_benchmark.add_subparsers(dest='benchmark_mode')
+    for cmd, help_str in options['benchmark'].items():
+        sub_parser_benchmark.add_parser(cmd, help=help_str, add_help=False)
+
     parser_pip.add_argument('pip_mode', choices=options['pip'],
                             help='\n'.join(f"{key}: {value}" for key, value in options["pip"].items()))
     parser_pip.add_argument('pip_packages', metavar='pip_packages', nargs='*',
@@ -218,7 +229,7 @@ def handle_sigterm(_signum, _frame):
 
         sys.exit(p.returncode)
     # Import the required entry point
-    elif args.mode in ["vis", "extract", "download"]:
+    elif args.mode in ["vis", "extract", "download", "benchmark"]:
         # pylint: disable=import-outside-toplevel
         if args.mode == "vis" and args.vis_mode == "hdf5":
             from blenderproc.scripts.visHdf5Files import cli as current_cli
@@ -226,6 +237,10 @@ def handle_sigterm(_signum, _frame):
             from blenderproc.scripts.vis_coco_annotation import cli as current_cli
         elif args.mode == "extract" and args.extract_mode == "hdf5":
             from blenderproc.scripts.saveAsImg import cli as current_cli
+        elif args.mode == "benchmark" and args.benchmark_mode == "hdf5":
+            from blenderproc.scripts.benchmark_hdf5_compression import cli as current_cli
+        elif args.mode == "benchmark" and args.benchmark_mode == "postprocessing":
+            from blenderproc.scripts.benchmark_postprocessing import cli as current_cli
         elif args.mode == "download" and args.download_mode == "blenderkit":
             from blenderproc.scripts.download_blenderkit import cli as current_cli
         elif args.mode == "download" and args.download_mode == "cc_textures":
@@ -0,0 +1,261 @@
+"""Samples camera poses in batches and validates them against a list of checks."""
+
+from collections import defaultdict
+from typing import Callable, List, Optional, Union, Tuple, Dict, Any
+
+import numpy as np
+from mathutils import Matrix
+from mathutils.bvhtree import BVHTree
+
+from blenderproc.python.camera.CameraUtility import add_camera_pose
+from blenderproc.python.camera.CameraValidation import perform_obstacle_in_view_check, visible_objects, \
+    scene_coverage_score
+from blenderproc.python.types.MeshObjectUtility import MeshObject, BatchedRayCaster
+
+
+def sample_valid_poses(n: int, proposal_fn: Callable[[int], np.ndarray],
+                       checks: Optional[List[Callable[[np.ndarray], np.ndarray]]] = None, batch: int = 256,
+                       max_tries: int = 10000, add_poses: bool = True) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """ Samples camera poses in batches, until n of them are valid.
+
+    In each iteration `proposal_fn` proposes a batch of candidate poses, which are validated by all checks. A check
+    gets the cam2world matrices of the candidates, which passed all previous checks, and returns which of them are
+    valid. Checks which depend on the already accepted poses, like the NoveltyCheck, have an `add_pose()` method.
+    They are evaluated last and candidate by candidate, each accepted pose is added to them.
+
+    .. code-block:: python
+
+        def propose(amount):
+            locations = np.random.uniform([-1, -1, 1], [1, 1, 2], size=(amount, 3))
+            return np.stack([bproc.math.build_transformation_mat(
+                location, bproc.camera.rotation_from_forward_vec(poi - location)) for location in locations])
+
+        poses, stats = bproc.camera.sample_valid_poses(10, propose, [
+            bproc.camera.ProximityCheck({"min": 0.4}, bvh_tree),
+            bproc.camera.NoveltyCheck()
+        ])
+
+    :param n: The number of valid poses to sample.
+    :param proposal_fn: A function, which gets the number of poses to propose and returns their cam2world matrices
+                        of shape [amount, 4, 4].
+    :param checks: The checks every pose has to pass.
+    :param batch: The number of poses proposed at once.
+    :param max_tries: The maximum number of poses, which are proposed.
+    :param add_poses: If True, the valid poses are added as camera poses to the scene.
+    :return: The valid cam2world matrices of shape [<=n, 4, 4] and the acceptance statistics, which contain the
+             number of proposed and accepted poses, the acceptance rate and how many poses each check rejected.
+    """
+    if checks is None:
+        checks = []
+    if batch < 1:
+        raise ValueError("The batch size has to be at least one.")
+    # checks which depend on the accepted poses have to be evaluated one candidate after another
+    batch_checks = [check for check in checks if not hasattr(check, "add_pose")]
+    sequential_checks = [check for check in checks if hasattr(check, "add_pose")]
+
+    accepted_poses: List[np.ndarray] = []
+    rejected_by: Dict[str, int] = defaultdict(int)
+    proposed = 0
+    while len(accepted_poses) < n and proposed < max_tries:
+        candidates = np.asarray(proposal_fn(min(batch, max_tries - proposed)), dtype=np.float64).reshape(-1, 4, 4)
+        if len(candidates) == 0:
+            break
+        proposed += len(candidates)
+
+        valid = np.ones(len(candidates), dtype=bool)
+        for check in batch_checks:
+            candidate_indices = np.flatnonzero(valid)
+            if len(candidate_indices) == 0:
+                break
+            passed = np.asarray(check(candidates[candidate_indices]), dtype=bool)
+            rejected_by[_SampleValidPoses.check_name(check)] += int(np.sum(~passed))
+            valid[candidate_indices[~passed]] = False
+
+        for candidate in candidates[valid]:
+            if len(accepted_poses) >= n:
+                break
+            for check in sequential_checks:
+                if not check(candidate[np.newaxis])[0]:
+                    rejected_by[_SampleValidPoses.check_name(check)] += 1
+                    break
+            else:
+                accepted_poses.append(candidate)
+                for check in sequential_checks:
+                    check.add_pose(candidate)
+
+    if add_poses:
+        for pose in accepted_poses:
+            add_camera_pose(pose)
+
+    stats = {
+        "proposed": proposed,
+        "accepted": len(accepted_poses),
+        "acceptance_rate": len(accepted_poses) / proposed if proposed > 0 else 0.0,
+        "rejected_by": dict(rejected_by)
+    }
+    print(f"Sampled {len(accepted_poses)} of {n} camera poses from {proposed} proposals "
+          f"(acceptance rate {stats['acceptance_rate']:.3f}, rejected by: {stats['rejected_by']})")
+    return np.array(accepted_poses).reshape(-1, 4, 4), stats
+
+
+class ProximityCheck:
+    """ Checks that obstacles in front of the camera are not too close or too far away, see
+    perform_obstacle_in_view_check(). """
+
+    def __init__(self, proximity_checks: dict, bvh_tree: Union[BVHTree, BatchedRayCaster],
+                 sqrt_number_of_rays: int = 10):
+        """
+        :param proximity_checks: The thresholds, e.g. {"min": 0.4}, see perform_obstacle_in_view_check().
+        :param bvh_tree: A bvh tree or a BatchedRayCaster containing all objects that should be considered here.
+        :param sqrt_number_of_rays: The square root of the number of rays sent per pose.
+        """
+        self.proximity_checks = proximity_checks
+        self.bvh_tree = bvh_tree
+        self.sqrt_number_of_rays = sqrt_number_of_rays
+
+    def __call__(self, cam2world_matrices: np.ndarray) -> np.ndarray:
+        return np.array([perform_obstacle_in_view_check(cam2world_matrix, self.proximity_checks, self.bvh_tree,
+                                                        self.sqrt_number_of_rays)
+                         for cam2world_matrix in cam2world_matrices], dtype=bool)
+
+
+class VisibilityCheck:
+    """ Checks that all given objects are visible from the camera. """
+
+    def __init__(self, objects: List[MeshObject], ray_caster: Optional[BatchedRayCaster] = None,
+                 sqrt_number_of_rays: int = 10):
+        """
+        :param objects: The objects which have to be hit by at least one ray each.
+        :param ray_caster: The ray caster to use. If None, the rays are cast onto the whole scene.
+        :param sqrt_number_of_rays: The square root of the number of rays sent per pose.
+        """
+        self.objects = objects
+        self.ray_caster = ray_caster
+        self.sqrt_number_of_rays = sqrt_number_of_rays
+
+    def __call__(self, cam2world_matrices: np.ndarray) -> np.ndarray:
+        valid = []
+        for cam2world_matrix in cam2world_matrices:
+            visible = visible_objects(cam2world_matrix, self.sqrt_number_of_rays, self.ray_caster)
+            valid.append(all(obj in visible for obj in self.objects))
+        return np.array(valid, dtype=bool)
+
+
+class CoverageCheck:
+    """ Checks that the scene coverage score of the view is high enough, see scene_coverage_score(). """
+
+    def __init__(self, min_score: float, special_objects: Optional[list] = None, special_objects_weight: float = 2,
+                 ray_caster: Optional[BatchedRayCaster] = None, sqrt_number_of_rays: int = 10):
+        """
+        :param min_score: The minimum scene coverage score of a valid pose.
+        :param special_objects: Objects that weights differently in calculating the score.
+        :param special_objects_weight: Weighting factor for more special objects.
+        :param ray_caster: The ray caster to use. If None, the rays are cast onto the whole scene.
+        :param sqrt_number_of_rays: The square root of the number of rays sent per pose.
+        """
+        self.min_score = min_score
+        self.special_objects = special_objects
+        self.special_objects_weight = special_objects_weight
+        self.ray_caster = ray_caster
+        self.sqrt_number_of_rays = sqrt_number_of_rays
+
+    def __call__(self, cam2world_matrices: np.ndarray) -> np.ndarray:
+        return np.array([scene_coverage_score(cam2world_matrix, self.special_objects, self.special_objects_weight,
+                                              self.sqrt_number_of_rays, self.ray_caster) >= self.min_score
+                         for cam2world_matrix in cam2world_matrices], dtype=bool)
+
+
+class NoveltyCheck:
+    """
+    Checks that a pose increases the variance of the rotations and/or translations of all accepted poses, see
+    check_novel_pose().
+
+    Instead of recomputing the variance over all accepted poses for each candidate, the sums of the values and
+    their squares are updated, when a pose is accepted.
+    """
+
+    def __init__(self, check_rotation: bool = True, check_translation: bool = True, min_var_diff_rot: float = -1,
+                 min_var_diff_translation: float = -1, existing_poses: Optional[List[np.ndarray]] = None):
+        """
+        :param check_rotation: Checks that a new pose is novel with respect to the rotation component.
+        :param check_translation: Checks that a new pose is novel with respect to the translation component.
+        :param min_var_diff_rot: Considers a pose novel if it increases the variance of the rotation component of
+                                 all poses by this parameter's value in percentage. If set to -1, then it would only
+                                 check that the variance is increased.
+        :param min_var_diff_translation: Same as min_var_diff_rot but for translation.
+        :param existing_poses: Poses which have been accepted before.
+        """
+        self.check_rotation = check_rotation
+        self.check_translation = check_translation
+        self.min_var_diff_rot = min_var_diff_rot
+        self.min_var_diff_translation = min_var_diff_translation
+        # number of values, their sum and the sum of their squares for rotations and translations
+        self._sums = np.zeros((2, 3))
+        if existing_poses is not None:
+            for pose in existing_poses:
+                self.add_pose(pose)
+
+    @staticmethod
+    def _components(cam2world_matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Returns the euler angles and the translation of the given pose.
+
+        :param cam2world_matrix: The cam2world matrix.
+        :return: The euler angles and the translation.
+        """
+        cam2world_matrix = Matrix(cam2world_matrix)
+        return np.array(cam2world_matrix.to_euler()), np.array(cam2world_matrix.to_translation())
+
+    @staticmethod
+    def _increases_variance(sums: np.ndarray, values: np.ndarray, diff_threshold: float) -> bool:
+        """ Checks whether adding the values increases the variance sufficiently.
+
+        :param sums: The number of values, their sum and the sum of their squares.
+        :param values: The new values.
+        :param diff_threshold: The minimum increase of the variance in percentage.
+        :return: True, if the variance is increased sufficiently.
+        """
+        count, total, total_sq = sums
+        old_var = np.float64(total_sq / count - (total / count) ** 2)
+        count, total, total_sq = count + len(values), total + np.sum(values), total_sq + np.sum(values ** 2)
+        var = np.float64(total_sq / count - (total / count) ** 2)
+        if var < old_var:
+            return False
+        with np.errstate(divide="ignore", invalid="ignore"):
+            diff = ((var - old_var) / old_var) * 100.0
+        return not diff < diff_threshold
+
+    def __call__(self, cam2world_matrices: np.ndarray) -> np.ndarray:
+        valid = []
+        for cam2world_matrix in cam2world_matrices:
+            is_novel = True
+            # First pose is always novel
+            if self._sums[0, 0] > 0:
+                rotation, translation = NoveltyCheck._components(cam2world_matrix)
+                if self.check_rotation and not NoveltyCheck._increases_variance(self._sums[0], rotation,
+                                                                                self.min_var_diff_rot):
+                    is_novel = False
+                elif self.check_translation and not NoveltyCheck._increases_variance(
+                        self._sums[1], translation, self.min_var_diff_translation):
+                    is_novel = False
+            valid.append(is_novel)
+        return np.array(valid, dtype=bool)
+
+    def add_pose(self, cam2world_matrix: np.ndarray):
+        """ Adds an accepted pose.
+
+        :param cam2world_matrix: The cam2world matrix of the accepted pose.
+        """
+        for i, values in enumerate(NoveltyCheck._components(cam2world_matrix)):
+            self._sums[i] += [len(values), np.sum(values), np.sum(values ** 2)]
+
+
+class _SampleValidPoses:
+
+    @staticmethod
+    def check_name(check: Callable) -> str:
+        """ Returns the name of the given check, which is used in the acceptance statistics.
+
+        :param check: The check function or object.
+        :return: The name of the function or class.
+        """
+        return getattr(check, "__name__", type(check).__name__)
@@ -2,7 +2,7 @@
 
 import numbers
 import sys
-from typing import Union, List, Set
+from typing import Union, List, Set, Optional, Tuple
 from collections import defaultdict
 
 import bpy
@@ -10,11 +10,11 @@
 from mathutils import Matrix
 from mathutils.bvhtree import BVHTree
 
-from blenderproc.python.types.MeshObjectUtility import MeshObject
+from blenderproc.python.types.MeshObjectUtility import MeshObject, BatchedRayCaster, bvh_ray_cast_batch
 
 
 def perform_obstacle_in_view_check(cam2world_matrix: Union[Matrix, np.ndarray], proximity_checks: dict,
-                                   bvh_tree: BVHTree, sqrt_number_of_rays: int = 10) -> bool:
+                                   bvh_tree: Union[BVHTree, BatchedRayCaster], sqrt_number_of_rays: int = 10) -> bool:
     """ Check if there are obstacles in front of the camera which are too far or too close based on the given
         proximity_checks.
 
@@ -24,7 +24,7 @@ def perform_obstacle_in_view_check(cam2world_matrix: Union[Matrix, np.ndarray],
                              threshold in case of max or min. The operators are combined in conjunction
                              (i.e boolean AND). This can also be used to avoid the background in images, with the
                              no_background: True option.
-    :param bvh_tree: A bvh tree containing all objects that should be considered here.
+    :param bvh_tree: A bvh tree or a BatchedRayCaster containing all objects that should be considered here.
     :param sqrt_number_of_rays: The square root of the number of rays which will be used to determine the
                                 visible objects.
     :return: True, if the given camera pose does not violate any of the specified proximity_checks.
@@ -32,22 +32,6 @@ def perform_obstacle_in_view_check(cam2world_matrix: Union[Matrix, np.ndarray],
     if not proximity_checks:  # if no checks are in the settings all positions are accepted
         return True
 
-    cam2world_matrix = Matrix(cam2world_matrix)
-
-    cam_ob = bpy.context.scene.camera
-    cam = cam_ob.data
-    # Get position of the corners of the near plane
-    frame = cam.view_frame(scene=bpy.context.scene)
-    # Bring to world space
-    frame = [cam2world_matrix @ v for v in frame]
-
-    # Compute vectors along both sides of the plane
-    vec_x = frame[1] - frame[0]
-    vec_y = frame[3] - frame[0]
-
-    sum_value = 0.0
-    sum_sq = 0.0
-
     range_distance = sys.float_info.max
 
     # Input validation
@@ -75,45 +59,34 @@ def perform_obstacle_in_view_check(cam2world_matrix: Union[Matrix, np.ndarray],
         # when no background is on, it can not be combined with a reduced range distance
         no_range_distance = True
 
-    # Go in discrete grid-like steps over plane
-    position = cam2world_matrix.to_translation()
-    for x in range(0, sqrt_number_of_rays):
-        for y in range(0, sqrt_number_of_rays):
-            # Compute current point on plane
-            end = frame[0] + vec_x * x / float(sqrt_number_of_rays - 1) + vec_y * y / float(sqrt_number_of_rays - 1)
-            # Send ray from the camera position through the current point on the plane
-            if no_range_distance:
-                _, _, _, dist = bvh_tree.ray_cast(position, end - position)
-            else:
-                _, _, _, dist = bvh_tree.ray_cast(position, end - position, range_distance)
-
-            # Check if something was hit and how far it is away
-            if dist is not None:
-                if "min" in proximity_checks and dist <= proximity_checks["min"]:
-                    return False
-                if "max" in proximity_checks and dist >= proximity_checks["max"]:
-                    return False
-                if "avg" in proximity_checks:
-                    sum_value += dist
-                if "var" in proximity_checks:
-                    if not "avg" in proximity_checks:
-                        sum_value += dist
-                    sum_sq += dist * dist
-            elif "no_background" in proximity_checks and proximity_checks["no_background"]:
-                return False
-
+    # Send all rays from the camera position through a grid of points on the near plane at once
+    position, directions = _get_camera_rays(cam2world_matrix, sqrt_number_of_rays)
+    max_distance = None if no_range_distance else range_distance
+    if isinstance(bvh_tree, BatchedRayCaster):
+        distances, _, _ = bvh_tree.ray_cast(position, directions, max_distance)
+    else:
+        distances, _ = bvh_ray_cast_batch(bvh_tree, position, directions, max_distance)
+
+    # Check if something was hit and how far it is away
+    hit_distances = distances[np.isfinite(distances)]
+    if no_range_distance and len(hit_distances) < len(distances):
+        return False
+    if "min" in proximity_checks and np.any(hit_distances <= proximity_checks["min"]):
+        return False
+    if "max" in proximity_checks and np.any(hit_distances >= proximity_checks["max"]):
+        return False
+
+    # Rays which did not hit anything count as zero distance
+    avg = np.sum(hit_distances) / len(distances)
     if "avg" in proximity_checks:
-        avg = sum_value / (sqrt_number_of_rays * sqrt_number_of_rays)
         # Check that the average distance is not within the accepted interval
         if avg >= proximity_checks["avg"]["max"] or avg <= proximity_checks["avg"]["min"]:
             return False
 
     if "var" in proximity_checks:
-        if not "avg" in proximity_checks:
-            avg = sum_value / (sqrt_number_of_rays * sqrt_number_of_rays)
         sq_avg = avg * avg
 
-        avg_sq = sum_sq / (sqrt_number_of_rays * sqrt_number_of_rays)
+        avg_sq = np.sum(hit_distances * hit_distances) / len(distances)
 
         var = avg_sq - sq_avg
         # Check that the variance value of the distance is not within the accepted interval
@@ -123,7 +96,8 @@ def perform_obstacle_in_view_check(cam2world_matrix: Union[Matrix, np.ndarray],
     return True
 
 
-def visible_objects(cam2world_matrix: Union[Matrix, np.ndarray], sqrt_number_of_rays: int = 10) -> Set[MeshObject]:
+def visible_objects(cam2world_matrix: Union[Matrix, np.ndarray], sqrt_number_of_rays: int = 10,
+                    ray_caster: Optional[BatchedRayCaster] = None) -> Set[MeshObject]:
     """ Returns a set of objects visible from the given camera pose.
 
     Sends a grid of rays through the camera frame and returns all objects hit by at least one ray.
@@ -131,41 +105,23 @@ def visible_objects(cam2world_matrix: Union[Matrix, np.ndarray], sqrt_number_of_
     :param cam2world_matrix: The world matrix which describes the camera orientation to check.
     :param sqrt_number_of_rays: The square root of the number of rays which will be used to determine the
                                 visible objects.
+    :param ray_caster: The ray caster to use, when checking many poses of a static scene, a ray caster over the
+                       relevant objects is much faster. If None, the rays are cast onto the whole scene.
     :return: A set of objects visible hit by the sent rays.
     """
-    cam2world_matrix = Matrix(cam2world_matrix)
-
-    visible_objects_set = set()
-    cam_ob = bpy.context.scene.camera
-    cam = cam_ob.data
-
-    # Get position of the corners of the near plane
-    frame = cam.view_frame(scene=bpy.context.scene)
-    # Bring to world space
-    frame = [cam2world_matrix @ v for v in frame]
+    if ray_caster is None:
+        ray_caster = BatchedRayCaster()
 
-    # Compute vectors along both sides of the plane
-    vec_x = frame[1] - frame[0]
-    vec_y = frame[3] - frame[0]
+    # Send all rays from the camera position through a grid of points on the near plane at once
+    position, directions = _get_camera_rays(cam2world_matrix, sqrt_number_of_rays)
+    _, hits, object_ids = ray_caster.ray_cast(position, directions)
 
-    # Go in discrete grid-like steps over plane
-    position = cam2world_matrix.to_translation()
-    for x in range(0, sqrt_number_of_rays):
-        for y in range(0, sqrt_number_of_rays):
-            # Compute current point on plane
-            end = frame[0] + vec_x * x / float(sqrt_number_of_rays - 1) + vec_y * y / float(sqrt_number_of_rays - 1)
-            # Send ray from the camera position through the current point on the plane
-            _, _, _, _, hit_object, _ = bpy.context.scene.ray_cast(bpy.context.evaluated_depsgraph_get(),
-                                                                   position, end - position)
-            # Add hit object to set
-            if hit_object:
-                visible_objects_set.add(MeshObject(hit_object))
-
-    return visible_objects_set
+    return {ray_caster.objects[object_id] for object_id in np.unique(object_ids[hits])}
 
 
 def scene_coverage_score(cam2world_matrix: Union[Matrix, np.ndarray], special_objects: list = None,
-                         special_objects_weight: float = 2, sqrt_number_of_rays: int = 10) -> float:
+                         special_objects_weight: float = 2, sqrt_number_of_rays: int = 10,
+                         ray_caster: Optional[BatchedRayCaster] = None) -> float:
     """ Evaluate the interestingness/coverage of the scene.
 
     This module tries to look at as many objects at possible, this might lead to
@@ -181,64 +137,52 @@ def scene_coverage_score(cam2world_matrix: Union[Matrix, np.ndarray], special_ob
                                    scene is. Default: 2.0.
     :param sqrt_number_of_rays: The square root of the number of rays which will be used to determine the
                                 visible objects.
+    :param ray_caster: The ray caster to use, when checking many poses of a static scene, a ray caster over the
+                       relevant objects is much faster. If None, the rays are cast onto the whole scene.
     :return: the scoring of the scene.
     """
-    cam2world_matrix = Matrix(cam2world_matrix)
-
     if special_objects is None:
         special_objects = []
-    cam_ob = bpy.context.scene.camera
-    cam = cam_ob.data
+    if ray_caster is None:
+        ray_caster = BatchedRayCaster()
 
     num_of_rays = sqrt_number_of_rays * sqrt_number_of_rays
     score = 0.0
     objects_hit: defaultdict = defaultdict(int)
 
-    # Get position of the corners of the near plane
-    frame = cam.view_frame(scene=bpy.context.scene)
-    # Bring to world space
-    frame = [cam2world_matrix @ v for v in frame]
-
-    # Compute vectors along both sides of the plane
-    vec_x = frame[1] - frame[0]
-    vec_y = frame[3] - frame[0]
-
-    # Go in discrete grid-like steps over plane
-    position = cam2world_matrix.to_translation()
-    for x in range(0, sqrt_number_of_rays):
-        for y in range(0, sqrt_number_of_rays):
-            # Compute current point on plane
-            end = frame[0] + vec_x * x / float(sqrt_number_of_rays - 1) + vec_y * y / float(sqrt_number_of_rays - 1)
-            # Send ray from the camera position through the current point on the plane
-            hit, _, _, _, hit_object, _ = bpy.context.scene.ray_cast(bpy.context.evaluated_depsgraph_get(),
-                                                                     position, end - position)
-
-            if hit:
-                is_of_special_dataset = "is_suncg" in hit_object or "is_3d_front" in hit_object
-                is_suncg_object = "suncg_type" in hit_object and hit_object["suncg_type"] == "Object"
-                is_front_3d_object = "3D_future_type" in hit_object and hit_object["3D_future_type"] == "Object"
-                if is_of_special_dataset and is_suncg_object or is_of_special_dataset and is_front_3d_object:
-                    # calculate the score based on the type of the object,
-                    # wall, floor and ceiling objects have 0 score
-                    if "coarse_grained_class" in hit_object:
-                        object_class = hit_object["coarse_grained_class"]
-                        objects_hit[object_class] += 1
-                        if object_class in special_objects:
-                            score += special_objects_weight
-                        else:
-                            score += 1
-                    else:
-                        score += 1
-                elif "category_id" in hit_object:
-                    object_class = hit_object["category_id"]
-                    if object_class in special_objects:
-                        score += special_objects_weight
-                    else:
-                        score += 1
-                    objects_hit[object_class] += 1
+    # Send all rays from the camera position through a grid of points on the near plane at once
+    position, directions = _get_camera_rays(cam2world_matrix, sqrt_number_of_rays)
+    _, hits, object_ids = ray_caster.ray_cast(position, directions)
+
+    # Each hit object is only evaluated once, weighted by the number of rays hitting it
+    for object_id, hit_count in zip(*np.unique(object_ids[hits], return_counts=True)):
+        hit_object = ray_caster.objects[object_id].blender_obj
+        hit_count = int(hit_count)
+        is_of_special_dataset = "is_suncg" in hit_object or "is_3d_front" in hit_object
+        is_suncg_object = "suncg_type" in hit_object and hit_object["suncg_type"] == "Object"
+        is_front_3d_object = "3D_future_type" in hit_object and hit_object["3D_future_type"] == "Object"
+        if is_of_special_dataset and is_suncg_object or is_of_special_dataset and is_front_3d_object:
+            # calculate the score based on the type of the object,
+            # wall, floor and ceiling objects have 0 score
+            if "coarse_grained_class" in hit_object:
+                object_class = hit_object["coarse_grained_class"]
+                objects_hit[object_class] += hit_count
+                if object_class in special_objects:
+                    score += special_objects_weight * hit_count
                 else:
-                    objects_hit[hit_object] += 1
-                    score += 1
+                    score += hit_count
+            else:
+                score += hit_count
+        elif "category_id" in hit_object:
+            object_class = hit_object["category_id"]
+            if object_class in special_objects:
+                score += special_objects_weight * hit_count
+            else:
+                score += hit_count
+            objects_hit[object_class] += hit_count
+        else:
+            objects_hit[hit_object] += hit_count
+            score += hit_count
     # For a scene with three different objects, the starting variance is 1.0, increases/decreases by '1/3' for
     # each object more/less, excluding floor, ceiling and walls
     scene_variance = len(objects_hit) / 3.0
@@ -250,6 +194,28 @@ def scene_coverage_score(cam2world_matrix: Union[Matrix, np.ndarray], special_ob
     return score
 
 
+def _get_camera_rays(cam2world_matrix: Union[Matrix, np.ndarray],
+                     sqrt_number_of_rays: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ Computes the rays from the camera position through a grid of points on the near plane of the camera.
+
+    :param cam2world_matrix: The world matrix which describes the camera pose.
+    :param sqrt_number_of_rays: The square root of the number of rays.
+    :return: The camera position of shape [3] and the ray directions of shape [sqrt_number_of_rays ** 2, 3].
+    """
+    cam2world_matrix = np.array(Matrix(cam2world_matrix))
+
+    # Get position of the corners of the near plane and bring them to world space
+    frame = np.array([list(v) for v in bpy.context.scene.camera.data.view_frame(scene=bpy.context.scene)])
+    frame = frame @ cam2world_matrix[:3, :3].T + cam2world_matrix[:3, 3]
+
+    # Go in discrete grid-like steps over plane, the x steps are the outer ones
+    steps_x, steps_y = np.meshgrid(np.linspace(0, 1, sqrt_number_of_rays), np.linspace(0, 1, sqrt_number_of_rays),
+                                   indexing="ij")
+    ends = frame[0] + steps_x.reshape(-1, 1) * (frame[1] - frame[0]) + steps_y.reshape(-1, 1) * (frame[3] - frame[0])
+    position = cam2world_matrix[:3, 3]
+    return position, ends - position
+
+
 def decrease_interest_score(interest_score: float, min_interest_score: float, interest_score_step: float):
     """ Decreases the interest scores in the given interval
 
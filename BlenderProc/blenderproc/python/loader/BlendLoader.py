@@ -1,7 +1,7 @@
 """Loading the content of .blend files"""
 
 import re
-from typing import List, Union, Optional
+from typing import List, Union, Optional, Dict, Tuple, Any
 
 import bpy
 
@@ -11,7 +11,8 @@
 
 
 def load_blend(path: str, obj_types: Optional[Union[List[str], str]] = None, name_regrex: Optional[str] = None,
-               data_blocks: Union[List[str], str] = "objects", link: bool = False) -> List[Entity]:
+               data_blocks: Union[List[str], str] = "objects", link: bool = False,
+               use_cache: bool = False) -> List[Entity]:
     """
     Loads entities (everything that can be stored in a .blend file's folders, see Blender's documentation for
     bpy.types.ID for more info) that match a name pattern from a specified .blend file's section/data_block.
@@ -27,6 +28,13 @@ def load_blend(path: str, obj_types: Optional[Union[List[str], str]] = None, nam
                         Available options are: ['armatures', 'cameras', 'curves', 'hairs', 'images', 'lights',
                         'materials', 'meshes', 'objects', 'textures']
     :param link: whether to link instead of append data blocks from .blend file. Linked objects can not be modified.
+    :param use_cache: If True, the .blend file is only loaded the first time it is requested with the same
+                      parameters. The loaded data blocks are kept as hidden templates and each call returns new
+                      objects, which share their mesh data and materials with the template. Other data blocks like
+                      materials are not copied, instead the same data blocks are returned again. The templates are
+                      invalidated by bproc.clean_up(), the .blend file is then loaded again on the next call.
+                      As the mesh is shared, use MeshObject.make_mesh_single_user() before changing the mesh or the
+                      materials of only one of the returned objects.
     :return: The list of loaded mesh objects.
     """
     if obj_types is None:
@@ -38,6 +46,12 @@ def load_blend(path: str, obj_types: Optional[Union[List[str], str]] = None, nam
     obj_types = _BlendLoader.validate_and_standardizes_configured_list(obj_types, _BlendLoader.valid_object_types,
                                                                        "object type")
 
+    if use_cache:
+        cache_key = (path, tuple(obj_types), name_regrex, tuple(data_blocks), link)
+        templates = _BlendLoader.cached_templates.get(cache_key)
+        if templates is not None and _BlendLoader.are_templates_valid(templates):
+            return _BlendLoader.instantiate_templates(templates)
+
     # Remember which orphans existed beforehand
     orphans_before = collect_all_orphan_data_blocks()
 
@@ -71,20 +85,7 @@ def load_blend(path: str, obj_types: Optional[Union[List[str], str]] = None, nam
 
                     # If a camera was imported
                     if obj.type == 'CAMERA':
-                        # Make it the active camera in the scene
-                        bpy.context.scene.camera = obj
-
-                        # Find the maximum frame number of its key frames
-                        max_keyframe = -1
-                        if obj.animation_data is not None:
-                            fcurves = obj.animation_data.action.fcurves
-                            for curve in fcurves:
-                                keyframe_points = curve.keyframe_points
-                                for keyframe in keyframe_points:
-                                    max_keyframe = max(max_keyframe, keyframe.co[0])
-
-                        # Set frame_end to the next free keyframe
-                        bpy.context.scene.frame_end = max_keyframe + 1
+                        _BlendLoader.activate_camera(obj)
                 else:
                     # Remove object again if its type is not desired
                     bpy.data.objects.remove(obj, do_unlink=True)
@@ -95,14 +96,114 @@ def load_blend(path: str, obj_types: Optional[Union[List[str], str]] = None, nam
     # As some loaded objects were deleted again due to their type, we need also to remove the dependent
     # data blocks that were also loaded and are now orphans
     _BlendLoader.purge_added_orphans(orphans_before, data_to)
+
+    if use_cache:
+        templates = _BlendLoader.create_templates(loaded_objects)
+        _BlendLoader.cached_templates[cache_key] = templates
+        return _BlendLoader.instantiate_templates(templates)
     return loaded_objects
 
 
+def clear_blend_cache():
+    """ Forgets all templates cached by load_blend(use_cache=True).
+
+    This is done by bproc.clean_up() and the reset of blender, as the templates are removed from the scene there.
+    """
+    _BlendLoader.cached_templates.clear()
+
+
 class _BlendLoader:
     valid_data_blocks = [collection.lower() for collection in dir(bpy.data) if
                         isinstance(getattr(bpy.data, collection), bpy.types.bpy_prop_collection)]
     valid_object_types = ['mesh', 'curve', 'surface', 'meta', 'font', 'hair', 'pointcloud', 'volume', 'gpencil',
                           'armature', 'lattice', 'empty', 'light', 'light_probe', 'camera', 'speaker']
+    # Maps the parameters of load_blend() to the templates of all .blend files loaded with use_cache=True
+    cached_templates: Dict[Tuple, List[Tuple[bool, Any]]] = {}
+
+    @staticmethod
+    def activate_camera(obj: bpy.types.Object):
+        """ Makes the given camera object the active camera and extends the frame range to its key frames.
+
+        :param obj: The loaded camera object.
+        """
+        # Make it the active camera in the scene
+        bpy.context.scene.camera = obj
+
+        # Find the maximum frame number of its key frames
+        max_keyframe = -1
+        if obj.animation_data is not None:
+            fcurves = obj.animation_data.action.fcurves
+            for curve in fcurves:
+                keyframe_points = curve.keyframe_points
+                for keyframe in keyframe_points:
+                    max_keyframe = max(max_keyframe, keyframe.co[0])
+
+        # Set frame_end to the next free keyframe
+        bpy.context.scene.frame_end = max_keyframe + 1
+
+    @staticmethod
+    def create_templates(loaded_objects: List[Union[Entity, bpy.types.ID]]) -> List[Tuple[bool, Any]]:
+        """ Turns the freshly loaded data blocks into templates, which are kept hidden outside of the scene.
+
+        :param loaded_objects: The entities and data blocks returned by the uncached loading.
+        :return: The templates as a list of tuples, which contain whether the template is an object and the template
+                 data block itself.
+        """
+        templates = []
+        for loaded_object in loaded_objects:
+            if isinstance(loaded_object, Entity):
+                blender_obj = loaded_object.blender_obj
+                # Remove the template from the scene, the fake user makes sure it is not removed as orphan
+                blender_obj.use_fake_user = True
+                for collection in list(blender_obj.users_collection):
+                    collection.objects.unlink(blender_obj)
+                templates.append((True, blender_obj))
+            else:
+                loaded_object.use_fake_user = True
+                templates.append((False, loaded_object))
+        return templates
+
+    @staticmethod
+    def are_templates_valid(templates: List[Tuple[bool, Any]]) -> bool:
+        """ Checks whether all templates still exist, they are removed for example by bproc.clean_up().
+
+        :param templates: The templates of one .blend file.
+        :return: True, if all templates can still be used.
+        """
+        try:
+            for _, template in templates:
+                _ = template.name
+        except ReferenceError:
+            return False
+        return True
+
+    @staticmethod
+    def instantiate_templates(templates: List[Tuple[bool, Any]]) -> List[Union[Entity, bpy.types.ID]]:
+        """ Creates new objects from the given templates, which share the mesh data and materials of the templates.
+
+        :param templates: The templates of one .blend file.
+        :return: The new objects and the not copied other data blocks in the order of the templates.
+        """
+        copies = {}
+        loaded_objects = []
+        for is_object, template in templates:
+            if is_object:
+                # copy() only duplicates the object itself, the mesh and its materials are shared
+                blender_obj = template.copy()
+                blender_obj.use_fake_user = False
+                bpy.context.collection.objects.link(blender_obj)
+                copies[template] = blender_obj
+                if blender_obj.type == 'CAMERA':
+                    _BlendLoader.activate_camera(blender_obj)
+                loaded_objects.append(convert_to_entity_subclass(blender_obj))
+            else:
+                loaded_objects.append(template)
+
+        # Make sure the copies are parented to the copies and not to the templates of their parents
+        for template, blender_obj in copies.items():
+            if template.parent in copies:
+                blender_obj.parent = copies[template.parent]
+        return loaded_objects
 
     @staticmethod
     def validate_and_standardizes_configured_list(config_value: Union[list, str], allowed_elements: list,
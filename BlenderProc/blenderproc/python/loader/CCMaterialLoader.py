@@ -1,18 +1,24 @@
 """Offering to load the materials provided at ambientCG.com."""
 
 import os
-from typing import List
+import re
+import json
+import warnings
+from typing import List, Dict, Any, Optional, Tuple
 
 import bpy
+import cv2
 
 from blenderproc.python.material import MaterialLoaderUtility
+from blenderproc.python.renderer.RendererUtility import register_pre_render_hook
 from blenderproc.python.types.MaterialUtility import Material
 from blenderproc.python.utility.Utility import Utility, resolve_path
 
 
 def load_ccmaterials(folder_path: str = "resources/cctextures", used_assets: list = None, preload: bool = False,
                      fill_used_empty_materials: bool = False, add_custom_properties: dict = None,
-                     use_all_materials: bool = False) -> List[Material]:
+                     use_all_materials: bool = False, lazy: bool = False,
+                     texture_resolution: str = "2K") -> List[Material]:
     """ This method loads all textures obtained from https://ambientCG.com, use the script
     (scripts/download_cc_textures.py) to download all the textures to your pc.
 
@@ -20,6 +26,9 @@ def load_ccmaterials(folder_path: str = "resources/cctextures", used_assets: lis
 
     All materials will have the custom property "is_cc_texture": True, which will make the selection later on easier.
 
+    The content of the folder is read from an index file, which is created inside the folder on the first call and
+    recreated whenever assets are added or removed.
+
     :param folder_path: The path to the downloaded cc0textures.
     :param used_assets: A list of all asset names, you want to use. The asset-name must not be typed in completely,
                         only the beginning the name starts with. By default, all assets will be loaded,
@@ -29,6 +38,14 @@ def load_ccmaterials(folder_path: str = "resources/cctextures", used_assets: lis
     :param add_custom_properties:  A dictionary of materials and the respective properties.
     :param use_all_materials: If this is false only a selection of probably useful textures is used. This excludes \
                               some see through texture and non tileable texture.
+    :param lazy: If set true, the materials are only created as placeholders like with preload. Their textures are
+                 loaded automatically right before rendering and only for the materials, which are used by an object
+                 that is rendered. This replaces calling this function twice with preload and
+                 fill_used_empty_materials.
+    :param texture_resolution: The resolution of the texture maps, e.g. "1K", "2K" or "4K". If an asset does not
+                               provide this resolution, a downscaled copy of a higher resolution is created once and
+                               stored next to the original maps. If there is no higher resolution, the highest
+                               available one is used.
     :return a list of all loaded materials, if preload is active these materials do not contain any textures yet
             and have to be filled before rendering (by calling this function again, no need to save the prior
             returned list)
@@ -53,64 +70,261 @@ def load_ccmaterials(folder_path: str = "resources/cctextures", used_assets: lis
 
     if preload and fill_used_empty_materials:
         raise Exception("Preload and fill used empty materials can not be done at the same time, check config!")
+    if lazy and (preload or fill_used_empty_materials):
+        raise Exception("The lazy mode can not be combined with preload or fill used empty materials, check config!")
+    if lazy:
+        register_pre_render_hook(fill_lazy_materials)
 
     if os.path.exists(folder_path) and os.path.isdir(folder_path):
         materials = []
-        for asset in os.listdir(folder_path):
-            if used_assets:
-                skip_this_one = True
-                for used_asset in used_assets:
-                    # lower is necessary here, as all used assets are made that that way
-                    if asset.lower().startswith(used_asset.replace(" ", "")):
-                        skip_this_one = False
-                        break
-                if skip_this_one:
-                    continue
-            current_path = os.path.join(folder_path, asset)
-            if os.path.isdir(current_path):
-                base_image_path = os.path.join(current_path, f"{asset}_2K_Color.jpg")
-                if not os.path.exists(base_image_path):
-                    continue
-
-                # construct all image paths
-                ambient_occlusion_image_path = base_image_path.replace("Color", "AmbientOcclusion")
-                metallic_image_path = base_image_path.replace("Color", "Metalness")
-                roughness_image_path = base_image_path.replace("Color", "Roughness")
-                alpha_image_path = base_image_path.replace("Color", "Opacity")
-                normal_image_path = base_image_path.replace("Color", "Normal")
-                displacement_image_path = base_image_path.replace("Color", "Displacement")
-
-                # if the material was already created it only has to be searched
-                if fill_used_empty_materials:
-                    new_mat = MaterialLoaderUtility.find_cc_material_by_name(asset, add_custom_properties)
-                else:
-                    new_mat = MaterialLoaderUtility.create_new_cc_material(asset, add_custom_properties)
-
-                # if preload then the material is only created but not filled
-                if preload:
-                    # Set alpha to 0 if the material has an alpha texture, so it can be detected
-                    # e.q. in the material getter.
-                    nodes = new_mat.node_tree.nodes
-                    principled_bsdf = Utility.get_the_one_node_with_type(nodes, "BsdfPrincipled")
-                    principled_bsdf.inputs["Alpha"].default_value = 0 if os.path.exists(alpha_image_path) else 1
-                    # add it here for the preload case
-                    materials.append(Material(new_mat))
-                    continue
-                if fill_used_empty_materials and not MaterialLoaderUtility.is_material_used(new_mat):
-                    # now only the materials, which have been used should be filled
-                    continue
-
-                # create material based on these image paths
-                _CCMaterialLoader.create_material(new_mat, base_image_path, ambient_occlusion_image_path,
-                                                  metallic_image_path, roughness_image_path, alpha_image_path,
-                                                  normal_image_path, displacement_image_path)
+        # lower is necessary here, as all used assets are made that way
+        used_asset_prefixes = tuple(used_asset.replace(" ", "") for used_asset in used_assets) if used_assets \
+            else None
+        for asset, asset_info in _CCMaterialLoader.load_index(folder_path).items():
+            if used_asset_prefixes is not None and not asset.lower().startswith(used_asset_prefixes):
+                continue
+            determined_paths = _CCMaterialLoader.determine_image_paths(folder_path, asset, asset_info,
+                                                                       texture_resolution)
+            if determined_paths is None:
+                continue
+            image_paths, source_resolution = determined_paths
+
+            # if the material was already created it only has to be searched
+            if fill_used_empty_materials:
+                new_mat = MaterialLoaderUtility.find_cc_material_by_name(asset, add_custom_properties)
+            else:
+                new_mat = MaterialLoaderUtility.create_new_cc_material(asset, add_custom_properties)
 
+            # if preload then the material is only created but not filled
+            if preload or lazy:
+                # Set alpha to 0 if the material has an alpha texture, so it can be detected
+                # e.q. in the material getter.
+                nodes = new_mat.node_tree.nodes
+                principled_bsdf = Utility.get_the_one_node_with_type(nodes, "BsdfPrincipled")
+                principled_bsdf.inputs["Alpha"].default_value = 0 if image_paths["alpha_image_path"] else 1
+                if lazy:
+                    _CCMaterialLoader.lazy_materials.append((new_mat, image_paths, source_resolution,
+                                                             texture_resolution.upper()))
+                # add it here for the preload case
                 materials.append(Material(new_mat))
+                continue
+            if fill_used_empty_materials and not MaterialLoaderUtility.is_material_used(new_mat):
+                # now only the materials, which have been used should be filled
+                continue
+
+            # create material based on these image paths, the maps are only downscaled for filled materials
+            image_paths = _CCMaterialLoader.downscale_maps(image_paths, source_resolution, texture_resolution.upper())
+            _CCMaterialLoader.create_material(new_mat, **image_paths)
+
+            materials.append(Material(new_mat))
         return materials
     raise FileNotFoundError(f"The folder path does not exist: {folder_path}")
 
 
+def fill_lazy_materials():
+    """ Loads the textures of all materials loaded with lazy=True, which are used by an object that is rendered.
+
+    This is registered as pre render hook by load_ccmaterials(), so it is called automatically before rendering.
+    """
+    _CCMaterialLoader.fill_lazy_materials()
+
+
 class _CCMaterialLoader:
+    # Name of the index file, which is stored inside the cc textures folder
+    index_file_name = "blenderproc_cc_index.json"
+    # Version of the index format, an index with another version is rebuilt
+    index_version = 1
+    # The indices of all folders used in this process, they map the folder path to its modification time and index
+    loaded_indices: Dict[str, Tuple[float, Dict[str, Dict[str, Any]]]] = {}
+    # All materials loaded with lazy=True, whose textures have not been loaded yet, together with their image paths
+    # and the source and target resolution of the maps
+    lazy_materials: List[Tuple[bpy.types.Material, Dict[str, str], str, str]] = []
+    # Maps the keyword arguments of create_material() to the map type in the file names of ambientCG
+    map_types = {"base_image_path": "Color", "ambient_occlusion_image_path": "AmbientOcclusion",
+                 "metallic_image_path": "Metalness", "roughness_image_path": "Roughness",
+                 "alpha_image_path": "Opacity", "normal_image_path": "Normal",
+                 "displacement_image_path": "Displacement"}
+
+    @staticmethod
+    def load_index(folder_path: str) -> Dict[str, Dict[str, Any]]:
+        """ Returns the index of all assets in the given cc textures folder.
+
+        The index is stored in the folder itself and is only rebuilt, if the folder has been modified after the index
+        was written, which happens when an asset is added or removed.
+
+        :param folder_path: The path to the downloaded cc0textures.
+        :return: Maps each asset name to its category, the available resolutions and the file names of its maps
+                 per resolution.
+        """
+        folder_mtime = os.stat(folder_path).st_mtime
+        if folder_path in _CCMaterialLoader.loaded_indices:
+            mtime, index = _CCMaterialLoader.loaded_indices[folder_path]
+            if mtime == folder_mtime:
+                return index
+
+        index_path = os.path.join(folder_path, _CCMaterialLoader.index_file_name)
+        index = None
+        if os.path.exists(index_path) and os.stat(index_path).st_mtime >= folder_mtime:
+            try:
+                with open(index_path, "r", encoding="utf-8") as file:
+                    data = json.load(file)
+                if data["version"] == _CCMaterialLoader.index_version:
+                    index = data["assets"]
+            except (OSError, ValueError, KeyError):
+                index = None
+
+        if index is None:
+            index = _CCMaterialLoader.build_index(folder_path)
+            try:
+                temp_index_path = index_path + f".{os.getpid()}.tmp"
+                with open(temp_index_path, "w", encoding="utf-8") as file:
+                    json.dump({"version": _CCMaterialLoader.index_version, "assets": index}, file)
+                os.replace(temp_index_path, index_path)
+                # renaming modifies the folder, so the index has to be marked as newer than that afterwards
+                os.utime(index_path)
+                folder_mtime = os.stat(folder_path).st_mtime
+            except OSError:
+                print(f"Warning: The index of the cc textures could not be written to {index_path}")
+
+        _CCMaterialLoader.loaded_indices[folder_path] = (folder_mtime, index)
+        return index
+
+    @staticmethod
+    def build_index(folder_path: str) -> Dict[str, Dict[str, Any]]:
+        """ Scans the given cc textures folder once and collects all assets and their texture maps.
+
+        :param folder_path: The path to the downloaded cc0textures.
+        :return: Maps each asset name to its category, the available resolutions and the file names of its maps
+                 per resolution.
+        """
+        index = {}
+        for asset in sorted(os.listdir(folder_path)):
+            current_path = os.path.join(folder_path, asset)
+            if not os.path.isdir(current_path):
+                continue
+            map_pattern = re.compile(re.escape(asset) + r"_(\d+K)_([A-Za-z]+)\.(jpg|png)")
+            maps: Dict[str, Dict[str, str]] = {}
+            for file_name in sorted(os.listdir(current_path)):
+                match = map_pattern.fullmatch(file_name)
+                if match is not None:
+                    resolution, map_type, _ = match.groups()
+                    maps.setdefault(resolution, {}).setdefault(map_type, file_name)
+            index[asset] = {
+                # the category is the asset name without its running number, e.g. "woodfloor" for WoodFloor041
+                "category": re.sub(r"\d+$", "", asset).lower(),
+                "resolutions": sorted(maps.keys(), key=lambda resolution: int(resolution[:-1])),
+                "maps": maps
+            }
+        return index
+
+    @staticmethod
+    def determine_image_paths(folder_path: str, asset: str, asset_info: Dict[str, Any],
+                              texture_resolution: str) -> Optional[Tuple[Dict[str, str], str]]:
+        """ Determines the paths of all texture maps of the given asset, which are used for the requested
+        resolution. If the maps have to be downscaled, this is done later by downscale_maps(), so only maps of
+        materials, which are filled, are read.
+
+        :param folder_path: The path to the downloaded cc0textures.
+        :param asset: The name of the asset.
+        :param asset_info: The entry of the asset in the index.
+        :param texture_resolution: The requested resolution, e.g. "1K".
+        :return: The image paths of the source maps as keyword arguments for create_material(), maps which do not
+                 exist are set to an empty string, and the resolution of the source maps. None is returned, if the
+                 asset has no color map.
+        """
+        available_resolutions = [resolution for resolution in asset_info["resolutions"]
+                                 if "Color" in asset_info["maps"][resolution]]
+        if not available_resolutions:
+            return None
+        requested_size = int(texture_resolution.upper()[:-1])
+        if texture_resolution.upper() in available_resolutions:
+            source_resolution = texture_resolution.upper()
+        else:
+            # use the smallest higher resolution as source for downscaling, else the highest one
+            higher_resolutions = [resolution for resolution in available_resolutions
+                                  if int(resolution[:-1]) > requested_size]
+            source_resolution = higher_resolutions[0] if higher_resolutions else available_resolutions[-1]
+        maps = asset_info["maps"][source_resolution]
+
+        image_paths = {}
+        for key, map_type in _CCMaterialLoader.map_types.items():
+            if map_type not in maps:
+                image_paths[key] = ""
+                continue
+            image_paths[key] = os.path.join(folder_path, asset, maps[map_type])
+        return image_paths, source_resolution
+
+    @staticmethod
+    def downscale_maps(image_paths: Dict[str, str], source_resolution: str,
+                       target_resolution: str) -> Dict[str, str]:
+        """ Replaces the given maps by downscaled copies, if their resolution is higher than the requested one.
+
+        :param image_paths: The image paths as returned by determine_image_paths().
+        :param source_resolution: The resolution of the given maps, e.g. "2K".
+        :param target_resolution: The requested resolution, e.g. "1K".
+        :return: The image paths of the maps, which should be used.
+        """
+        if int(source_resolution[:-1]) <= int(target_resolution[:-1]):
+            return image_paths
+        return {key: _CCMaterialLoader.downscale_map(image_path, source_resolution, target_resolution)
+                if image_path else image_path for key, image_path in image_paths.items()}
+
+    @staticmethod
+    def downscale_map(image_path: str, source_resolution: str, target_resolution: str) -> str:
+        """ Returns a downscaled copy of the given texture map, which is created on the first request.
+
+        The copy is stored next to the original and named like ambientCG names its maps, e.g. Bricks059_1K_Color.jpg.
+
+        :param image_path: The path to the texture map.
+        :param source_resolution: The resolution of the given map, e.g. "2K".
+        :param target_resolution: The requested resolution, e.g. "1K".
+        :return: The path to the downscaled copy, or the given path, if the map can not be read.
+        """
+        folder, file_name = os.path.split(image_path)
+        downscaled_path = os.path.join(folder, file_name.replace(f"_{source_resolution}_", f"_{target_resolution}_", 1))
+        if not os.path.exists(downscaled_path):
+            image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+            if image is None:
+                warnings.warn(f"The texture map {image_path} could not be read, so it is used without downscaling.")
+                return image_path
+            scale = int(target_resolution[:-1]) / int(source_resolution[:-1])
+            new_size = (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale)))
+            image = cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
+            # other processes might downscale the same map at the same time, so the copy is moved in place at once
+            name, ending = os.path.splitext(downscaled_path)
+            temp_path = f"{name}.{os.getpid()}.tmp{ending}"
+            cv2.imwrite(temp_path, image)
+            os.replace(temp_path, downscaled_path)
+        return downscaled_path
+
+    @staticmethod
+    def fill_lazy_materials():
+        """ Loads the textures of all lazily loaded materials, which are used by an object that is rendered.
+
+        This is called automatically before rendering.
+        """
+        if not _CCMaterialLoader.lazy_materials:
+            return
+        used_materials = set()
+        for obj in bpy.context.scene.objects:
+            if not obj.hide_render:
+                for slot in obj.material_slots:
+                    if slot.material is not None:
+                        used_materials.add(slot.material)
+
+        remaining_materials = []
+        for material, image_paths, source_resolution, target_resolution in _CCMaterialLoader.lazy_materials:
+            try:
+                _ = material.name
+            except ReferenceError:
+                # the material has been removed in the meantime, e.g. by bproc.clean_up()
+                continue
+            if material in used_materials:
+                image_paths = _CCMaterialLoader.downscale_maps(image_paths, source_resolution, target_resolution)
+                _CCMaterialLoader.create_material(material, **image_paths)
+            else:
+                remaining_materials.append((material, image_paths, source_resolution, target_resolution))
+        _CCMaterialLoader.lazy_materials = remaining_materials
 
     @staticmethod
     def create_material(new_mat: bpy.types.Material, base_image_path: str, ambient_occlusion_image_path: str,
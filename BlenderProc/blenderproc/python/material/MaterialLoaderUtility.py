@@ -13,6 +13,8 @@
 
 _x_texture_node = -1500
 _y_texture_node = 300
+# Maps the absolute path of each image loaded via create_image_node() to its blender image
+_loaded_images: Dict[str, bpy.types.Image] = {}
 
 
 def collect_all() -> List[Optional[Material]]:
@@ -99,6 +101,26 @@ def create_new_cc_material(material_name: str, add_custom_properties: dict) -> b
     return new_mat
 
 
+def load_image(image_path: str) -> bpy.types.Image:
+    """ Loads the given image file, each file is only loaded once and then shared between all materials.
+
+    :param image_path: The path to the image file.
+    :return: The blender image.
+    """
+    image_path = os.path.abspath(image_path)
+    image = _loaded_images.get(image_path)
+    if image is not None:
+        try:
+            _ = image.name
+            return image
+        except ReferenceError:
+            # the image has been removed in the meantime, e.g. by bproc.clean_up()
+            pass
+    image = bpy.data.images.load(image_path, check_existing=True)
+    _loaded_images[image_path] = image
+    return image
+
+
 def create_image_node(nodes: bpy.types.Nodes, image: Union[str, bpy.types.Image],
                       non_color_mode: bool = False, x_location: float = 0.0,
                       y_location: float = 0.0):
@@ -116,7 +138,7 @@ def create_image_node(nodes: bpy.types.Nodes, image: Union[str, bpy.types.Image]
     if isinstance(image, bpy.types.Image):
         image_node.image = image
     else:
-        image_node.image = bpy.data.images.load(image, check_existing=True)
+        image_node.image = load_image(image)
     if non_color_mode:
         image_node.image.colorspace_settings.name = 'Non-Color'
     image_node.location.x = x_location
@@ -117,6 +117,16 @@ def set(key: str, value: Any):
         """
         GlobalStorage._storage_dict[key] = value
 
+    @staticmethod
+    def clear():
+        """
+        Removes all keys from the GlobalStorage, the global config is not affected.
+
+        This is used when the same Blender process generates multiple scenes, so that keys which are added via add()
+        during one scene do not block the next one.
+        """
+        GlobalStorage._storage_dict.clear()
+
     @staticmethod
     def get(key: str) -> Any:
         """
@@ -56,6 +56,10 @@ class PhysicsPositioningModule(Module):
         * - solver_iters
           - Number of constraint solver iterations made per simulation step. Default: 10.
           - int
+        * - settle_incrementally
+          - If True, the simulation is stepped forward frame by frame and stopped as soon as all objects have
+            settled, instead of being baked again from the first frame in every check interval. Default: False.
+          - bool
         * - collision_mesh_source
           - Source of the mesh used to create collision shape. This value is used if for an object no custom property `physics_collision_mesh_source` is set.
             Default: 'FINAL'. Available: 'BASE', 'DEFORM', 'FINAL'.
@@ -119,7 +123,8 @@ def run(self):
             object_stopped_location_threshold=self.config.get_float("object_stopped_location_threshold", 0.01),
             object_stopped_rotation_threshold=self.config.get_float("object_stopped_rotation_threshold", 0.1),
             substeps_per_frame=self.config.get_int("substeps_per_frame", 10),
-            solver_iters=self.config.get_int("solver_iters", 10)
+            solver_iters=self.config.get_int("solver_iters", 10),
+            settle_incrementally=self.config.get_bool("settle_incrementally", False)
         )
 
     def _add_rigidbody(self):
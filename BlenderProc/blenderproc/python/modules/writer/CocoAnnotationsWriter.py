@@ -39,6 +39,10 @@ class CocoAnnotationsWriter(WriterInterface):
         * - mask_encoding_format
           - Encoding format of the binary masks. Default: 'rle'. Available: 'rle', 'polygon'.
           - string
+        * - num_workers
+          - If larger than one, the annotations of the frames are generated by this many processes in parallel.
+            Default: 0.
+          - int
     """
 
     def __init__(self, config):
@@ -50,6 +54,7 @@ def __init__(self, config):
         self.segcolormap_output_key = self.config.get_string("segcolormap_output_key", "segcolormap")
         self.mask_encoding_format = self.config.get_string("mask_encoding_format", "rle")
         self._append_to_existing_output = self.config.get_bool("append_to_existing_output", False)
+        self._num_workers = self.config.get_int("num_workers", 0)
 
     def run(self):
         """ Writes coco annotations in the following steps:
@@ -76,4 +81,5 @@ def run(self):
                                 segmap_output_key=self.segmap_output_key,
                                 segcolormap_output_key=self.segcolormap_output_key,
                                 rgb_output_key=self.rgb_output_key,
-                                label_mapping=label_mapping)
\ No newline at end of file
+                                label_mapping=label_mapping,
+                                num_workers=self._num_workers)
\ No newline at end of file
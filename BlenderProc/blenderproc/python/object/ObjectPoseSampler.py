@@ -2,9 +2,8 @@
 
 from typing import Callable, List, Dict, Tuple
 
-import mathutils
 
-from blenderproc.python.utility.CollisionUtility import CollisionUtility
+from blenderproc.python.utility.CollisionUtility import CollisionUtility, AABBBroadphase, MeshBVHCache
 from blenderproc.python.types.EntityUtility import Entity
 from blenderproc.python.types.MeshObjectUtility import MeshObject, get_all_mesh_objects
 
@@ -38,7 +37,7 @@ def sample_poses(objects_to_sample: List[MeshObject], sample_pose_func: Callable
         objects_to_check_collisions = get_all_mesh_objects()
 
     # Among objects_to_sample only check collisions against already placed objects
-    cur_objects_to_check_collisions = list(set(objects_to_check_collisions) - set(objects_to_sample))
+    cur_objects_to_check_collisions = AABBBroadphase(list(set(objects_to_check_collisions) - set(objects_to_sample)))
 
     if max_tries <= 0:
         raise ValueError(f"The value of max_tries must be greater than zero: {max_tries}")
@@ -46,8 +45,8 @@ def sample_poses(objects_to_sample: List[MeshObject], sample_pose_func: Callable
     if not objects_to_sample:
         raise RuntimeError("The list of objects_to_sample can not be empty!")
 
-    # cache to fasten collision detection
-    bvh_cache: Dict[str, mathutils.bvhtree.BVHTree] = {}
+    # cache to fasten collision detection, the trees are in local space, so they stay valid when objects move
+    bvh_cache = MeshBVHCache()
 
     sample_results: Dict[Entity, Tuple[int, bool]] = {}
 
@@ -69,10 +68,6 @@ def sample_poses(objects_to_sample: List[MeshObject], sample_pose_func: Callable
             # Put the top object in queue at the sampled point in space
             sample_pose_func(obj)
 
-            # Remove bvh cache, as object has changed
-            if obj.get_name() in bvh_cache:
-                del bvh_cache[obj.get_name()]
-
             no_collision = CollisionUtility.check_intersections(obj, bvh_cache, cur_objects_to_check_collisions, [])
 
             # If no collision then keep the position
@@ -80,9 +75,6 @@ def sample_poses(objects_to_sample: List[MeshObject], sample_pose_func: Callable
                 amount_of_tries_done = i
                 break
 
-        # After placing an object, we will check collisions with it
-        cur_objects_to_check_collisions.append(obj)
-
         if no_collision:
             print(f"It took {amount_of_tries_done + 1} tries to place {obj.get_name()}")
         else:
@@ -91,7 +83,10 @@ def sample_poses(objects_to_sample: List[MeshObject], sample_pose_func: Callable
 
             if mode_on_failure == 'initial_pose':
                 obj.set_location(initial_location)
-                obj.get_rotation_euler(initial_rotation)
+                obj.set_rotation_euler(initial_rotation)
+
+        # After placing an object, we will check collisions with it
+        cur_objects_to_check_collisions.add(obj)
 
         sample_results[obj] = (amount_of_tries_done, no_collision)
 
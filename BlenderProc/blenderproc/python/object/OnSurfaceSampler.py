@@ -1,11 +1,13 @@
 """Sampling objects on a surface."""
 
-from typing import Callable, List, Optional, Dict
+from typing import Callable, List, Optional, Tuple
 
 import mathutils
+from mathutils import Vector
 import numpy as np
 
-from blenderproc.python.utility.CollisionUtility import CollisionUtility
+from blenderproc.python.utility.CollisionUtility import CollisionUtility, AABBBroadphase, MeshBVHCache
+from blenderproc.python.utility.MathUtility import euler_to_rotation_matrices
 from blenderproc.python.types.MeshObjectUtility import MeshObject
 
 
@@ -41,10 +43,12 @@ def sample_poses_on_surface(objects_to_sample: List[MeshObject], surface: MeshOb
     surface_bounds = surface.get_bound_box()
     surface_height = max(up_direction.dot(corner) for corner in surface_bounds)
 
-    # cache to fasten collision detection
-    bvh_cache: Dict[str, mathutils.bvhtree.BVHTree] = {}
+    # cache to fasten collision detection, the trees are in local space, so they stay valid when objects move
+    bvh_cache = MeshBVHCache()
 
     placed_objects: List[MeshObject] = []
+    # keeps the bounding boxes and locations of all placed objects for vectorized collision and spacing checks
+    placed_broadphase = AABBBroadphase()
     for obj in objects_to_sample:
         print(f"Trying to put {obj.get_name()}")
 
@@ -52,11 +56,8 @@ def sample_poses_on_surface(objects_to_sample: List[MeshObject], surface: MeshOb
 
         for i in range(max_tries):
             sample_pose_func(obj)
-            # Remove bvh cache, as object has changed
-            if obj.get_name() in bvh_cache:
-                del bvh_cache[obj.get_name()]
 
-            if not CollisionUtility.check_intersections(obj, bvh_cache, placed_objects, []):
+            if not CollisionUtility.check_intersections(obj, bvh_cache, placed_broadphase, []):
                 print("Collision detected, retrying!")
                 continue
 
@@ -65,24 +66,22 @@ def sample_poses_on_surface(objects_to_sample: List[MeshObject], surface: MeshOb
                 continue
 
             _OnSurfaceSampler.drop(obj, up_direction, surface_height)
-            # Remove bvh cache, as object has changed
-            if obj.get_name() in bvh_cache:
-                del bvh_cache[obj.get_name()]
 
             if not _OnSurfaceSampler.check_above_surface(obj, surface, up_direction, check_all_bb_corners_over_surface):
                 print("Not above surface after drop, retrying!")
                 continue
 
-            if not _OnSurfaceSampler.check_spacing(obj, placed_objects, min_distance, max_distance):
+            if not _OnSurfaceSampler.check_spacing(obj, placed_broadphase, min_distance, max_distance):
                 print("Bad spacing after drop, retrying!")
                 continue
 
-            if not CollisionUtility.check_intersections(obj, bvh_cache, placed_objects, []):
+            if not CollisionUtility.check_intersections(obj, bvh_cache, placed_broadphase, []):
                 print("Collision detected after drop, retrying!")
                 continue
 
             print(f"Placed object \"{obj.get_name()}\" successfully at {obj.get_location()} after {i + 1} iterations!")
             placed_objects.append(obj)
+            placed_broadphase.add(obj)
 
             placed_successfully = True
             break
@@ -94,6 +93,107 @@ def sample_poses_on_surface(objects_to_sample: List[MeshObject], surface: MeshOb
     return placed_objects
 
 
+def sample_poses_on_surface_batched(objects_to_sample: List[MeshObject], surface: MeshObject,
+                                    sample_poses_func: Callable[[MeshObject, int], Tuple[np.ndarray, np.ndarray]],
+                                    max_tries: int = 100, min_distance: float = 0.25, max_distance: float = 0.6,
+                                    up_direction: Optional[np.ndarray] = None,
+                                    check_all_bb_corners_over_surface: bool = True) -> List[MeshObject]:
+    """ Samples objects poses on a surface, by evaluating many candidate poses per object at once.
+
+    In contrast to sample_poses_on_surface(), the sampling function does not set the pose of the object, but returns
+    max_tries candidate locations and euler rotations at once. The bounding boxes of all candidates are transformed
+    and dropped onto the surface in one vectorized pass and the spacing to the already placed objects is also checked
+    for all candidates at once. Only the remaining candidates are checked in the order in which they have been
+    sampled: via ray casts, whether they are above the surface before and after the drop, and via the expensive mesh
+    collision check before and after the drop. As all checks have to pass, checking them in another order does not
+    change the result, so it equals the one of sample_poses_on_surface() with an equivalent sampling function.
+
+    The objects are expected to have no parent and their scale is kept as it is. As in sample_poses_on_surface(), it
+    is recommended to use the PhysicsPositioning module afterwards.
+
+    :param objects_to_sample: A list of objects that should be sampled above the surface.
+    :param surface: Object to place objects_to_sample on.
+    :param sample_poses_func: The function to use for sampling the candidate poses of a given object. It is called
+                              with the object and the amount of candidates and has to return the locations and the
+                              euler rotations of the candidates, both as an array of shape (amount, 3).
+    :param max_tries: Amount of candidate poses before giving up on an object (deleting it) and moving to the next one.
+    :param min_distance: Minimum distance to the closest other object from objects_to_sample. Center to center.
+    :param max_distance: Maximum distance to the closest other object from objects_to_sample. Center to center.
+    :param up_direction: Normal vector of the side of surface the objects should be placed on.
+    :param check_all_bb_corners_over_surface: If this is True all bounding box corners have to be above the surface,
+                                              else only the center of the object has to be above the surface
+    :return: The list of placed objects.
+    """
+    if up_direction is None:
+        up_direction = np.array([0., 0., 1.])
+    else:
+        up_direction /= np.linalg.norm(up_direction)
+
+    surface_bounds = surface.get_bound_box()
+    surface_height = max(up_direction.dot(corner) for corner in surface_bounds)
+    # the surface does not move, so its bvh tree is only built once for all ray casts
+    surface_bvh_tree = surface.create_bvh_tree()
+
+    # cache to fasten collision detection, the trees are in local space, so they stay valid when objects move
+    bvh_cache = MeshBVHCache()
+
+    placed_objects: List[MeshObject] = []
+    placed_broadphase = AABBBroadphase()
+    for obj in objects_to_sample:
+        locations, rotations = sample_poses_func(obj, max_tries)
+        locations = np.array(locations, dtype=np.float64).reshape(-1, 3)
+        rotations = np.array(rotations, dtype=np.float64).reshape(-1, 3)
+
+        # transform the bounding box of the object into all candidate poses at once: (K, 8, 3)
+        local_corners = np.array(obj.get_bound_box(local_coords=True)) * obj.get_scale()
+        corners = np.einsum("kij,cj->kci", euler_to_rotation_matrices(rotations), local_corners) \
+            + locations[:, np.newaxis]
+
+        # drop all candidates onto the surface, the poses before the drop are checked as well
+        sampled_locations, sampled_corners = locations.copy(), corners.copy()
+        drop_heights = np.min(corners @ up_direction, axis=1) - surface_height
+        locations -= drop_heights[:, np.newaxis] * up_direction
+        corners -= drop_heights[:, np.newaxis, np.newaxis] * up_direction
+
+        # the spacing only depends on the location, so it can be checked for all candidates at once
+        closest_distances = placed_broadphase.closest_distances(locations)
+        is_spaced = np.isinf(closest_distances) | ((min_distance <= closest_distances) &
+                                                   (closest_distances <= max_distance))
+
+        placed_successfully = False
+        for i in np.flatnonzero(is_spaced):
+            # the cheap ray casts are done before the mesh collision checks
+            points_to_check = [sampled_corners[i], corners[i]]
+            if not check_all_bb_corners_over_surface:
+                points_to_check = [np.mean(points, axis=0, keepdims=True) for points in points_to_check]
+            if not all(_OnSurfaceSampler.check_points_above_surface(points, surface_bvh_tree, up_direction)
+                       for points in points_to_check):
+                continue
+
+            obj.set_location(sampled_locations[i])
+            obj.set_rotation_euler(rotations[i])
+            if not CollisionUtility.check_intersections(obj, bvh_cache, placed_broadphase, []):
+                continue
+
+            obj.set_location(locations[i])
+            if not CollisionUtility.check_intersections(obj, bvh_cache, placed_broadphase, []):
+                continue
+
+            print(f"Placed object \"{obj.get_name()}\" successfully at {obj.get_location()} after {i + 1} "
+                  f"candidates!")
+            placed_objects.append(obj)
+            placed_broadphase.add(obj)
+            placed_successfully = True
+            break
+
+        if not placed_successfully:
+            print(f"Giving up on {obj.get_name()} after {len(locations)} candidates "
+                  f"({np.count_nonzero(is_spaced)} with valid spacing), deleting...")
+            obj.delete()
+
+    return placed_objects
+
+
 class _OnSurfaceSampler:
 
     @staticmethod
@@ -118,23 +218,35 @@ def check_above_surface(obj: MeshObject, surface: MeshObject, up_direction: np.n
         return surface.position_is_above_object(center + up_direction, -up_direction, check_no_objects_in_between=False)
 
     @staticmethod
-    def check_spacing(obj: MeshObject, placed_objects: List[MeshObject], min_distance: float, max_distance: float) \
+    def check_points_above_surface(points: np.ndarray, surface_bvh_tree: mathutils.bvhtree.BVHTree,
+                                   up_direction: np.ndarray) -> bool:
+        """ Check if all given points are "above" the surface, by sending rays into the world space bvh tree of it.
+
+        :param points: The points to check in world coordinates, in an array of shape (N, 3).
+        :param surface_bvh_tree: The bvh tree of the surface in world coordinates.
+        :param up_direction: The direction that indicates "above" direction.
+        :return: True if all points are above the surface, False - if not.
+        """
+        down_direction = Vector(-up_direction)
+        for point in points:
+            hit_location, _, _, _ = surface_bvh_tree.ray_cast(Vector(point + up_direction), down_direction)
+            if hit_location is None:
+                return False
+        return True
+
+    @staticmethod
+    def check_spacing(obj: MeshObject, placed_objects: AABBBroadphase, min_distance: float, max_distance: float) \
             -> bool:
         """ Check if object is not too close or too far from previous objects.
 
         :param obj: Object for which the check is carried out.
-        :param placed_objects: A list of already placed objects that should be used for checking spacing.
+        :param placed_objects: The broadphase containing all already placed objects that should be used for checking
+                               spacing.
         :param min_distance: Minimum distance to the closest other object from placed_objects. Center to center.
         :param max_distance: Maximum distance to the closest other object from placed_objects. Center to center.
         :return: True, if the spacing is correct
         """
-        closest_distance = None
-
-        for already_placed in placed_objects:
-            distance = np.linalg.norm(already_placed.get_location() - obj.get_location())
-            if closest_distance is None or distance < closest_distance:
-                closest_distance = distance
-
+        closest_distance = placed_objects.closest_distance(obj.get_location())
         return closest_distance is None or (min_distance <= closest_distance <= max_distance)
 
     @staticmethod
@@ -5,6 +5,7 @@
 import numpy as np
 
 from blenderproc.python.utility.BlenderUtility import get_all_blender_mesh_objects
+from blenderproc.python.types.EntityUtility import BoundBoxStore
 from blenderproc.python.types.MeshObjectUtility import get_all_mesh_objects, MeshObject
 from blenderproc.python.utility.Utility import UndoAfterExecution
 
@@ -13,7 +14,7 @@ def simulate_physics_and_fix_final_poses(min_simulation_time: float = 4.0, max_s
                                          check_object_interval: float = 2.0,
                                          object_stopped_location_threshold: float = 0.01,
                                          object_stopped_rotation_threshold: float = 0.1, substeps_per_frame: int = 10,
-                                         solver_iters: int = 10):
+                                         solver_iters: int = 10, settle_incrementally: bool = False):
     """ Simulates the current scene and in the end fixes the final poses of all active objects.
 
     The simulation is run for at least `min_simulation_time` seconds and at a maximum `max_simulation_time` seconds.
@@ -35,6 +36,10 @@ def simulate_physics_and_fix_final_poses(min_simulation_time: float = 4.0, max_s
                                               as 'stopped moving'.
     :param substeps_per_frame: Number of simulation steps taken per frame.
     :param solver_iters: Number of constraint solver iterations made per simulation step.
+    :param settle_incrementally: If True, the simulation is stepped forward frame by frame instead of being baked
+                                 again from the first frame every `check_object_interval` seconds. It is stopped as
+                                 soon as the linear and angular velocities of all active objects stayed below the
+                                 thresholds for one second, the thresholds are then used per second.
     """
     # Undo changes made in the simulation like origin adjustment and persisting the object's scale
     with UndoAfterExecution():
@@ -42,7 +47,7 @@ def simulate_physics_and_fix_final_poses(min_simulation_time: float = 4.0, max_s
         obj_poses_before_sim = _PhysicsSimulation.get_pose()
         origin_shifts = simulate_physics(min_simulation_time, max_simulation_time, check_object_interval,
                                          object_stopped_location_threshold, object_stopped_rotation_threshold,
-                                         substeps_per_frame, solver_iters)
+                                         substeps_per_frame, solver_iters, settle_incrementally)
         obj_poses_after_sim = _PhysicsSimulation.get_pose()
 
         # Make sure to remove the simulation cache as we are only interested in the final poses
@@ -75,7 +80,7 @@ def simulate_physics_and_fix_final_poses(min_simulation_time: float = 4.0, max_s
 def simulate_physics(min_simulation_time: float = 4.0, max_simulation_time: float = 40.0,
                      check_object_interval: float = 2.0, object_stopped_location_threshold: float = 0.01,
                      object_stopped_rotation_threshold: float = 0.1, substeps_per_frame: int = 10,
-                     solver_iters: int = 10) -> dict:
+                     solver_iters: int = 10, settle_incrementally: bool = False) -> dict:
     """ Simulates the current scene.
 
     The simulation is run for at least `min_simulation_time` seconds and at a maximum `max_simulation_time` seconds.
@@ -98,6 +103,10 @@ def simulate_physics(min_simulation_time: float = 4.0, max_simulation_time: floa
                                               as 'stopped moving'.
     :param substeps_per_frame: Number of simulation steps taken per frame.
     :param solver_iters: Number of constraint solver iterations made per simulation step.
+    :param settle_incrementally: If True, the simulation is stepped forward frame by frame instead of being baked
+                                 again from the first frame every `check_object_interval` seconds. It is stopped as
+                                 soon as the linear and angular velocities of all active objects stayed below the
+                                 thresholds for one second, the thresholds are then used per second.
     :return: A dict containing for every active object the shift that was added to their origins.
     """
     # Shift the origin of all objects to their center of mass to make the simulation more realistic
@@ -116,8 +125,15 @@ def simulate_physics(min_simulation_time: float = 4.0, max_simulation_time: floa
     bpy.context.scene.rigidbody_world.solver_iterations = solver_iters
 
     # Perform simulation
-    _PhysicsSimulation.do_simulation(min_simulation_time, max_simulation_time, check_object_interval,
-                                     object_stopped_location_threshold, object_stopped_rotation_threshold)
+    if settle_incrementally:
+        _PhysicsSimulation.do_incremental_simulation(min_simulation_time, max_simulation_time,
+                                                     object_stopped_location_threshold,
+                                                     object_stopped_rotation_threshold)
+    else:
+        _PhysicsSimulation.do_simulation(min_simulation_time, max_simulation_time, check_object_interval,
+                                         object_stopped_location_threshold, object_stopped_rotation_threshold)
+    # The simulation has moved the active objects
+    BoundBoxStore.invalidate()
 
     return origin_shift
 
@@ -201,6 +217,83 @@ def do_simulation(min_simulation_time: float, max_simulation_time: float, check_
                 # reuse the already calculated frames)
                 bpy.ops.ptcache.free_bake({"point_cache": point_cache})
 
+    @staticmethod
+    def do_incremental_simulation(min_simulation_time: float, max_simulation_time: float,
+                                  object_stopped_location_threshold: float, object_stopped_rotation_threshold: float):
+        """ Perform the simulation by stepping it forward frame by frame, until all active objects have settled.
+
+        In contrast to do_simulation(), no frame is simulated twice. The poses of all active objects are recorded
+        in every frame, so their velocities can be computed from the differences of consecutive frames.
+
+        :param min_simulation_time: The minimum number of seconds to simulate.
+        :param max_simulation_time: The maximum number of seconds to simulate.
+        :param object_stopped_location_threshold: The maximum linear velocity in units per second that is allowed
+                                                  such that an object is still recognized as 'stopped moving'.
+        :param object_stopped_rotation_threshold: The maximum angular velocity in radians per second that is allowed
+                                                  such that an object is still recognized as 'stopped moving'.
+        """
+        if min_simulation_time >= max_simulation_time:
+            raise Exception("max_simulation_iterations has to be bigger than min_simulation_iterations")
+
+        # Make sure the RigidBody world is active
+        bpy.context.scene.rigidbody_world.enabled = True
+
+        min_frame = _PhysicsSimulation.seconds_to_frames(min_simulation_time)
+        max_frame = _PhysicsSimulation.seconds_to_frames(max_simulation_time)
+        fps = bpy.context.scene.render.fps
+        # The simulation has to be cached up to the last frame, otherwise stepping forward does not simulate anymore
+        point_cache = bpy.context.scene.rigidbody_world.point_cache
+        point_cache.frame_start = 1
+        point_cache.frame_end = max_frame
+
+        active_objects = [obj for obj in get_all_blender_mesh_objects()
+                          if obj.rigid_body is not None and obj.rigid_body.type == 'ACTIVE']
+        # Pose history of all active objects, row i contains the poses at frame i + 1
+        locations = np.empty((max_frame, len(active_objects), 3))
+        rotations = np.empty((max_frame, len(active_objects), 3, 3))
+        # Linear and angular velocity of each frame w.r.t. its previous frame
+        velocities = np.zeros((max_frame, 2))
+
+        current_frame = 1
+        while current_frame <= max_frame:
+            bpy.context.scene.frame_set(current_frame)
+            row = current_frame - 1
+            for i, obj in enumerate(active_objects):
+                matrix_world = np.array(obj.matrix_world)
+                locations[row, i] = matrix_world[:3, 3]
+                # remove the scale, so only the rotation remains
+                rotations[row, i] = matrix_world[:3, :3] / np.linalg.norm(matrix_world[:3, :3], axis=0)
+
+            if row > 0 and active_objects:
+                velocities[row] = _PhysicsSimulation.max_velocities(locations[row - 1:row + 1],
+                                                                    rotations[row - 1:row + 1], fps)
+                # Stop, if all objects stayed below the thresholds for the last second
+                if current_frame >= max(min_frame, fps + 1):
+                    max_velocities = np.max(velocities[row - fps + 1:row + 1], axis=0)
+                    if max_velocities[0] <= object_stopped_location_threshold and \
+                            max_velocities[1] <= object_stopped_rotation_threshold:
+                        print(f"Objects have stopped moving after {_PhysicsSimulation.frames_to_seconds(current_frame)}"
+                              f" seconds ({current_frame} frames)")
+                        return
+            current_frame += 1
+        print("Stopping simulation as configured max_simulation_time has been reached")
+
+    @staticmethod
+    def max_velocities(locations: np.ndarray, rotations: np.ndarray, fps: int) -> np.ndarray:
+        """ Computes the maximum linear and angular velocity over all objects between two consecutive frames.
+
+        :param locations: The locations of all objects in both frames, shape (2, N, 3).
+        :param rotations: The rotation matrices of all objects in both frames, shape (2, N, 3, 3).
+        :param fps: The frames per second.
+        :return: The maximum linear velocity in units per second and the maximum angular velocity in radians per
+                 second.
+        """
+        linear = np.linalg.norm(locations[1] - locations[0], axis=-1)
+        # The angle of the relative rotation R_1 @ R_0^T is determined by its trace
+        traces = np.einsum("nij,nij->n", rotations[1], rotations[0])
+        angular = np.arccos(np.clip((traces - 1) / 2, -1, 1))
+        return np.array([np.max(linear), np.max(angular)]) * fps
+
     @staticmethod
     def get_pose() -> dict:
         """ Returns position and rotation values of all objects in the scene with ACTIVE rigid_body type.
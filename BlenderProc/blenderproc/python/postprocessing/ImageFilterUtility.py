@@ -0,0 +1,142 @@
+"""Vectorized filters on segmentation and depth images, which are used by the post processing.
+
+This module does not depend on blender, so the filters can also be benchmarked outside of it.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+
+def determine_noisy_pixels(image: np.ndarray, max_noise_count: int = 100) -> np.ndarray:
+    """ Determines the pixels of a segmentation map, whose values are not real labels, but deviations from them,
+    which were generated by blender doing some interpolation, smoothing, or other numerical operations.
+
+    One criterion of finding these pixels is to use a histogram and find the pixels with frequencies lower than a
+    threshold.
+
+    :param image: The segmentation map of shape [H, W] or [H, W, C].
+    :param max_noise_count: Values, which do not occur more often than this, are considered as noise.
+    :return: A boolean mask of shape [H, W], which is True for all noisy pixels.
+    """
+    # The map was scaled to be ranging along the entire 16-bit color depth, and this is the scaling down operation
+    # that should remove some noise or deviations
+    image = ((image * 37) / 65536).astype(np.int64)  # assuming 16 bit color depth
+    min_value = np.min(image)
+    if np.max(image) - min_value < 1 << 24:
+        # counting the values of a small range is much faster than sorting all of them
+        image -= min_value
+        counts = np.bincount(image.reshape(-1))
+    else:
+        _, image, counts = np.unique(image, return_inverse=True, return_counts=True)
+    # Assuming the stray pixels wouldn't have a count of more than max_noise_count
+    is_noisy = (counts <= max_noise_count)[image.reshape(-1)].reshape(image.shape)
+    if is_noisy.ndim == 3:
+        is_noisy = np.any(is_noisy, axis=2)
+    return is_noisy
+
+
+def fill_noisy_pixels(values: np.ndarray, noisy: np.ndarray) -> np.ndarray:
+    """ Replaces each noisy pixel with the smallest value of its 3x3 neighborhood.
+
+    The pixels are replaced in row-major order, so pixels, which have already been replaced, are used as neighbors
+    of the following ones. As every pixel only depends on the row above it and its left neighbor, each row is
+    handled at once: the chains of adjacent noisy pixels in a row are resolved with a cumulative minimum.
+
+    :param values: The image of shape [H, W].
+    :param noisy: A boolean mask of shape [H, W], which is True for all pixels, which should be replaced.
+    :return: The image of shape [H, W] with the replaced pixels.
+    """
+    values = np.array(values)
+    height = values.shape[0]
+    for row in np.flatnonzero(np.any(noisy, axis=1)):
+        cols = np.flatnonzero(noisy[row])
+        # minimum of the neighbors in the rows above and below, the padding is never the minimum
+        neighbor_min = np.full(len(cols), np.inf)
+        for neighbor_row in (row - 1, row + 1):
+            if 0 <= neighbor_row < height:
+                line = np.pad(values[neighbor_row].astype(np.float64), 1, constant_values=np.inf)
+                neighbor_min = np.minimum(neighbor_min, np.minimum(np.minimum(line[cols], line[cols + 1]),
+                                                                   line[cols + 2]))
+        line = np.pad(values[row].astype(np.float64), 1, constant_values=np.inf)
+        # the right neighbor has not been replaced yet, the left one only, if it is noisy itself
+        neighbor_min = np.minimum(neighbor_min, line[cols + 2])
+        is_run_start = np.diff(cols, prepend=-2) != 1
+        neighbor_min[is_run_start] = np.minimum(neighbor_min[is_run_start], line[cols[is_run_start]])
+
+        if not np.all(is_run_start):
+            # cumulative minimum inside each run of adjacent noisy pixels: the ranks of later runs are shifted
+            # below the ones of all earlier runs, so the minimum restarts at each run
+            unique_values, ranks = np.unique(neighbor_min, return_inverse=True)
+            run_offsets = (np.cumsum(is_run_start) - 1) * len(unique_values)
+            neighbor_min = unique_values[np.minimum.accumulate(ranks.reshape(-1) - run_offsets) + run_offsets]
+        values[row, cols] = neighbor_min
+    return values
+
+
+def get_window_offsets(filter_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ Returns the offsets of all pixels in a square filter, the first offset is the center pixel.
+
+    :param filter_size: The filter size.
+    :return: The row and column offsets, each of shape [filter_size ** 2].
+    """
+    _min = -int(filter_size / 2)
+    _max = _min + filter_size
+    offsets = [(0, 0)] + [(-p, -q) for p in range(_min, _max) for q in range(_min, _max) if not (p == 0 and q == 0)]
+    offsets = np.array(offsets)
+    return offsets[:, 0], offsets[:, 1]
+
+
+def window_modes(image: np.ndarray, filter_size: int, rows: np.ndarray, cols: np.ndarray,
+                 chunk_size: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    """ Computes the most frequent value in the square filter around each of the given pixels. Pixels outside the
+    image count as zeros. If multiple values are equally frequent, the smallest one is used.
+
+    Only the windows of the given pixels are gathered, chunk by chunk, so at most chunk_size * filter_size ** 2
+    values are in memory at the same time.
+
+    :param image: The single channel image of shape [H, W].
+    :param filter_size: The filter size.
+    :param rows: The row indices of the pixels.
+    :param cols: The column indices of the pixels.
+    :param chunk_size: The amount of pixels, which are processed at once.
+    :return: The modes and the index of the first window offset, see get_window_offsets(), at which the mode occurs.
+    """
+    row_offsets, col_offsets = get_window_offsets(filter_size)
+    padding = filter_size
+    padded = np.pad(image, padding)
+    modes = np.empty(len(rows), dtype=image.dtype)
+    first_offsets = np.empty(len(rows), dtype=np.int64)
+    for start in range(0, len(rows), chunk_size):
+        chunk_rows = rows[start:start + chunk_size, np.newaxis] + padding
+        chunk_cols = cols[start:start + chunk_size, np.newaxis] + padding
+        windows = padded[chunk_rows + row_offsets, chunk_cols + col_offsets]
+        sorted_windows = np.sort(windows, axis=1)
+        # the length of the run of equal values up to each position, the first position which reaches the longest
+        # run belongs to the smallest of the most frequent values
+        positions = np.arange(sorted_windows.shape[1])
+        is_run_start = np.ones(sorted_windows.shape, dtype=bool)
+        is_run_start[:, 1:] = sorted_windows[:, 1:] != sorted_windows[:, :-1]
+        run_lengths = positions - np.maximum.accumulate(np.where(is_run_start, positions, 0), axis=1)
+        chunk_modes = sorted_windows[np.arange(len(windows)), np.argmax(run_lengths, axis=1)]
+        modes[start:start + chunk_size] = chunk_modes
+        first_offsets[start:start + chunk_size] = np.argmax(windows == chunk_modes[:, np.newaxis], axis=1)
+    return modes, first_offsets
+
+
+def gather_window_values(image: np.ndarray, filter_size: int, rows: np.ndarray, cols: np.ndarray,
+                         offset_indices: np.ndarray) -> np.ndarray:
+    """ Returns for each given pixel the value at the given offset of its square filter. Pixels outside the image
+    are zero.
+
+    :param image: The image of shape [H, W] or [H, W, C].
+    :param filter_size: The filter size.
+    :param rows: The row indices of the pixels.
+    :param cols: The column indices of the pixels.
+    :param offset_indices: The index of the offset for each pixel, see get_window_offsets().
+    :return: The values of shape [N] or [N, C].
+    """
+    row_offsets, col_offsets = get_window_offsets(filter_size)
+    padding = filter_size
+    padded = np.pad(image, [(padding, padding), (padding, padding)] + [(0, 0)] * (image.ndim - 2))
+    return padded[rows + padding + row_offsets[offset_indices], cols + padding + col_offsets[offset_indices]]
@@ -0,0 +1,384 @@
+"""Applies chains of post processing operations on all frames of a scene at once."""
+
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Optional, Union, Sequence
+
+import numpy as np
+
+from blenderproc.python.camera import CameraUtility
+from blenderproc.python.camera.LensDistortionUtility import apply_lens_distortion
+from blenderproc.python.postprocessing.PostProcessingUtility import add_kinect_azure_noise, add_gaussian_shifts, \
+    oil_paint_filter, remove_segmap_noise
+
+
+class PostProcessingPipeline:
+    """
+    Chains post processing operations, which are applied on all frames of a scene.
+
+    There are two kinds of steps: batched steps get the frames stacked to arrays of shape [F, ...] and broadcast
+    their computation over all of them, e.g. dist2depth computes its per pixel factor only once. Frame steps are
+    called per frame and are fanned out over a pool of workers, this is used for the OpenCV and scipy based
+    operations. To bound the memory, the frames are processed in chunks of at most `max_chunk_size_mb`.
+
+    .. code-block:: python
+
+        data = bproc.renderer.render()
+        pipeline = bproc.postprocessing.PostProcessingPipeline()
+        pipeline.dist2depth("distance", "depth").add_kinect_azure_noise("depth", "colors", "noisy_depth")
+        data = pipeline.run(data)
+
+    Frame steps use threads by default, as OpenCV releases the GIL. With `use_processes` the frames are handled
+    in forked processes instead, this only works with picklable functions, e.g. module level functions or partials
+    of them. On platforms without fork, threads are always used.
+    """
+
+    def __init__(self, num_workers: Optional[int] = None, max_chunk_size_mb: float = 512.0):
+        """
+        :param num_workers: The amount of workers, which process the frames of a frame step in parallel. If None,
+                            all cores are used.
+        :param max_chunk_size_mb: The maximum size in MB of the input frames, which are processed at once.
+        """
+        self.num_workers = num_workers if num_workers is not None else (os.cpu_count() or 1)
+        self.max_chunk_size_mb = max_chunk_size_mb
+        self._steps: List[_PipelineStep] = []
+
+    def add_batched_step(self, function: Callable[..., np.ndarray], input_keys: Union[str, List[str]],
+                         output_key: Optional[str] = None) -> "PostProcessingPipeline":
+        """ Adds a step, which gets the stacked frames of all input keys and returns the stacked output frames.
+
+        :param function: Gets one array of shape [F, ...] per input key and returns an array of shape [F, ...].
+        :param input_keys: The key or the keys of the data, which are given to the function.
+        :param output_key: The key the result is stored at. If None, the first input key is overwritten.
+        :return: The pipeline itself, so steps can be chained.
+        """
+        self._steps.append(_PipelineStep(function, input_keys, output_key, batched=True))
+        return self
+
+    def add_frame_step(self, function: Callable[..., np.ndarray], input_keys: Union[str, List[str]],
+                       output_key: Optional[str] = None, use_processes: bool = False, uses_rng: bool = False) \
+            -> "PostProcessingPipeline":
+        """ Adds a step, which is called for each frame with the frame of each input key.
+
+        :param function: Gets one frame per input key and returns the output frame.
+        :param input_keys: The key or the keys of the data, which are given to the function.
+        :param output_key: The key the result is stored at. If None, the first input key is overwritten.
+        :param use_processes: If True, the frames are processed in forked processes instead of threads.
+        :param uses_rng: If True, the function is called with an `rng` keyword argument, which is a random generator
+                         seeded per frame from the global numpy random state. The workers share the global random
+                         state, so this keeps random steps reproducible independent of the scheduling.
+        :return: The pipeline itself, so steps can be chained.
+        """
+        self._steps.append(_PipelineStep(function, input_keys, output_key, batched=False,
+                                         use_processes=use_processes, uses_rng=uses_rng))
+        return self
+
+    def dist2depth(self, key: str = "distance", output_key: str = "depth") -> "PostProcessingPipeline":
+        """ Maps distance images to depth images, see bproc.postprocessing.dist2depth().
+
+        :param key: The key of the distance images.
+        :param output_key: The key the depth images are stored at.
+        :return: The pipeline itself, so steps can be chained.
+        """
+        return self.add_batched_step(partial(_PostProcessingPipeline.convert_distance, to_depth=True), key,
+                                     output_key)
+
+    def depth2dist(self, key: str = "depth", output_key: str = "distance") -> "PostProcessingPipeline":
+        """ Maps depth images to distance images, see bproc.postprocessing.depth2dist().
+
+        :param key: The key of the depth images.
+        :param output_key: The key the distance images are stored at.
+        :return: The pipeline itself, so steps can be chained.
+        """
+        return self.add_batched_step(partial(_PostProcessingPipeline.convert_distance, to_depth=False), key,
+                                     output_key)
+
+    def trim_redundant_channels(self, key: str, output_key: Optional[str] = None) -> "PostProcessingPipeline":
+        """ Removes the redundant channels of depth or distance images, see
+        bproc.postprocessing.trim_redundant_channels().
+
+        :param key: The key of the images.
+        :param output_key: The key the trimmed images are stored at. If None, the images are replaced.
+        :return: The pipeline itself, so steps can be chained.
+        """
+        return self.add_batched_step(_PostProcessingPipeline.trim_redundant_channels, key, output_key)
+
+    def add_kinect_azure_noise(self, key: str = "depth", color_key: Optional[str] = None,
+                               output_key: Optional[str] = None, missing_depth_darkness_thres: int = 15) \
+            -> "PostProcessingPipeline":
+        """ Adds the noise of the Kinect Azure sensor to the depth images, see
+        bproc.postprocessing.add_kinect_azure_noise().
+
+        :param key: The key of the depth images in meters.
+        :param color_key: The key of the color images, which are used to add missing depth at dark surfaces.
+        :param output_key: The key the noisy depth images are stored at. If None, the images are replaced.
+        :param missing_depth_darkness_thres: uint8 gray value threshold at which depth becomes invalid, i.e. 0
+        :return: The pipeline itself, so steps can be chained.
+        """
+        function = partial(add_kinect_azure_noise, missing_depth_darkness_thres=missing_depth_darkness_thres)
+        input_keys = [key] if color_key is None else [key, color_key]
+        return self.add_frame_step(function, input_keys, output_key, uses_rng=True)
+
+    def add_gaussian_shifts(self, key: str, output_key: Optional[str] = None, std: float = 0.5) \
+            -> "PostProcessingPipeline":
+        """ Randomly shifts the pixels of the depth images, see bproc.postprocessing.add_gaussian_shifts().
+
+        :param key: The key of the depth images.
+        :param output_key: The key the shifted images are stored at. If None, the images are replaced.
+        :param std: Standard deviation of pixel shifts.
+        :return: The pipeline itself, so steps can be chained.
+        """
+        return self.add_frame_step(partial(add_gaussian_shifts, std=std), key, output_key, uses_rng=True)
+
+    def remove_segmap_noise(self, key: str, output_key: Optional[str] = None) -> "PostProcessingPipeline":
+        """ Removes the noise of the segmentation maps, see bproc.postprocessing.remove_segmap_noise().
+
+        :param key: The key of the segmentation maps.
+        :param output_key: The key the cleaned maps are stored at. If None, the maps are replaced.
+        :return: The pipeline itself, so steps can be chained.
+        """
+        return self.add_frame_step(remove_segmap_noise, key, output_key)
+
+    def oil_paint_filter(self, key: str, output_key: Optional[str] = None, filter_size: int = 5,
+                         edges_only: bool = True, rgb: bool = False) -> "PostProcessingPipeline":
+        """ Applies the oil paint filter on the images, see bproc.postprocessing.oil_paint_filter().
+
+        :param key: The key of the images.
+        :param output_key: The key the filtered images are stored at. If None, the images are replaced.
+        :param filter_size: Filter size, should be an odd number.
+        :param edges_only: If true, applies the filter on the edges only.
+        :param rgb: Apply the filter on an RGB image (if the image has 3 channels, they're assumed to not be
+                    replicated).
+        :return: The pipeline itself, so steps can be chained.
+        """
+        return self.add_frame_step(partial(oil_paint_filter, filter_size=filter_size, edges_only=edges_only,
+                                           rgb=rgb), key, output_key)
+
+    def apply_lens_distortion(self, key: str, output_key: Optional[str] = None,
+                              mapping_coords: Optional[np.ndarray] = None, orig_res_x: Optional[int] = None,
+                              orig_res_y: Optional[int] = None, use_interpolation: bool = True,
+                              use_processes: bool = False) -> "PostProcessingPipeline":
+        """ Applies the lens distortion on the images, see bproc.postprocessing.apply_lens_distortion().
+
+        If the mapping is not given, it is taken from the last call of bproc.camera.set_lens_distortion(), so
+        this step has to be added after it.
+
+        :param key: The key of the images.
+        :param output_key: The key the distorted images are stored at. If None, the images are replaced.
+        :param mapping_coords: An array of pixel mappings from undistorted to distorted image.
+        :param orig_res_x: Original and output width resolution of the image.
+        :param orig_res_y: Original and output height resolution of the image.
+        :param use_interpolation: If this is True, for each pixel an interpolation will be performed, if this is
+                                  false the nearest pixel will be used.
+        :param use_processes: If True, the frames are processed in forked processes, as the interpolation of scipy
+                              holds the GIL. Forking the multi-threaded blender process is not safe, so this should
+                              only be used if the pipeline is run outside of blender.
+        :return: The pipeline itself, so steps can be chained.
+        """
+        if mapping_coords is None or orig_res_x is None or orig_res_y is None:
+            # pylint: disable=import-outside-toplevel,cyclic-import
+            from blenderproc.python.modules.main.GlobalStorage import GlobalStorage
+            # pylint: enable=import-outside-toplevel,cyclic-import
+            if GlobalStorage.is_in_storage("_lens_distortion_is_used"):
+                content = GlobalStorage.get("_lens_distortion_is_used")
+                mapping_coords = content["mapping_coords"]
+                orig_res_y, orig_res_x = content["original_image_res"]
+        # resolving the mapping here avoids accessing the global storage inside of the workers
+        function = partial(apply_lens_distortion, mapping_coords=mapping_coords, orig_res_x=orig_res_x,
+                           orig_res_y=orig_res_y, use_interpolation=use_interpolation)
+        return self.add_frame_step(function, key, output_key, use_processes)
+
+    def run(self, data: Dict[str, Union[List[np.ndarray], np.ndarray]]) -> Dict[str, List[np.ndarray]]:
+        """ Applies all steps in the order they were added.
+
+        :param data: Maps each key to its frames, e.g. the output of bproc.renderer.render().
+        :return: A new dict with all keys of the given data, in which the outputs of the steps are stored as list
+                 of frames.
+        """
+        result = dict(data)
+        executors: Dict[bool, Executor] = {}
+        try:
+            for step in self._steps:
+                for key in step.input_keys:
+                    if key not in result:
+                        raise KeyError(f"The key {key} is not in the data, available are: {list(result.keys())}")
+                inputs = [list(result[key]) for key in step.input_keys]
+                amount_of_frames = len(inputs[0])
+                if any(len(frames) != amount_of_frames for frames in inputs):
+                    raise ValueError(f"The keys {step.input_keys} do not have the same amount of frames.")
+
+                outputs: List[np.ndarray] = []
+                for chunk in _PostProcessingPipeline.split_into_chunks(inputs, self.max_chunk_size_mb):
+                    chunk_inputs = [[frames[i] for i in chunk] for frames in inputs]
+                    if step.batched:
+                        outputs.extend(_PostProcessingPipeline.apply_batched(step.function, chunk_inputs))
+                    else:
+                        outputs.extend(self._apply_per_frame(step, chunk_inputs, executors))
+                result[step.output_key] = outputs
+        finally:
+            for executor in executors.values():
+                executor.shutdown()
+        return result
+
+    def _apply_per_frame(self, step: "_PipelineStep", chunk_inputs: List[List[np.ndarray]],
+                         executors: Dict[bool, Executor]) -> List[np.ndarray]:
+        """ Applies a frame step on the frames of a chunk, which are distributed over the workers.
+
+        :param step: The frame step.
+        :param chunk_inputs: The frames of the chunk per input key.
+        :param executors: The executors, which have been started so far, mapped by whether they use processes.
+        :return: The output frames.
+        """
+        amount_of_frames = len(chunk_inputs[0])
+        # the seeds are drawn in this thread, so they only depend on the global random state
+        frame_seeds = np.random.randint(0, 2 ** 31 - 1, size=amount_of_frames) if step.uses_rng else None
+        if self.num_workers <= 1 or amount_of_frames <= 1:
+            return _PostProcessingPipeline.apply_to_frames(step.function, chunk_inputs, frame_seeds=frame_seeds)
+
+        # The fork context is requested explicitly, so the global start method of the process is not changed
+        use_processes = step.use_processes and "fork" in multiprocessing.get_all_start_methods()
+        if use_processes not in executors:
+            if use_processes:
+                executors[use_processes] = ProcessPoolExecutor(self.num_workers,
+                                                               mp_context=multiprocessing.get_context("fork"))
+            else:
+                executors[use_processes] = ThreadPoolExecutor(self.num_workers)
+        executor = executors[use_processes]
+
+        # one task per worker, so functions with large arguments, like the lens distortion mapping, are only
+        # sent once per worker to the processes
+        tasks = np.array_split(np.arange(amount_of_frames), min(self.num_workers, amount_of_frames))
+        futures = []
+        for indices in tasks:
+            task_inputs = [[frames[i] for i in indices] for frames in chunk_inputs]
+            # forked processes share the random state, so each task is seeded from the random state of this process
+            seed = int(np.random.randint(0, 2 ** 31 - 1)) if use_processes else None
+            task_seeds = frame_seeds[indices] if frame_seeds is not None else None
+            futures.append(executor.submit(_PostProcessingPipeline.apply_to_frames, step.function, task_inputs,
+                                           seed, task_seeds))
+        outputs: List[np.ndarray] = []
+        for future in futures:
+            outputs.extend(future.result())
+        return outputs
+
+
+class _PipelineStep:
+
+    def __init__(self, function: Callable[..., np.ndarray], input_keys: Union[str, List[str]],
+                 output_key: Optional[str], batched: bool, use_processes: bool = False, uses_rng: bool = False):
+        """
+        :param function: The function of the step.
+        :param input_keys: The key or the keys of the data, which are given to the function.
+        :param output_key: The key the result is stored at. If None, the first input key is overwritten.
+        :param batched: If True, the function gets the stacked frames, otherwise it is called per frame.
+        :param use_processes: If True, the frames are processed in processes instead of threads.
+        :param uses_rng: If True, the function gets a random generator per frame via the `rng` keyword argument.
+        """
+        self.function = function
+        self.input_keys = [input_keys] if isinstance(input_keys, str) else list(input_keys)
+        if not self.input_keys:
+            raise ValueError("A post processing step needs at least one input key.")
+        self.output_key = output_key if output_key is not None else self.input_keys[0]
+        self.batched = batched
+        self.use_processes = use_processes
+        self.uses_rng = uses_rng
+
+
+class _PostProcessingPipeline:
+
+    @staticmethod
+    def split_into_chunks(inputs: List[List[np.ndarray]], max_chunk_size_mb: float) -> List[List[int]]:
+        """ Splits the frames into consecutive chunks, whose input frames are not larger than the given size.
+
+        :param inputs: The frames per input key.
+        :param max_chunk_size_mb: The maximum size of a chunk in MB, each chunk contains at least one frame.
+        :return: The indices of the frames of each chunk.
+        """
+        max_chunk_size = max_chunk_size_mb * 1024 * 1024
+        chunks: List[List[int]] = []
+        chunk_size = 0
+        for i in range(len(inputs[0])):
+            frame_size = sum(np.asarray(frames[i]).nbytes for frames in inputs)
+            if not chunks or chunk_size + frame_size > max_chunk_size:
+                chunks.append([])
+                chunk_size = 0
+            chunks[-1].append(i)
+            chunk_size += frame_size
+        return chunks
+
+    @staticmethod
+    def apply_batched(function: Callable[..., np.ndarray], chunk_inputs: List[List[np.ndarray]]) \
+            -> List[np.ndarray]:
+        """ Applies a batched function on the stacked frames. Frames, which can not be stacked, because their
+        shapes or types differ, are given one by one with a batch size of one.
+
+        :param function: The batched function.
+        :param chunk_inputs: The frames of the chunk per input key.
+        :return: The output frames.
+        """
+        if all(all(np.shape(frame) == np.shape(frames[0]) and np.asarray(frame).dtype == np.asarray(frames[0]).dtype
+                   for frame in frames) for frames in chunk_inputs):
+            stacked_outputs = function(*[np.stack(frames) for frames in chunk_inputs])
+            if len(stacked_outputs) != len(chunk_inputs[0]):
+                raise ValueError(f"The batched step returned {len(stacked_outputs)} frames, but got "
+                                 f"{len(chunk_inputs[0])} frames.")
+            return list(stacked_outputs)
+        return [function(*[np.asarray(frames[i])[np.newaxis] for frames in chunk_inputs])[0]
+                for i in range(len(chunk_inputs[0]))]
+
+    @staticmethod
+    def apply_to_frames(function: Callable[..., np.ndarray], task_inputs: Sequence[List[np.ndarray]],
+                        seed: Optional[int] = None, frame_seeds: Optional[np.ndarray] = None) -> List[np.ndarray]:
+        """ Calls the function for each frame, this runs inside of the workers.
+
+        :param function: The function of the frame step.
+        :param task_inputs: The frames per input key.
+        :param seed: If given, the random state of the worker is seeded with it first.
+        :param frame_seeds: If given, the function is called with a random generator per frame, seeded by these.
+        :return: The output frames.
+        """
+        if seed is not None:
+            np.random.seed(seed)
+        if frame_seeds is not None:
+            return [function(*frame_inputs, rng=np.random.default_rng(frame_seed))
+                    for frame_inputs, frame_seed in zip(zip(*task_inputs), frame_seeds)]
+        return [function(*frame_inputs) for frame_inputs in zip(*task_inputs)]
+
+    @staticmethod
+    def trim_redundant_channels(images: np.ndarray) -> np.ndarray:
+        """ Removes the redundant channels of stacked depth or distance images.
+
+        :param images: The images of shape [F, H, W], [F, H, W, 3] or for stereo [F, 2, H, W, 3].
+        :return: The images without the channel dimension.
+        """
+        if images.ndim in (4, 5) and images.shape[-1] == 3:
+            # All channels have the same value, so just extract any single channel
+            return images[..., 0]
+        return images
+
+    @staticmethod
+    def convert_distance(images: np.ndarray, to_depth: bool) -> np.ndarray:
+        """ Maps stacked distance images to depth images or the other way round. The factor of each pixel is
+        computed once and broadcast over all frames.
+
+        :param images: The distance or depth images of shape [F, ..., H, W], redundant channels are removed.
+        :param to_depth: If True, distance is mapped to depth, otherwise depth to distance.
+        :return: The depth or distance images.
+        """
+        images = _PostProcessingPipeline.trim_redundant_channels(images)
+
+        K = CameraUtility.get_intrinsics_as_K_matrix()
+        f, cx, cy = K[0, 0], K[0, 2], K[1, 2]
+
+        xs, ys = np.meshgrid(np.arange(images.shape[-1]), np.arange(images.shape[-2]))
+
+        # coordinate distances to principal point
+        x_opt = np.abs(xs - cx)
+        y_opt = np.abs(ys - cy)
+
+        # see dist2depth() and depth2dist()
+        if to_depth:
+            return images * f / np.sqrt(x_opt ** 2 + y_opt ** 2 + f ** 2)
+        return images * np.sqrt(x_opt ** 2 + y_opt ** 2 + f ** 2) / f
@@ -6,9 +6,10 @@
 import bpy
 import mathutils
 import cv2
-from scipy import stats
 
 from blenderproc.python.camera import CameraUtility
+from blenderproc.python.postprocessing.ImageFilterUtility import determine_noisy_pixels, fill_noisy_pixels, \
+    window_modes, gather_window_values
 from blenderproc.python.utility.BlenderUtility import get_all_blender_mesh_objects
 
 
@@ -72,9 +73,12 @@ def depth2dist(depth: Union[List[np.ndarray], np.ndarray]) -> Union[List[np.ndar
 
 def remove_segmap_noise(image: Union[list, np.ndarray]) -> Union[list, np.ndarray]:
     """
-    A function that takes an image and a few 2D indices, where these indices correspond to pixel values in
-    segmentation maps, where these values are not real labels, but some deviations from the real labels, that were
-    generated as a result of Blender doing some interpolation, smoothing, or other numerical operations.
+    A function that takes an image and finds the pixels, whose values in the segmentation map are not real labels,
+    but some deviations from the real labels, that were generated as a result of Blender doing some interpolation,
+    smoothing, or other numerical operations.
+
+    Each of these noisy pixels is replaced by the smallest value in its 3x3 neighborhood. The pixels are replaced in
+    row-major order, so already replaced pixels are used as neighbors of the following ones.
 
     Assumes that noise pixel values won't occur more than 100 times.
 
@@ -85,32 +89,16 @@ def remove_segmap_noise(image: Union[list, np.ndarray]) -> Union[list, np.ndarra
     if isinstance(image, list) or hasattr(image, "shape") and len(image.shape) > 3:
         return [remove_segmap_noise(img) for img in image]
 
-    noise_indices = _PostProcessingUtility.determine_noisy_pixels(image)
-
-    for index in noise_indices:
-        neighbors = _PostProcessingUtility.get_pixel_neighbors(image, index[0], index[
-            1])  # Extracting the indices surrounding 3x3 neighbors
-        curr_val = image[index[0]][index[1]][0]  # Current value of the noisy pixel
-
-        neighbor_vals = [image[neighbor[0]][neighbor[1]] for neighbor in
-                         neighbors]  # Getting the values of the neighbors
-        # Getting the unique values only
-        neighbor_vals = np.unique(np.array([np.array(index) for index in neighbor_vals]))
-
-        min_val = 10000000000
-        min_idx = 0
-
-        # Here we iterate through the unique values of the neighbor and find the one closest to the current noisy value
-        for idx, n in enumerate(neighbor_vals):
-            # Is this closer than the current closest value?
-            if n - curr_val <= min_val:
-                # If so, update
-                min_val = n - curr_val
-                min_idx = idx
-
-        # Now that we have found the closest value, assign it to the noisy value
-        new_val = neighbor_vals[min_idx]
-        image[index[0]][index[1]] = np.array([new_val, new_val, new_val])
+    noisy_pixels = determine_noisy_pixels(image)
+    # The value of a pixel is the smallest value over its channels
+    values = image
+    if image.ndim == 3:
+        values = image[:, :, 0]
+        for channel in range(1, image.shape[2]):
+            values = np.minimum(values, image[:, :, channel])
+    filled_values = fill_noisy_pixels(values, noisy_pixels)[noisy_pixels]
+    # Now that we have found the new values, assign them to all channels of the noisy pixels
+    image[noisy_pixels] = filled_values[:, np.newaxis] if image.ndim == 3 else filled_values
 
     return image
 
@@ -133,27 +121,22 @@ def oil_paint_filter(image: Union[list, np.ndarray], filter_size: int = 5, edges
         if isinstance(image, list) or hasattr(image, "shape") and len(image.shape) > 3:
             return [oil_paint_filter(img, filter_size, edges_only, rgb) for img in image]
 
-        intensity_img = (np.sum(image, axis=2) / 3.0)
-
-        neighbors = np.array(
-            _PostProcessingUtility.get_pixel_neighbors_stacked(image, filter_size, return_list=True))
-        neighbors_intensity = _PostProcessingUtility.get_pixel_neighbors_stacked(intensity_img, filter_size)
-
-        mode_intensity = stats.mode(neighbors_intensity, axis=2)[0].reshape(image.shape[0], image.shape[1])
-
-        # keys here would match all instances of the mode value
-        mode_keys = np.argwhere(neighbors_intensity == np.expand_dims(mode_intensity, axis=3))
-        # Remove the duplicate keys, since they point to the same value, and to be able to use them for indexing
-        _, unique_indices = np.unique(mode_keys[:, 0:2], axis=0, return_index=True)
-        unique_keys = mode_keys[unique_indices]
-
-        filtered_img = neighbors[unique_keys[:, 2], unique_keys[:, 0], unique_keys[:, 1], :] \
-            .reshape(image.shape[0], image.shape[1], image.shape[2])
-
+        # Only the pixels, which are replaced, are filtered
         if edges_only:
             edges = cv2.Canny(image, 0, np.max(image))  # Assuming "image" is an uint8 array.
-            image[edges > 0] = filtered_img[edges > 0]
-            filtered_img = image
+            rows, cols = np.nonzero(edges > 0)
+        else:
+            rows, cols = np.indices(image.shape[:2]).reshape(2, -1)
+
+        intensity_img = (np.sum(image, axis=2) / 3.0)
+        # Use the color of the first neighbor, whose intensity is the most frequent one
+        _, mode_offsets = window_modes(intensity_img, filter_size, rows, cols)
+        filtered_values = gather_window_values(image, filter_size, rows, cols, mode_offsets)
+
+        if not edges_only:
+            image = np.array(image)
+        image[rows, cols] = filtered_values
+        filtered_img = image
     else:
         image = trim_redundant_channels(image)
         if isinstance(image, list) or hasattr(image, "shape") and len(image.shape) > 2:
@@ -162,9 +145,7 @@ def oil_paint_filter(image: Union[list, np.ndarray], filter_size: int = 5, edges
         if len(image.shape) == 3 and image.shape[2] > 1:
             image = image[:, :, 0]
 
-        filtered_img = stats.mode(_PostProcessingUtility.get_pixel_neighbors_stacked(image, filter_size), axis=2)[0]
-        filtered_img = filtered_img.reshape(filtered_img.shape[0], filtered_img.shape[1])
-
+        # Only the pixels, which are replaced, are filtered
         if edges_only:
             # Handle inf and map input to the range: 0-255
             _image = np.copy(image)
@@ -174,14 +155,23 @@ def oil_paint_filter(image: Union[list, np.ndarray], filter_size: int = 5, edges
 
             __img = np.uint8(_image)
             edges = cv2.Canny(__img, 0, np.max(__img))
+            rows, cols = np.nonzero(edges > 0)
+        else:
+            rows, cols = np.indices(image.shape).reshape(2, -1)
+
+        modes, _ = window_modes(image, filter_size, rows, cols)
 
-            image[edges > 0] = filtered_img[edges > 0]
-            filtered_img = image
+        if not edges_only:
+            image = np.array(image)
+        image[rows, cols] = modes
+        filtered_img = image
 
     return filtered_img
 
+
 def add_kinect_azure_noise(depth: Union[list, np.ndarray], color: Optional[Union[list, np.ndarray]] = None,
-                           missing_depth_darkness_thres: int = 15) -> Union[list, np.ndarray]:
+                           missing_depth_darkness_thres: int = 15,
+                           rng: Optional[np.random.Generator] = None) -> Union[list, np.ndarray]:
     """
     Add noise, holes and smooth depth maps according to the noise characteristics of the Kinect Azure sensor.
     https://www.mdpi.com/1424-8220/21/2/413
@@ -192,6 +182,7 @@ def add_kinect_azure_noise(depth: Union[list, np.ndarray], color: Optional[Union
     :param depth: Input depth image(s) in meters
     :param color: Optional color image(s) to add missing depth at close to black surfaces
     :param missing_depth_darkness_thres: uint8 gray value threshold at which depth becomes invalid, i.e. 0
+    :param rng: The random generator to sample the noise with. If None, the global numpy random state is used.
     :return: Noisy depth image(s)
     """
 
@@ -199,13 +190,15 @@ def add_kinect_azure_noise(depth: Union[list, np.ndarray], color: Optional[Union
         if color is None:
             color = len(depth) * [None]
         assert len(color) == len(depth), "Enter same number of depth and color images"
-        return [add_kinect_azure_noise(d, c, missing_depth_darkness_thres) for d,c in zip(depth, color)]
+        return [add_kinect_azure_noise(d, c, missing_depth_darkness_thres, rng) for d,c in zip(depth, color)]
+
+    random_state = rng if rng is not None else np.random
 
     # smoothing at borders
-    depth = add_gaussian_shifts(depth, 0.25)
+    depth = add_gaussian_shifts(depth, 0.25, rng)
 
     # 0.5mm base noise, 1mm std noise @ 1m, 3.6mm std noise @ 3m
-    depth = depth + (5/10000 + np.maximum((depth-0.5) * 1/1000, 0)) * np.random.normal(size=depth.shape)
+    depth = depth + (5/10000 + np.maximum((depth-0.5) * 1/1000, 0)) * random_state.normal(size=depth.shape)
 
     # Creates the shape of the kernel
     shape = cv2.MORPH_RECT
@@ -226,20 +219,23 @@ def add_kinect_azure_noise(depth: Union[list, np.ndarray], color: Optional[Union
     return depth
 
 
-def add_gaussian_shifts(image: Union[list, np.ndarray], std: float = 0.5) -> Union[list, np.ndarray]:
+def add_gaussian_shifts(image: Union[list, np.ndarray], std: float = 0.5,
+                        rng: Optional[np.random.Generator] = None) -> Union[list, np.ndarray]:
     """
     Randomly shifts the pixels of the input depth image in x and y direction.
 
     :param image: Input depth image(s)
     :param std: Standard deviation of pixel shifts, defaults to 0.5
+    :param rng: The random generator to sample the shifts with. If None, the global numpy random state is used.
     :return: Augmented images
     """
 
     if isinstance(image, list) or hasattr(image, "shape") and len(image.shape) > 2:
-        return [add_gaussian_shifts(img, std=std) for img in image]
+        return [add_gaussian_shifts(img, std=std, rng=rng) for img in image]
 
+    random_state = rng if rng is not None else np.random
     rows, cols = image.shape
-    gaussian_shifts = np.random.normal(0, std, size=(rows, cols, 2))
+    gaussian_shifts = random_state.normal(0, std, size=(rows, cols, 2))
     gaussian_shifts = gaussian_shifts.astype(np.float32)
 
     # creating evenly spaced coordinates
@@ -336,8 +332,8 @@ def segmentation_mapping(image: Union[List[np.ndarray], np.ndarray],
 
             for map_by_attribute in map_by:
 
-                # create result map
-                resulting_map = np.zeros((stereo_image.shape[0], stereo_image.shape[1]), dtype=np.float64)
+                # maps each object id to its value, so the result map can be built in one lookup
+                lookup_table = np.zeros(np.max(object_ids) + 1, dtype=np.float64)
 
                 # save the type of the stored variable in the resulting map
                 found_dtype = None
@@ -349,6 +345,9 @@ def segmentation_mapping(image: Union[List[np.ndarray], np.ndarray],
                     current_attribute = "category_id"
                 if map_by_attribute == "instance":
                     mapped_results_stereo_dict.setdefault(f"{map_by_attribute}_segmaps", []).append(stereo_image)
+                    # the names allow to map the instance ids back to the objects, see map_instance_segmaps()
+                    for object_id in object_ids:
+                        non_image_attributes.setdefault(object_id, {})["name"] = object_ids_to_object[object_id].name
                 else:
                     # check if a default value was specified
                     default_value_set = False
@@ -393,7 +392,7 @@ def segmentation_mapping(image: Union[List[np.ndarray], np.ndarray],
 
                         # save everything which is not instance also in the .csv
                         if isinstance(value, (int, float, np.integer, np.floating)):
-                            resulting_map[stereo_image == object_id] = value
+                            lookup_table[object_id] = value
                             found_dtype = type(value)
 
                         if isinstance(value, (mathutils.Vector, mathutils.Matrix)):
@@ -406,7 +405,12 @@ def segmentation_mapping(image: Union[List[np.ndarray], np.ndarray],
 
                     # if a value was found the resulting map should be stored
                     if found_dtype is not None:
-                        resulting_map = resulting_map.astype(found_dtype)
+                        if issubclass(found_dtype, (int, np.integer)) and np.min(lookup_table) >= 0:
+                            # as in render_segmap(), use the smallest dtype which can store all values
+                            for found_dtype in [np.uint8, np.uint16, np.uint32, np.uint64]:
+                                if np.iinfo(found_dtype).max >= np.max(lookup_table):
+                                    break
+                        resulting_map = lookup_table.astype(found_dtype)[stereo_image]
                         mapped_results_stereo_dict.setdefault(f"{map_by_attribute}_segmaps", []).append(resulting_map)
                     elif "instance" not in map_by:
                         raise ValueError(f"The map_by key \"{map_by_attribute}\" requires that the instance map is "
@@ -433,89 +437,3 @@ def segmentation_mapping(image: Union[List[np.ndarray], np.ndarray],
         # this still works with stereo image as they are fused together in here
         return {key: value[0] for key, value in return_dict.items()}
     return return_dict
-
-
-class _PostProcessingUtility:
-
-    @staticmethod
-    def get_pixel_neighbors(data: np.ndarray, i: int, j: int) -> np.ndarray:
-        """ Returns the valid neighbor pixel indices of the given pixel.
-
-        :param data: The whole image data.
-        :param i: The row index of the pixel
-        :param j: The col index of the pixel.
-        :return: A list of neighbor point indices.
-        """
-        neighbors = []
-        for p in range(max(0, i - 1), min(data.shape[0], i + 2)):
-            for q in range(max(0, j - 1), min(data.shape[1], j + 2)):
-                if not (p == i and q == j):  # We don't want the current pixel, just the neighbors
-                    neighbors.append([p, q])
-
-        return np.array(neighbors)
-
-    @staticmethod
-    def get_pixel_neighbors_stacked(img: np.ndarray, filter_size: int = 3,
-                                    return_list: bool = False) -> Union[list, np.ndarray]:
-        """
-        Stacks the neighbors of each pixel according to a square filter around each given pixel in the depth dimensions.
-        The neighbors are represented by shifting the input image in all directions required to simulate the filter.
-
-        :param img: Input image. Type: blender object of type image.
-        :param filter_size: Filter size. Type: int. Default: 5..
-        :param return_list: Instead of stacking in the output array, just return a list of the "neighbor" \
-                            images along with the input image.
-        :return: Either a tensor with the "neighbor" images stacked in a separate additional dimension, or a list of \
-                 images of the same shape as the input image, containing the shifted images (simulating the neighbors) \
-                 and the input image.
-        """
-        _min = -int(filter_size / 2)
-        _max = _min + filter_size
-
-        rows, cols = img.shape[0], img.shape[1]
-
-        channels = [img]
-        for p in range(_min, _max):
-            for q in range(_min, _max):
-                if p == 0 and q == 0:
-                    continue
-                shifted = np.zeros_like(img)
-                shifted[max(p, 0):min(rows, rows + p), max(q, 0):min(cols, cols + q)] = img[
-                                                                                        max(-p, 0):min(rows - p, rows),
-                                                                                        max(-q, 0):min(cols - q, cols)]
-
-                channels.append(shifted)
-
-        if return_list:
-            return channels
-        return np.dstack(tuple(channels))
-
-    @staticmethod
-    def is_in(element, test_elements, assume_unique=False, invert=False):
-        """ As np.isin is only available after v1.13 and blender is using 1.10.1 we have to implement it manually. """
-        element = np.asarray(element)
-        return np.in1d(element, test_elements, assume_unique=assume_unique, invert=invert).reshape(element.shape)
-
-    @staticmethod
-    def determine_noisy_pixels(image: np.ndarray) -> np.ndarray:
-        """
-        :param image: The image data.
-        :return: a list of 2D indices that correspond to the noisy pixels. One criterion of finding \
-                              these pixels is to use a histogram and find the pixels with frequencies lower than \
-                              a threshold, e.g. 100.
-        """
-        # The map was scaled to be ranging along the entire 16-bit color depth, and this is the scaling down operation
-        # that should remove some noise or deviations
-        image = ((image * 37) / (65536))  # assuming 16 bit color depth
-        image = image.astype(np.int32)
-        b, counts = np.unique(image.flatten(), return_counts=True)
-
-        # Removing further noise where there are some stray pixel values with very small counts, by assigning them to
-        # their closest (numerically, since this deviation is a
-        # result of some numerical operation) neighbor.
-        hist = sorted((np.asarray((b, counts)).T), key=lambda x: x[1])
-        # Assuming the stray pixels wouldn't have a count of more than 100
-        noise_vals = [h[0] for h in hist if h[1] <= 100]
-        noise_indices = np.argwhere(_PostProcessingUtility.is_in(image, noise_vals))
-
-        return noise_indices
@@ -1,7 +1,7 @@
 """Provides functionality to render a color, normal, depth and distance image."""
 
 import os
-from typing import Union, Dict, List, Set, Optional, Any
+from typing import Union, Dict, List, Set, Optional, Any, Callable
 import math
 import sys
 import platform
@@ -17,6 +17,19 @@
 from blenderproc.python.utility.Utility import Utility
 from blenderproc.python.writer.WriterUtility import _WriterUtility
 
+# Functions, which are called by render() before anything is rendered, see register_pre_render_hook()
+_pre_render_hooks: List[Callable[[], None]] = []
+
+
+def register_pre_render_hook(hook: Callable[[], None]):
+    """ Registers a function, which is called every time right before rendering, e.g. to load the textures of
+    lazily loaded materials. A function which is already registered is not added again.
+
+    :param hook: The function, it is called without arguments.
+    """
+    if hook not in _pre_render_hooks:
+        _pre_render_hooks.append(hook)
+
 
 def set_denoiser(denoiser: Optional[str]):
     """ Enables the specified denoiser.
@@ -426,19 +439,22 @@ def enable_segmentation_output(map_by: Union[str, List[str]] = "category_id",
     can not be stored in the image itself an instance image has to be generated. The output then will contain a
     dictionary mapping the instance ids to the attributes of the objects.
 
+    The segmentation is rendered in the same render call as the colors, so no second scene setup is required. The
+    object ids are not blended at the borders of objects, as they are taken from the first sample of each pixel.
+
     :param map_by: Map by keys, either a single str or a list of str.
     :param default_values: A dictionary offering a default value for objects which do not provide a value
                            for a certain key
     :param pass_alpha_threshold: This alpha threshold is used to decide which object to use a low value means that an
                                  object has to be nearly completely transparent to be considered transparent, while
-                                 materials such as frosted class with an alpha value of 0.5 would be considered opaque
+                                 materials such as frosted class with an alpha value of 0.5 would be considered opaque.
+                                 If this is 0, the first surface hit is always used, even if it is fully transparent,
+                                 which is needed to label transparent or transmissive objects.
     :param output_dir: The temporary output dir in which the resulting .exr images are saved
     :param file_prefix: The prefix to use for writing the files.
     :param output_key: The key to use for registering the segmentation output.
     """
-    # give all objects an id, background is always zero
-    for index, obj in enumerate(get_all_blender_mesh_objects()):
-        obj.pass_index = index + 1
+    _assign_pass_indices()
 
     # add the pass object index id to the rendering output
     bpy.context.scene.render.use_compositing = True
@@ -456,6 +472,8 @@ def enable_segmentation_output(map_by: Union[str, List[str]] = "category_id",
     output_node = tree.nodes.new('CompositorNodeOutputFile')
     output_node.base_path = output_dir
     output_node.format.file_format = "OPEN_EXR"
+    # half floats can only store integers up to 2048 exactly
+    output_node.format.color_depth = "32"
     output_node.file_slots.values()[0].path = file_prefix
     Utility.add_output_entry({
         "key": output_key,
@@ -473,6 +491,15 @@ def enable_segmentation_output(map_by: Union[str, List[str]] = "category_id",
     bpy.context.scene.view_layers["ViewLayer"].pass_alpha_threshold = pass_alpha_threshold
 
 
+def _assign_pass_indices():
+    """ Gives all mesh objects a unique pass index, which is used as their id in the segmentation output.
+
+    The background always has the id zero.
+    """
+    for index, obj in enumerate(get_all_blender_mesh_objects()):
+        obj.pass_index = index + 1
+
+
 def enable_diffuse_color_output(output_dir: Optional[str] = None, file_prefix: str = "diffuse_",
                                 output_key: str = "diffuse"):
     """ Enables writing diffuse color (albedo) images.
@@ -525,7 +552,9 @@ def map_file_format_to_file_ending(file_format: str) -> str:
 
 def render(output_dir: Optional[str] = None, file_prefix: str = "rgb_", output_key: Optional[str] = "colors",
            load_keys: Optional[Set[str]] = None, return_data: bool = True,
-           keys_with_alpha_channel: Optional[Set[str]] = None) -> Dict[str, Union[np.ndarray, List[np.ndarray]]]:
+           keys_with_alpha_channel: Optional[Set[str]] = None, in_memory: bool = False,
+           frame_callback: Optional[Callable[[Dict[str, Any]], None]] = None) \
+        -> Dict[str, Union[np.ndarray, List[np.ndarray]]]:
     """ Render all frames.
 
     This will go through all frames from scene.frame_start to scene.frame_end and render each of them.
@@ -537,6 +566,15 @@ def render(output_dir: Optional[str] = None, file_prefix: str = "rgb_", output_k
     :param load_keys: Set of output keys to load when available
     :param return_data: Whether to load and return generated data. Backwards compatibility to config-based pipeline.
     :param keys_with_alpha_channel: A set containing all keys whose alpha channels should be loaded.
+    :param in_memory: If True, the color images are not written to disk, but read directly from blender's image \
+                      buffer. This does not work for stereo rendering. If the output format is not "OPEN_EXR", the \
+                      view transform has to be "Standard" or "Raw" without any look, exposure or gamma, as others \
+                      like "Filmic" can not be applied outside of blender. In contrast to blender, no dithering is \
+                      applied. All other outputs like distance or segmentation are still written to disk.
+    :param frame_callback: If given, the frames are rendered one by one and the data of each frame is handed to \
+                           this function right after the frame has been rendered, e.g. the write_frame() method of \
+                           a bproc.writer.Hdf5StreamWriter. So the frames can be written, while the next ones are \
+                           rendered. The frames are not collected, so an empty dict is returned.
     :return: dict of lists of raw renderer output. Keys can be 'distance', 'colors', 'normals'
     """
     if output_dir is None:
@@ -544,8 +582,10 @@ def render(output_dir: Optional[str] = None, file_prefix: str = "rgb_", output_k
     if load_keys is None:
         load_keys = {'colors', 'distance', 'normals', 'diffuse', 'depth', 'segmap'}
         keys_with_alpha_channel = {'colors'} if bpy.context.scene.render.film_transparent else None
+    if in_memory and bpy.context.scene.render.use_multiview:
+        raise RuntimeError("Rendering in memory is not supported for stereo rendering.")
 
-    if output_key is not None:
+    if output_key is not None and not in_memory:
         Utility.add_output_entry({
             "key": output_key,
             "path": os.path.join(output_dir, file_prefix) + "%04d" +
@@ -556,22 +596,156 @@ def render(output_dir: Optional[str] = None, file_prefix: str = "rgb_", output_k
 
     bpy.context.scene.render.filepath = os.path.join(output_dir, file_prefix)
 
+    # e.g. loads the textures of lazily loaded materials, which are actually visible
+    for hook in _pre_render_hooks:
+        hook()
+
+    # Objects which have been added after enabling the segmentation output also need an id
+    if any(reg_out.get("is_semantic_segmentation", False) for reg_out in Utility.get_registered_outputs()):
+        _assign_pass_indices()
+
     # Skip if there is nothing to render
     if bpy.context.scene.frame_end != bpy.context.scene.frame_start:
         if len(get_all_blender_mesh_objects()) == 0:
             raise Exception("There are no mesh-objects to render, "
                             "please load an object before invoking the renderer.")
-        # As frame_end is pointing to the next free frame, decrease it by one, as
-        # blender will render all frames in [frame_start, frame_ned]
-        bpy.context.scene.frame_end -= 1
-        bpy.ops.render.render(animation=True, write_still=True)
-        # Revert changes
-        bpy.context.scene.frame_end += 1
+        load_alpha_channel = keys_with_alpha_channel is not None and output_key in keys_with_alpha_channel
+        if frame_callback is not None:
+            _render_frame_by_frame(frame_callback, load_keys if return_data else set(), keys_with_alpha_channel,
+                                   in_memory, output_key, load_alpha_channel)
+            return {}
+        if in_memory:
+            colors = [_convert_color_image(image, load_alpha_channel) for image in render_into_memory()]
+        else:
+            # As frame_end is pointing to the next free frame, decrease it by one, as
+            # blender will render all frames in [frame_start, frame_ned]
+            bpy.context.scene.frame_end -= 1
+            bpy.ops.render.render(animation=True, write_still=True)
+            # Revert changes
+            bpy.context.scene.frame_end += 1
     else:
         raise RuntimeError("No camera poses have been registered, therefore nothing can be rendered. A camera "
                            "pose can be registered via bproc.camera.add_camera_pose().")
 
-    return _WriterUtility.load_registered_outputs(load_keys, keys_with_alpha_channel) if return_data else {}
+    if not return_data:
+        return {}
+    data = _WriterUtility.load_registered_outputs(load_keys, keys_with_alpha_channel)
+    if in_memory and output_key is not None:
+        data[output_key] = colors
+    return data
+
+
+def _render_frame_by_frame(frame_callback: Callable[[Dict[str, Any]], None], load_keys: Set[str],
+                           keys_with_alpha_channel: Optional[Set[str]], in_memory: bool, output_key: Optional[str],
+                           load_alpha_channel: bool):
+    """ Renders the frames one by one and hands the data of each frame to the given callback.
+
+    :param frame_callback: The function, which gets the data of each frame.
+    :param load_keys: Set of output keys to load when available.
+    :param keys_with_alpha_channel: A set containing all keys whose alpha channels should be loaded.
+    :param in_memory: If True, the colors are read from blender's image buffer, see render().
+    :param output_key: The key of the colors rendered in memory.
+    :param load_alpha_channel: Whether the alpha channel of the colors rendered in memory should be kept.
+    """
+    scene = bpy.context.scene
+    frame_start, frame_end = scene.frame_start, scene.frame_end
+    try:
+        for frame in range(frame_start, frame_end):
+            # the frame range is reduced to the current frame, so only its outputs are written and loaded
+            scene.frame_start, scene.frame_end = frame, frame + 1
+            if in_memory:
+                colors = _convert_color_image(render_into_memory()[0], load_alpha_channel)
+            else:
+                # blender renders all frames in [frame_start, frame_end]
+                scene.frame_end = frame
+                bpy.ops.render.render(animation=True, write_still=True)
+                scene.frame_end = frame + 1
+            frame_data: Dict[str, Any] = {}
+            for key, data_block in _WriterUtility.load_registered_outputs(load_keys, keys_with_alpha_channel).items():
+                # outputs, which are written only once per run, are handed over as they are
+                frame_data[key] = data_block[0] if isinstance(data_block, list) else data_block
+            if in_memory and output_key is not None and load_keys:
+                frame_data[output_key] = colors
+            frame_callback(frame_data)
+    finally:
+        scene.frame_start, scene.frame_end = frame_start, frame_end
+
+
+def render_into_memory() -> List[np.ndarray]:
+    """ Renders all frames one by one and reads the composited image of each frame from blender's image buffer.
+
+    For this a viewer node is added to the compositor, the file output nodes of other outputs still write their
+    files as usual.
+
+    :return: The image of each frame as float32 array of shape (height, width, 4) in linear color space, the colors
+             are premultiplied with the alpha channel.
+    """
+    bpy.context.scene.render.use_compositing = True
+    bpy.context.scene.use_nodes = True
+    tree = bpy.context.scene.node_tree
+
+    # Show the image, which would be written to the color output
+    composite_nodes = Utility.get_nodes_with_type(tree.nodes, "CompositorNodeComposite")
+    if composite_nodes and composite_nodes[0].inputs["Image"].is_linked:
+        image_socket = composite_nodes[0].inputs["Image"].links[0].from_socket
+    else:
+        image_socket = tree.nodes.get("Render Layers").outputs["Image"]
+    viewer_node = tree.nodes.new("CompositorNodeViewer")
+    viewer_node.use_alpha = True
+    tree.links.new(image_socket, viewer_node.inputs["Image"])
+    tree.nodes.active = viewer_node
+
+    images = []
+    try:
+        for frame in range(bpy.context.scene.frame_start, bpy.context.scene.frame_end):
+            bpy.context.scene.frame_set(frame)
+            bpy.ops.render.render(write_still=False)
+
+            viewer_image = bpy.data.images["Viewer Node"]
+            width, height = viewer_image.size
+            pixels = np.empty(width * height * 4, dtype=np.float32)
+            viewer_image.pixels.foreach_get(pixels)
+            # blender stores the rows from bottom to top
+            images.append(np.flipud(pixels.reshape(height, width, 4)))
+    finally:
+        tree.nodes.remove(viewer_node)
+    return images
+
+
+def _convert_color_image(image: np.ndarray, load_alpha_channel: bool) -> np.ndarray:
+    """ Converts a rendered linear image into the values, which would have been loaded from the color output file.
+
+    :param image: The premultiplied float image of shape (height, width, 4), as returned by render_into_memory().
+    :param load_alpha_channel: Whether the alpha channel should be kept.
+    :return: The converted image.
+    """
+    image_settings = bpy.context.scene.render.image_settings
+    image = image if load_alpha_channel else image[:, :, :3]
+    if image_settings.file_format == "OPEN_EXR":
+        return image
+
+    view_settings = bpy.context.scene.view_settings
+    if view_settings.view_transform not in ["Standard", "Raw"] or view_settings.look != "None" \
+            or view_settings.exposure != 0 or view_settings.gamma != 1 or view_settings.use_curve_mapping:
+        raise RuntimeError(f"The view transform {view_settings.view_transform} with the look {view_settings.look} "
+                           f"can not be applied to images rendered in memory, use the view transform \"Standard\" "
+                           f"or store the colors as \"OPEN_EXR\".")
+
+    image = image.copy()
+    if load_alpha_channel:
+        # image files store the colors not premultiplied
+        alpha = image[:, :, 3:]
+        image[:, :, :3] = np.divide(image[:, :, :3], alpha, out=np.zeros_like(image[:, :, :3]), where=alpha > 0)
+    if view_settings.view_transform == "Standard":
+        # sRGB transfer function
+        rgb = np.clip(image[:, :, :3], 0, 1)
+        image[:, :, :3] = np.where(rgb <= 0.0031308, rgb * 12.92,
+                                   1.055 * np.power(np.maximum(rgb, 0.0031308), 1 / 2.4) - 0.055)
+
+    # quantize as the image file would be
+    dtype = np.uint16 if image_settings.color_depth == "16" else np.uint8
+    max_value = np.iinfo(dtype).max
+    return np.round(np.clip(image, 0, 1) * max_value).astype(dtype)
 
 
 def set_output_format(file_format: Optional[str] = None, color_depth: Optional[int] = None,
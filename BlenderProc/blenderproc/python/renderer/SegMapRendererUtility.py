@@ -19,7 +19,8 @@ def render_segmap(output_dir: Optional[str] = None, temp_dir: Optional[str] = No
                   default_values: Optional[Dict[str, int]] = None, file_prefix: str = "segmap_",
                   output_key: str = "segmap", segcolormap_output_file_prefix: str = "instance_attribute_map_",
                   segcolormap_output_key: str = "segcolormap", use_alpha_channel: bool = False,
-                  render_colorspace_size_per_dimension: int = 2048) -> Dict[str, Union[np.ndarray, List[np.ndarray]]]:
+                  render_colorspace_size_per_dimension: int = 2048,
+                  in_memory: bool = False) -> Dict[str, Union[np.ndarray, List[np.ndarray]]]:
     """ Renders segmentation maps for all frames
 
     :param output_dir: The directory to write images to.
@@ -36,6 +37,8 @@ def render_segmap(output_dir: Optional[str] = None, temp_dir: Optional[str] = No
                                                  blender does not allow negative values for colors, we use \
                                                  [0, 2048] ** 3 as our color space which allows ~8 billion \
                                                  different colors/objects. This should be enough.
+    :param in_memory: If True, the rendered segmentation is read directly from blender's image buffer instead of \
+                      writing and reading .exr files. This does not work for stereo rendering.
     :return: dict of lists of segmaps and (for instance segmentation) segcolormaps
     """
 
@@ -74,8 +77,13 @@ def render_segmap(output_dir: Optional[str] = None, temp_dir: Optional[str] = No
         temporary_segmentation_file_path = os.path.join(temp_dir, "seg_")
         final_segmentation_file_path = os.path.join(output_dir, file_prefix)
 
-        RendererUtility.set_output_format("OPEN_EXR", 16)
-        RendererUtility.render(temp_dir, "seg_", None, return_data=False)
+        if in_memory:
+            if bpy.context.scene.render.use_multiview:
+                raise RuntimeError("Rendering in memory is not supported for stereo rendering.")
+            rendered_images = RendererUtility.render_into_memory()
+        else:
+            RendererUtility.set_output_format("OPEN_EXR", 16)
+            RendererUtility.render(temp_dir, "seg_", None, return_data=False)
 
         # Find optimal dtype of output based on max index
         for dtype in [np.uint8, np.uint16, np.uint32]:
@@ -110,9 +118,12 @@ def render_segmap(output_dir: Optional[str] = None, temp_dir: Optional[str] = No
 
             there_was_an_instance_rendering = False
             for suffix in suffixes:
-                file_path = temporary_segmentation_file_path + f"{frame:04d}" + suffix + ".exr"
-                segmentation = load_image(file_path)
-                print(file_path, segmentation.shape)
+                if in_memory:
+                    segmentation = rendered_images[frame - bpy.context.scene.frame_start][:, :, :3]
+                else:
+                    file_path = temporary_segmentation_file_path + f"{frame:04d}" + suffix + ".exr"
+                    segmentation = load_image(file_path)
+                    print(file_path, segmentation.shape)
 
                 segmap = Utility.map_back_from_equally_spaced_equidistant_values(segmentation,
                                                                                  num_splits_per_dimension,
@@ -141,6 +152,10 @@ def render_segmap(output_dir: Optional[str] = None, temp_dir: Optional[str] = No
                         there_was_an_instance_rendering = True
                         resulting_map = segmap
                         was_used = True
+                        # the names allow to map the instance ids back to the objects, see map_instance_segmaps()
+                        for object_id in object_ids:
+                            save_in_csv_attributes.setdefault(int(object_id), {})["name"] = \
+                                objects[int(object_id)].name
                     else:
                         if current_attribute != "cp_category_id":
                             list_of_attributes.append(current_attribute)
@@ -148,52 +163,29 @@ def render_segmap(output_dir: Optional[str] = None, temp_dir: Optional[str] = No
                         attribute = current_attribute
                         if attribute.startswith("cp_"):
                             attribute = attribute[len("cp_"):]
-                        # check if a default value was specified
-                        default_value_set = False
-                        if current_attribute in default_values or attribute in default_values:
-                            default_value_set = True
-                            if current_attribute in default_values:
-                                default_value = default_values[current_attribute]
-                            elif attribute in default_values:
-                                default_value = default_values[attribute]
+                        # maps each object id to its value, so the map can be built in one lookup
+                        lookup_table = np.zeros(max_id + 1, dtype=optimal_dtype)
                         # iterate over all object ids
                         for object_id in object_ids:
                             # Convert np.uint8 to int, such that the save_in_csv_attributes dict can later be serialized
                             object_id = int(object_id)
                             # get the corresponding object via the id
-                            current_obj = objects[object_id]
-                            # if the current obj has a attribute with that name -> get it
-                            if hasattr(current_obj, attribute):
-                                value = getattr(current_obj, attribute)
-                            # if the current object has a custom property with that name -> get it
-                            elif current_attribute.startswith("cp_") and attribute in current_obj:
-                                value = current_obj[attribute]
-                            elif current_attribute.startswith("cf_"):
-                                if current_attribute == "cf_basename":
-                                    value = current_obj.name
-                                    if "." in value:
-                                        value = value[:value.rfind(".")]
-                            elif default_value_set:
-                                # if none of the above applies use the default value
-                                value = default_value
+                            value, is_default_value = _get_attribute_value(objects[object_id], current_attribute,
+                                                                           default_values)
+                            if is_default_value:
                                 num_default_values += 1
-                            else:
-                                # if the requested current_attribute is not a custom property or an attribute
-                                # or there is a default value stored
-                                # it throws an exception
-                                raise RuntimeError(f"The obj: {current_obj.name} does not have the "
-                                                   f"attribute: {current_attribute}, striped: {attribute}. "
-                                                   f"Maybe try a default value.")
 
                             # save everything which is not instance also in the .csv
                             if isinstance(value, (int, float, np.integer, np.floating)):
                                 was_used = True
-                                resulting_map[segmap == object_id] = value
+                                lookup_table[object_id] = value
 
                             if object_id in save_in_csv_attributes:
                                 save_in_csv_attributes[object_id][attribute] = value
                             else:
                                 save_in_csv_attributes[object_id] = {attribute: value}
+                        if was_used:
+                            resulting_map = lookup_table[segmap]
 
                     if was_used and num_default_values < len(object_ids):
                         channels.append(org_attribute)
@@ -255,6 +247,102 @@ def render_segmap(output_dir: Optional[str] = None, temp_dir: Optional[str] = No
     return return_dict
 
 
+def map_instance_segmaps(instance_segmaps: List[np.ndarray], instance_attribute_maps: List[List[Dict[str, Any]]],
+                         map_by: Union[str, List[str]] = "class", default_values: Optional[Dict[str, Any]] = None) \
+        -> Dict[str, List[np.ndarray]]:
+    """ Maps instance segmentation maps to the given attributes of the objects, without rendering again.
+
+    The attributes are read from the objects at the time of calling this function, so e.g. the custom property
+    `category_id` can be changed after rendering and the class maps can be computed again via this function. This
+    requires that the objects have not been deleted or renamed since rendering.
+
+    .. code-block:: python
+
+        data = bproc.renderer.render_segmap(map_by=["instance", "class"])
+        # relabel the objects
+        data.update(bproc.renderer.map_instance_segmaps(data["instance_segmaps"], data["instance_attribute_maps"],
+                                                        map_by="class"))
+
+    :param instance_segmaps: The instance segmentation maps of all frames, as returned by render_segmap().
+    :param instance_attribute_maps: The instance attribute maps of all frames, as returned by render_segmap(). They
+                                    map the instance ids to the names of the objects.
+    :param map_by: The attributes to map the instance ids to, e.g. "class" or a custom property like "cp_my_prop".
+                   Only attributes with numeric values are supported.
+    :param default_values: The default values used for the keys used in attributes, if None is {"class": 0}.
+    :return: dict of lists of segmaps, one list per given attribute.
+    """
+    if default_values is None:
+        default_values = {"class": 0}
+    if 'class' in default_values:
+        default_values['cp_category_id'] = default_values['class']
+    if isinstance(map_by, str):
+        map_by = [map_by]
+
+    return_dict: Dict[str, List[np.ndarray]] = {}
+    for segmap, attribute_map in zip(instance_segmaps, instance_attribute_maps):
+        # the id zero is always the world background
+        objects = {mapping["idx"]: bpy.context.scene.world if mapping["idx"] == 0 else bpy.data.objects[mapping["name"]]
+                   for mapping in attribute_map}
+        max_id = max(max(objects.keys(), default=0), int(np.max(segmap)))
+        for org_attribute in map_by:
+            current_attribute = "cp_category_id" if org_attribute == "class" else org_attribute
+            values = np.zeros(max_id + 1)
+            for object_id, obj in objects.items():
+                value, _ = _get_attribute_value(obj, current_attribute, default_values)
+                if not isinstance(value, (int, float, np.integer, np.floating)):
+                    raise RuntimeError(f"The attribute {org_attribute} of the obj: {obj.name} is not a number and "
+                                       f"can therefore not be stored in a segmentation map: {value}")
+                values[object_id] = value
+
+            # Use the smallest dtype, which can store all values
+            if np.all(values == np.round(values)) and np.min(values) >= 0:
+                for dtype in [np.uint8, np.uint16, np.uint32]:
+                    if np.iinfo(dtype).max >= np.max(values):
+                        break
+                lookup_table = values.astype(dtype)
+            else:
+                lookup_table = values.astype(np.float32)
+            return_dict.setdefault(f"{org_attribute}_segmaps", []).append(lookup_table[segmap])
+    return return_dict
+
+
+def _get_attribute_value(obj: Union[bpy.types.Object, bpy.types.World], current_attribute: str,
+                         default_values: Dict[str, Any]) -> Tuple[Any, bool]:
+    """ Returns the value of the given attribute of the given object.
+
+    :param obj: The object or the world, whose attribute should be returned.
+    :param current_attribute: The attribute, custom properties are prefixed with "cp_" and "cf_basename" returns the
+                              name of the object without its numbering suffix.
+    :param default_values: The default values, which are used if the object does not provide the attribute.
+    :return: The value and whether it is the default value.
+    """
+    # for the current attribute remove cp_, if present
+    attribute = current_attribute
+    if attribute.startswith("cp_"):
+        attribute = attribute[len("cp_"):]
+    # if the current obj has a attribute with that name -> get it
+    if hasattr(obj, attribute):
+        return getattr(obj, attribute), False
+    # if the current object has a custom property with that name -> get it
+    if current_attribute.startswith("cp_") and attribute in obj:
+        return obj[attribute], False
+    if current_attribute == "cf_basename":
+        value = obj.name
+        if "." in value:
+            value = value[:value.rfind(".")]
+        return value, False
+    # if none of the above applies use the default value
+    if current_attribute in default_values:
+        return default_values[current_attribute], True
+    if attribute in default_values:
+        return default_values[attribute], True
+    # if the requested current_attribute is not a custom property or an attribute
+    # or there is a default value stored
+    # it throws an exception
+    raise RuntimeError(f"The obj: {obj.name} does not have the attribute: {current_attribute}, striped: {attribute}. "
+                       f"Maybe try a default value.")
+
+
 def _colorize_object(obj: bpy.types.Object, color: mathutils.Vector, use_alpha_channel: bool):
     """ Adjusts the materials of the given object, s.t. they are ready for rendering the seg map.
 
@@ -1,6 +1,5 @@
 """ Uniformly samples 3-dimensional value over the bounding box of the specified objects """
 
-import math
 import random
 from typing import List, Union, Optional, Tuple
 
@@ -26,7 +25,7 @@ def upper_region(objects_to_sample_on: Union[MeshObject, List[MeshObject]],
 
     .. code-block:: python
 
-        UpperRegionSampler.sample(
+        upper_region(
             objects_to_sample_on=objs,
             min_height=1.5,
             max_height=1.8
@@ -49,79 +48,166 @@ def upper_region(objects_to_sample_on: Union[MeshObject, List[MeshObject]],
         face_sample_range = [0.0, 1.0]
     if upper_dir is None:
         upper_dir = [0.0, 0.0, 1.0]
+    if not isinstance(objects_to_sample_on, list):
+        objects_to_sample_on = [objects_to_sample_on]
 
+    # the regions are determined like in the sampler, but without building bvh trees for a single point
+    regions = UpperRegionSampler(objects_to_sample_on, face_sample_range, min_height, max_height,
+                                 upper_dir=upper_dir, use_upper_dir=use_upper_dir).regions
     face_sample_range = np.array(face_sample_range)
-    upper_dir = np.array(upper_dir)
+    upper_dir = np.array(upper_dir, dtype=np.float64)
     upper_dir /= np.linalg.norm(upper_dir)
-    if not isinstance(objects_to_sample_on, list):
-        objects_to_sample_on = [objects_to_sample_on]
 
-    if max_height < min_height:
-        raise RuntimeError(f"The minimum height ({min_height}) must be smaller than the maximum height ({max_height})!")
+    selected_region_id = random.randint(0, len(regions) - 1)
+    selected_region, obj = regions[selected_region_id], objects_to_sample_on[selected_region_id]
+    if use_ray_trace_check:
+        inv_world_matrix = np.linalg.inv(obj.get_local2world_mat())
+    while True:
+        ret = selected_region.sample_point(face_sample_range)
+        dir_val = upper_dir if use_upper_dir else selected_region.normal()
+        ret += dir_val * random.uniform(min_height, max_height)
+        if use_ray_trace_check:
+            # transform the coords into the reference frame of the object
+            c_ret = inv_world_matrix @ np.concatenate((ret, [1]), 0)
+            c_dir = inv_world_matrix @ np.concatenate((dir_val * -1.0, [0]), 0)
+            # check if the object was hit
+            hit, _, _, _ = obj.ray_cast(c_ret[:3], c_dir[:3])
+            if hit:  # if the object was hit return
+                break
+        else:
+            break
+    return np.array(ret)
 
-    regions = []
 
-    def calc_vec_and_normals(face: List[np.ndarray]) -> Tuple[Tuple[np.ndarray, np.ndarray], np.ndarray]:
-        """ Calculates the two vectors, which lie in the plane of the face and the normal of the face.
+class UpperRegionSampler:
+    """
+    Reusable version of upper_region(), which determines the regions to sample on only once for the given objects.
 
-        :param face: Four corner coordinates of a face. Type: [4x[3xfloat]].
-        :return: (two vectors in the plane), and the normal.
+    This should be used, if many points are sampled above the same objects, e.g. while sampling candidate poses for
+    objects, which should be placed on a surface. The objects are expected to not move after the sampler has been
+    created.
+
+    .. code-block:: python
+
+        sampler = UpperRegionSampler(objs, min_height=1.5, max_height=1.8)
+        points = sampler.sample(100)
+    """
+
+    def __init__(self, objects_to_sample_on: Union[MeshObject, List[MeshObject]],
+                 face_sample_range: Optional[Union[Vector, np.ndarray, List[float]]] = None, min_height: float = 0.0,
+                 max_height: float = 1.0, use_ray_trace_check: bool = False,
+                 upper_dir: Optional[Union[Vector, np.ndarray, List[float]]] = None, use_upper_dir: bool = True):
+        """ Determines for each object the face of its bounding box, which is closest to the upper direction.
+
+        :param objects_to_sample_on: Objects, on which to sample on.
+        :param face_sample_range: Restricts the area on the face where objects are sampled. Specifically describes
+                                  relative lengths of both face vectors between which points are sampled.
+                                  Default: [0.0, 1.0]
+        :param min_height: Minimum distance to the bounding box that a point is sampled on.
+        :param max_height: Maximum distance to the bounding box that a point is sampled on.
+        :param use_ray_trace_check: Toggles using a ray casting towards the sampled object (if the object is directly
+                                    below the sampled position is the position accepted).
+        :param upper_dir: The 'up' direction of the sampling box. Default: [0.0, 0.0, 1.0].
+        :param use_upper_dir: Toggles using a ray casting towards the sampled object (if the object is directly
+                              below the sampled position is the position accepted).
+        """
+        if face_sample_range is None:
+            face_sample_range = [0.0, 1.0]
+        if upper_dir is None:
+            upper_dir = [0.0, 0.0, 1.0]
+        if not isinstance(objects_to_sample_on, list):
+            objects_to_sample_on = [objects_to_sample_on]
+        if max_height < min_height:
+            raise RuntimeError(f"The minimum height ({min_height}) must be smaller than the maximum height "
+                               f"({max_height})!")
+        if not objects_to_sample_on:
+            raise RuntimeError("The amount of regions is either zero or does not match the amount of objects!")
+
+        self._face_sample_range = np.array(face_sample_range)
+        self._upper_dir = np.array(upper_dir, dtype=np.float64)
+        self._upper_dir /= np.linalg.norm(self._upper_dir)
+        self._min_height = min_height
+        self._max_height = max_height
+        self._use_upper_dir = use_upper_dir
+
+        self.regions = [self._select_region(obj) for obj in objects_to_sample_on]
+        # stack the regions, so points on many regions can be sampled at once
+        self._base_points = np.array([region.base_point() for region in self.regions])
+        self._vectors = np.array([region.vectors() for region in self.regions])
+        self._normals = np.array([region.normal() for region in self.regions])
+
+        # the bvh trees are in world coordinates, so the sampled points do not have to be transformed for ray casting
+        self._bvh_trees = [obj.create_bvh_tree() for obj in objects_to_sample_on] if use_ray_trace_check else None
+
+    def _select_region(self, obj: MeshObject) -> "Region2D":
+        """ Selects the face of the bounding box of the given object, which has the smallest angle to the upper
+        direction.
+
+        :param obj: The object to sample on.
+        :return: The region of the selected face.
         """
-        vec1 = face[1] - face[0]
-        vec2 = face[3] - face[0]
-        normal = np.cross(vec1, vec2)
-        normal /= np.linalg.norm(normal)
-        return (vec1, vec2), normal
-
-    # determine for each object in objects the region, where to sample on
-    for obj in objects_to_sample_on:
         bb = obj.get_bound_box()
-        faces = []
-        faces.append([bb[0], bb[1], bb[2], bb[3]])
-        faces.append([bb[0], bb[4], bb[5], bb[1]])
-        faces.append([bb[1], bb[5], bb[6], bb[2]])
-        faces.append([bb[6], bb[7], bb[3], bb[2]])
-        faces.append([bb[3], bb[7], bb[4], bb[0]])
-        faces.append([bb[7], bb[6], bb[5], bb[4]])
-        # select the face, which has the smallest angle to the upper direction
-        min_diff_angle = 2 * math.pi
-        selected_face = None
-        for face in faces:
-            # calc the normal of all faces
-            _, normal = calc_vec_and_normals(face)
-            diff_angle = math.acos(normal.dot(upper_dir))
-            if diff_angle < min_diff_angle:
-                min_diff_angle = diff_angle
-                selected_face = face
-        # save the selected face values
-        if selected_face is not None:
-            vectors, normal = calc_vec_and_normals(selected_face)
-            base_point = selected_face[0]
-            regions.append(Region2D(vectors, normal, base_point))
-        else:
+        faces = np.array([[bb[0], bb[1], bb[2], bb[3]],
+                          [bb[0], bb[4], bb[5], bb[1]],
+                          [bb[1], bb[5], bb[6], bb[2]],
+                          [bb[6], bb[7], bb[3], bb[2]],
+                          [bb[3], bb[7], bb[4], bb[0]],
+                          [bb[7], bb[6], bb[5], bb[4]]])
+        # calc the normal of all faces
+        vectors1 = faces[:, 1] - faces[:, 0]
+        vectors2 = faces[:, 3] - faces[:, 0]
+        normals = np.cross(vectors1, vectors2)
+        normals /= np.linalg.norm(normals, axis=1, keepdims=True)
+        # the smallest angle has the largest cosine
+        cosines = normals @ self._upper_dir
+        if not np.any(np.isfinite(cosines)):
             raise RuntimeError(f"Couldn't find a face, for this obj: {obj.get_name()}")
+        face_id = int(np.nanargmax(cosines))
+        return Region2D((vectors1[face_id], vectors2[face_id]), normals[face_id], faces[face_id][0])
 
-    if regions and len(regions) == len(objects_to_sample_on):
-        selected_region_id = random.randint(0, len(regions) - 1)
-        selected_region, obj = regions[selected_region_id], objects_to_sample_on[selected_region_id]
-        if use_ray_trace_check:
-            inv_world_matrix = np.linalg.inv(obj.get_local2world_mat())
-        while True:
-            ret = selected_region.sample_point(face_sample_range)
-            dir_val = upper_dir if use_upper_dir else selected_region.normal()
-            ret += dir_val * random.uniform(min_height, max_height)
-            if use_ray_trace_check:
-                # transform the coords into the reference frame of the object
-                c_ret = inv_world_matrix @ np.concatenate((ret, [1]), 0)
-                c_dir = inv_world_matrix @ np.concatenate((dir_val * -1.0, [0]), 0)
-                # check if the object was hit
-                hit, _, _, _ = obj.ray_cast(c_ret[:3], c_dir[:3])
-                if hit:  # if the object was hit return
-                    break
-            else:
-                break
-        return np.array(ret)
-    raise RuntimeError("The amount of regions is either zero or does not match the amount of objects!")
+    def sample(self, amount: int, max_tries: int = 1000) -> np.ndarray:
+        """ Samples the given amount of points uniformly over the regions of randomly selected objects.
+
+        If the ray trace check is used, the points, whose ray does not hit the object, are sampled again in the next
+        round.
+
+        :param amount: The amount of points to sample.
+        :param max_tries: The maximum amount of rounds in which rejected points are sampled again.
+        :return: The sampled points in an array of shape (amount, 3).
+        """
+        points = np.empty((amount, 3))
+        missing = np.arange(amount)
+        for _ in range(max_tries):
+            region_ids = np.random.randint(len(self.regions), size=len(missing))
+            new_points, directions = self._sample_on_regions(region_ids)
+            points[missing] = new_points
+            if self._bvh_trees is None:
+                return points
+            # check if the object is directly below the sampled points
+            is_hit = np.array([self._bvh_trees[region_id].ray_cast(Vector(point), Vector(-direction))[0] is not None
+                               for region_id, point, direction in zip(region_ids, new_points, directions)],
+                              dtype=bool)
+            missing = missing[~is_hit]
+            if len(missing) == 0:
+                return points
+        raise RuntimeError(f"Could not sample {len(missing)} of {amount} points above the objects after {max_tries} "
+                           f"tries.")
+
+    def _sample_on_regions(self, region_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """ Samples one point above each of the given regions.
+
+        :param region_ids: The ids of the regions to sample on.
+        :return: The sampled points and the directions in which they have been moved away from their regions.
+        """
+        factors = np.random.uniform(self._face_sample_range[0], self._face_sample_range[1],
+                                    size=(len(region_ids), 2))
+        points = self._base_points[region_ids] + np.einsum("ni,nij->nj", factors, self._vectors[region_ids])
+        if self._use_upper_dir:
+            directions = np.tile(self._upper_dir, (len(region_ids), 1))
+        else:
+            directions = self._normals[region_ids]
+        points += directions * np.random.uniform(self._min_height, self._max_height, size=(len(region_ids), 1))
+        return points, directions
 
 
 class Region2D:
@@ -151,3 +237,15 @@ def normal(self):
         :return: the normal of the region
         """
         return self._normal
+
+    def vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: the two vectors which lie in the region
+        """
+        return self._vectors
+
+    def base_point(self) -> np.ndarray:
+        """
+        :return: the base point of the region
+        """
+        return self._base_point
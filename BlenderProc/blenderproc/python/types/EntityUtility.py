@@ -1,6 +1,6 @@
 """ The base class of all things, which can be placed in the scene, in BlenderProc. """
 
-from typing import Union, Optional, List
+from typing import Union, Optional, List, Dict, Set, Tuple
 import warnings
 
 import bpy
@@ -33,6 +33,7 @@ def set_location(self, location: Union[list, Vector, np.ndarray], frame: Optiona
         """
         self.blender_obj.location = location
         Utility.insert_keyframe(self.blender_obj, "location", frame)
+        BoundBoxStore.mark_dirty(self.blender_obj)
 
     def set_rotation_euler(self, rotation_euler: Union[list, Euler, np.ndarray], frame: Optional[int] = None):
         """ Sets the rotation of the entity in euler angles.
@@ -43,6 +44,7 @@ def set_rotation_euler(self, rotation_euler: Union[list, Euler, np.ndarray], fra
         """
         self.blender_obj.rotation_euler = rotation_euler
         Utility.insert_keyframe(self.blender_obj, "rotation_euler", frame)
+        BoundBoxStore.mark_dirty(self.blender_obj)
 
     def set_rotation_mat(self, rotation_mat: Union[Matrix, np.ndarray], frame: Optional[int] = None):
         """ Sets the rotation of the entity using a rotation matrix.
@@ -62,6 +64,7 @@ def set_scale(self, scale: Union[list, np.ndarray, Vector], frame: Optional[int]
         """
         self.blender_obj.scale = scale
         Utility.insert_keyframe(self.blender_obj, "scale", frame)
+        BoundBoxStore.mark_dirty(self.blender_obj)
 
     def get_location(self, frame: Optional[int] = None) -> np.ndarray:
         """ Returns the location of the entity in 3D world coordinates.
@@ -118,6 +121,7 @@ def apply_T(self, transform: Union[np.ndarray, Matrix]):
         :param transform: A 4x4 matrix representing the transformation.
         """
         self.blender_obj.matrix_world = Matrix(self.get_local2world_mat()) @ Matrix(transform)
+        BoundBoxStore.mark_dirty(self.blender_obj)
 
     def set_local2world_mat(self, matrix_world: Union[np.ndarray, Matrix]):
         """ Sets the pose of the object in the form of a local2world matrix.
@@ -126,6 +130,7 @@ def set_local2world_mat(self, matrix_world: Union[np.ndarray, Matrix]):
         """
         # To make sure matrices are always interpreted row-wise, we first convert them to a mathutils matrix.
         self.blender_obj.matrix_world = Matrix(matrix_world)
+        BoundBoxStore.mark_dirty(self.blender_obj)
 
     def get_local2world_mat(self) -> np.ndarray:
         """ Returns the pose of the object in the form of a local2world matrix.
@@ -171,6 +176,7 @@ def set_parent(self, new_parent: "Entity"):
         self.blender_obj.parent = new_parent.blender_obj
         # Make sure the object pose stays the same => add inverse of new parent's pose to transformation chain
         self.blender_obj.matrix_parent_inverse = Matrix(new_parent.get_local2world_mat()).inverted()
+        BoundBoxStore.mark_dirty(self.blender_obj)
 
     def get_parent(self) -> Optional["Entity"]:
         """ Returns the parent of the entity.
@@ -234,6 +240,175 @@ def __hash__(self):
         return hash(self.blender_obj)
 
 
+class BoundBoxStore:
+    """
+    Keeps the local bounding boxes and the local2world matrices of all queried objects in numpy arrays.
+
+    The values of an object are only read from blender, when it is queried for the first time or after it has been
+    marked as dirty. This happens automatically, when the pose of an entity is changed via its set methods, when a
+    mesh object is edited via its methods or when the current frame changes. If an object is changed directly via
+    its blender attributes or operators, mark_dirty() or invalidate() has to be called, otherwise outdated values are
+    returned. Therefore, the store is only used, if it is requested explicitly via `use_cache=True` of
+    get_bound_boxes() and get_local2world_mats().
+    """
+
+    # Maps the session uid of a blender object to its row in the arrays
+    _rows: Dict[int, int] = {}
+    # Maps the session uid of an object to the session uids of all queried objects below it in the scene graph
+    _descendants: Dict[int, Set[int]] = {}
+    # The arrays are allocated with spare capacity, only the first len(_rows) rows are valid
+    _local_bound_boxes = np.empty((16, 8, 3))
+    _local2world_mats = np.empty((16, 4, 4))
+    _world_bound_boxes = np.empty((16, 8, 3))
+    _dirty = np.ones(16, dtype=bool)
+    # The frame, at which the current values have been read
+    _frame: Optional[int] = None
+
+    @staticmethod
+    def mark_dirty(blender_obj: bpy.types.Object):
+        """ Marks the values of the given object and of all objects below it in the scene graph as outdated.
+
+        :param blender_obj: The blender object, which has been changed.
+        """
+        row = BoundBoxStore._rows.get(blender_obj.session_uid)
+        if row is not None:
+            BoundBoxStore._dirty[row] = True
+        for descendant in BoundBoxStore._descendants.get(blender_obj.session_uid, ()):
+            BoundBoxStore._dirty[BoundBoxStore._rows[descendant]] = True
+
+    @staticmethod
+    def invalidate():
+        """ Marks the values of all objects as outdated. """
+        BoundBoxStore._dirty[:] = True
+
+    @staticmethod
+    def clear():
+        """ Removes all objects from the store. """
+        BoundBoxStore._rows.clear()
+        BoundBoxStore._descendants.clear()
+        BoundBoxStore.invalidate()
+
+    @staticmethod
+    def get_rows(blender_objects: List[bpy.types.Object]) -> np.ndarray:
+        """ Returns the rows of the given objects, the rows of new or outdated objects are read from blender.
+
+        :param blender_objects: The blender objects.
+        :return: The rows of the objects in the arrays of the store.
+        """
+        frame = bpy.context.scene.frame_current
+        if frame != BoundBoxStore._frame:
+            # Animated objects might have been moved by changing the frame
+            BoundBoxStore.invalidate()
+            BoundBoxStore._frame = frame
+
+        rows = np.empty(len(blender_objects), dtype=np.int64)
+        for i, blender_obj in enumerate(blender_objects):
+            row = BoundBoxStore._rows.get(blender_obj.session_uid)
+            if row is None:
+                row = BoundBoxStore._add(blender_obj)
+            rows[i] = row
+
+        dirty = np.flatnonzero(BoundBoxStore._dirty[rows])
+        if len(dirty) > 0:
+            dirty_rows = rows[dirty]
+            dirty_objects = [blender_objects[i] for i in dirty]
+            BoundBoxStore._local_bound_boxes[dirty_rows], BoundBoxStore._local2world_mats[dirty_rows] = \
+                BoundBoxStore.read_from_blender(dirty_objects)
+            for blender_obj in dirty_objects:
+                # Moving any of the parents also moves this object
+                parent = blender_obj.parent
+                while parent is not None:
+                    BoundBoxStore._descendants.setdefault(parent.session_uid, set()).add(blender_obj.session_uid)
+                    parent = parent.parent
+            BoundBoxStore._world_bound_boxes[dirty_rows] = BoundBoxStore.transform_bound_boxes(
+                BoundBoxStore._local_bound_boxes[dirty_rows], BoundBoxStore._local2world_mats[dirty_rows])
+            BoundBoxStore._dirty[dirty_rows] = False
+        return rows
+
+    @staticmethod
+    def read_from_blender(blender_objects: List[bpy.types.Object]) -> Tuple[np.ndarray, np.ndarray]:
+        """ Reads the local bounding boxes and local2world matrices of the given objects directly from blender.
+
+        :param blender_objects: The blender objects.
+        :return: The local bounding boxes of shape (N, 8, 3) and the local2world matrices of shape (N, 4, 4).
+        """
+        local_bound_boxes = np.array([blender_obj.bound_box for blender_obj in blender_objects],
+                                     dtype=np.float64).reshape(-1, 8, 3)
+        local2world_mats = np.array([Entity(blender_obj).get_local2world_mat() for blender_obj in blender_objects],
+                                    dtype=np.float64).reshape(-1, 4, 4)
+        return local_bound_boxes, local2world_mats
+
+    @staticmethod
+    def transform_bound_boxes(local_bound_boxes: np.ndarray, local2world_mats: np.ndarray) -> np.ndarray:
+        """ Transforms the local bounding boxes into world coordinates.
+
+        :param local_bound_boxes: The local bounding boxes of shape (N, 8, 3).
+        :param local2world_mats: The local2world matrices of shape (N, 4, 4).
+        :return: The bounding boxes in world coordinates of shape (N, 8, 3).
+        """
+        return np.einsum("nij,nkj->nki", local2world_mats[:, :3, :3], local_bound_boxes) + \
+            local2world_mats[:, np.newaxis, :3, 3]
+
+    @staticmethod
+    def _add(blender_obj: bpy.types.Object) -> int:
+        """ Adds a row for the given object, which is marked as dirty.
+
+        :param blender_obj: The blender object.
+        :return: The new row.
+        """
+        row = len(BoundBoxStore._rows)
+        if row == len(BoundBoxStore._dirty):
+            # Double the capacity, so adding objects takes amortized constant time
+            BoundBoxStore._local_bound_boxes = np.concatenate([BoundBoxStore._local_bound_boxes,
+                                                               np.empty_like(BoundBoxStore._local_bound_boxes)])
+            BoundBoxStore._local2world_mats = np.concatenate([BoundBoxStore._local2world_mats,
+                                                              np.empty_like(BoundBoxStore._local2world_mats)])
+            BoundBoxStore._world_bound_boxes = np.concatenate([BoundBoxStore._world_bound_boxes,
+                                                               np.empty_like(BoundBoxStore._world_bound_boxes)])
+            BoundBoxStore._dirty = np.concatenate([BoundBoxStore._dirty, np.ones_like(BoundBoxStore._dirty)])
+        BoundBoxStore._rows[blender_obj.session_uid] = row
+        BoundBoxStore._dirty[row] = True
+        return row
+
+    @staticmethod
+    def get_bound_boxes(blender_objects: List[bpy.types.Object], local_coords: bool = False) -> np.ndarray:
+        """ Returns the bounding boxes of the given objects.
+
+        :param blender_objects: The blender objects.
+        :param local_coords: If True, the bounding boxes are returned in the local coordinates of the objects.
+        :return: The eight corners of each bounding box in an array of shape (N, 8, 3).
+        """
+        rows = BoundBoxStore.get_rows(blender_objects)
+        if local_coords:
+            return BoundBoxStore._local_bound_boxes[rows]
+        return BoundBoxStore._world_bound_boxes[rows]
+
+    @staticmethod
+    def get_local2world_mats(blender_objects: List[bpy.types.Object]) -> np.ndarray:
+        """ Returns the local2world matrices of the given objects.
+
+        :param blender_objects: The blender objects.
+        :return: The local2world matrices in an array of shape (N, 4, 4).
+        """
+        return BoundBoxStore._local2world_mats[BoundBoxStore.get_rows(blender_objects)]
+
+
+def get_local2world_mats(entities: List[Entity], use_cache: bool = False) -> np.ndarray:
+    """ Returns the local2world matrices of multiple entities at once.
+
+    :param entities: The entities.
+    :param use_cache: If True, the matrices are kept in the BoundBoxStore, so only the matrices of entities, which
+                      have been moved via their set methods since the last call, are read from blender again.
+                      Entities, which are moved directly via blender, have to be marked via
+                      BoundBoxStore.mark_dirty() then.
+    :return: The local2world matrices in an array of shape (N, 4, 4).
+    """
+    blender_objects = [entity.blender_obj for entity in entities]
+    if use_cache:
+        return BoundBoxStore.get_local2world_mats(blender_objects)
+    return BoundBoxStore.read_from_blender(blender_objects)[1]
+
+
 def create_empty(entity_name: str, empty_type: str = "plain_axes") -> "Entity":
     """ Creates an empty entity.
 
@@ -6,7 +6,7 @@
 import bpy
 from mathutils import Matrix
 
-from blenderproc.python.types.EntityUtility import Entity
+from blenderproc.python.types.EntityUtility import Entity, BoundBoxStore
 
 
 # as all attributes are accessed via the __getattr__ and __setattr__ in this module, we need to remove the member
@@ -59,6 +59,7 @@ def set_origin(self, origin: Union[np.ndarray, Matrix]):
         """
         object.__setattr__(self, "origin", Matrix(origin))
         self.blender_obj.matrix_world = Matrix(origin)
+        BoundBoxStore.mark_dirty(self.blender_obj)
 
     def get_origin(self) -> Matrix:
         """ Returns the origin of the inertia.
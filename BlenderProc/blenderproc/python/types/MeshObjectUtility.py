@@ -10,7 +10,7 @@
 import mathutils
 from mathutils import Vector, Matrix
 
-from blenderproc.python.types.EntityUtility import Entity
+from blenderproc.python.types.EntityUtility import Entity, BoundBoxStore
 from blenderproc.python.utility.Utility import Utility, resolve_path
 from blenderproc.python.utility.BlenderUtility import get_all_blender_mesh_objects
 from blenderproc.python.types.MaterialUtility import Material
@@ -99,6 +99,16 @@ def duplicate(self, duplicate_children: bool = True) -> "MeshObject":
 
         return duplicate_obj
 
+    def make_mesh_single_user(self):
+        """ Makes sure the mesh of this object is not shared with other objects.
+
+        Objects loaded via load_blend(use_cache=True) share their mesh and therefore also their materials with all
+        other objects created from the same .blend file. Call this before changing the mesh or the materials of
+        this object only.
+        """
+        if self.blender_obj.data.users > 1:
+            self.blender_obj.data = self.blender_obj.data.copy()
+
     def get_mesh(self) -> bpy.types.Mesh:
         """ Returns the blender mesh of the object.
 
@@ -144,6 +154,7 @@ def move_origin_to_bottom_mean_point(self):
         bpy.ops.transform.translate(value=[-bb_center[0], -bb_center[1], -bb_min_z_value])
         bpy.ops.object.mode_set(mode='OBJECT')
         self.deselect()
+        BoundBoxStore.mark_dirty(self.blender_obj)
 
     def get_bound_box(self, local_coords: bool = False) -> np.ndarray:
         """
@@ -157,14 +168,17 @@ def get_bound_box(self, local_coords: bool = False) -> np.ndarray:
     def persist_transformation_into_mesh(self, location: bool = True, rotation: bool = True, scale: bool = True):
         """
         Apply the current transformation of the object, which are saved in the location, scale or rotation attributes
-        to the mesh and sets them to their init values.
+        to the mesh and sets them to their init values. If the mesh is shared with other objects, this object gets its
+        own copy of the mesh first, so the other objects are not changed.
 
         :param location: Determines whether the object's location should be persisted.
         :param rotation: Determines whether the object's rotation should be persisted.
         :param scale: Determines whether the object's scale should be persisted.
         """
+        self.make_mesh_single_user()
         bpy.ops.object.transform_apply({"selected_editable_objects": [self.blender_obj]}, location=location,
                                        rotation=rotation, scale=scale)
+        BoundBoxStore.mark_dirty(self.blender_obj)
 
     def get_origin(self) -> np.ndarray:
         """ Returns the origin of the object.
@@ -177,7 +191,8 @@ def set_origin(self, point: Union[list, np.ndarray, Vector] = None, mode: str =
         """ Sets the origin of the object.
 
         This will not change the appearing pose of the object, as the vertex locations experience the inverse
-        transformation applied to the origin.
+        transformation applied to the origin. If the mesh is shared with other objects, this object gets its own copy
+        of the mesh first, as blender would only correct the location of this object.
 
         :param point: The point in world coordinates to which the origin should be set. This parameter is only
                       relevant if mode is set to "POINT".
@@ -185,6 +200,7 @@ def set_origin(self, point: Union[list, np.ndarray, Vector] = None, mode: str =
                      "CENTER_OF_MASS", "CENTER_OF_VOLUME"]
         :return: The new origin in world coordinates.
         """
+        self.make_mesh_single_user()
         context = {"selected_editable_objects": [self.blender_obj]}
 
         if mode == "POINT":
@@ -200,6 +216,7 @@ def set_origin(self, point: Union[list, np.ndarray, Vector] = None, mode: str =
             bpy.ops.object.origin_set(context, type='ORIGIN_CENTER_OF_VOLUME')
         else:
             raise Exception("No such mode: " + mode)
+        BoundBoxStore.mark_dirty(self.blender_obj)
 
         return self.get_origin()
 
@@ -354,6 +371,7 @@ def update_from_bmesh(self, bm: bmesh.types.BMesh, free_bm_mesh=True) -> bmesh.t
                 bm.free()
         # Make sure the mesh is updated
         self.get_mesh().update()
+        BoundBoxStore.mark_dirty(self.blender_obj)
 
     def join_with_other_objects(self, objects: List["MeshObject"]):
         """
@@ -372,6 +390,7 @@ def join_with_other_objects(self, objects: List["MeshObject"]):
                                                                              [self.blender_obj]
         # execute the joining operation
         bpy.ops.object.join(context)
+        BoundBoxStore.mark_dirty(self.blender_obj)
 
     def edit_mode(self):
         """ Switch into edit mode of this mesh object """
@@ -388,6 +407,8 @@ def edit_mode(self):
     def object_mode(self):
         """ Switch back into object mode """
         bpy.ops.object.mode_set(mode='OBJECT')
+        # The meshes might have been edited in edit mode
+        BoundBoxStore.invalidate()
 
     def create_bvh_tree(self) -> mathutils.bvhtree.BVHTree:
         """ Builds a bvh tree based on the object's mesh.
@@ -521,6 +542,7 @@ def add_modifier(self, name: str, **kwargs):
         modifier = self.blender_obj.modifiers[-1]
         for key, value in kwargs.items():
             setattr(modifier, key, value)
+        BoundBoxStore.mark_dirty(self.blender_obj)
 
 
 def create_from_blender_mesh(blender_mesh: bpy.types.Mesh, object_name: str = None) -> "MeshObject":
@@ -630,6 +652,26 @@ def create_bvh_tree_multi_objects(mesh_objects: List[MeshObject]) -> mathutils.b
     return bvh_tree
 
 
+def get_bound_boxes(objects: List[MeshObject], local_coords: bool = False, use_cache: bool = False) -> np.ndarray:
+    """ Returns the bounding boxes of multiple objects at once.
+
+    :param objects: The mesh objects.
+    :param local_coords: If True, the bounding boxes are returned in the local coordinates of the objects.
+    :param use_cache: If True, the bounding boxes are kept in the BoundBoxStore, so only the bounding boxes of
+                      objects, which have been changed via their methods since the last call, are computed again.
+                      Objects, which are changed directly via blender, have to be marked via
+                      BoundBoxStore.mark_dirty() then.
+    :return: The eight corners of each bounding box in world coordinates in an array of shape (N, 8, 3).
+    """
+    blender_objects = [obj.blender_obj for obj in objects]
+    if use_cache:
+        return BoundBoxStore.get_bound_boxes(blender_objects, local_coords)
+    local_bound_boxes, local2world_mats = BoundBoxStore.read_from_blender(blender_objects)
+    if local_coords:
+        return local_bound_boxes
+    return BoundBoxStore.transform_bound_boxes(local_bound_boxes, local2world_mats)
+
+
 def compute_poi(objects: List[MeshObject]) -> np.ndarray:
     """ Computes a point of interest in the scene. Point is defined as a location of the one of the selected objects
     that is the closest one to the mean location of the bboxes of the selected objects.
@@ -637,14 +679,8 @@ def compute_poi(objects: List[MeshObject]) -> np.ndarray:
     :param objects: The list of mesh objects that should be considered.
     :return: Point of interest in the scene.
     """
-    # Init matrix for all points of all bounding boxes
-    mean_bb_points = []
-
-    for obj in objects:
-        # Get bounding box corners
-        bb_points = obj.get_bound_box()
-        # Compute mean coords of bounding box
-        mean_bb_points.append(np.mean(bb_points, axis=0))
+    # Compute mean coords of all bounding boxes
+    mean_bb_points = np.mean(get_bound_boxes(objects), axis=1)
     # Query point - mean of means
     mean_bb_point = np.mean(mean_bb_points, axis=0)
     # Closest point (from means) to query point (mean of means)
@@ -674,3 +710,94 @@ def scene_ray_cast(origin: Union[Vector, list, np.ndarray], direction: Union[Vec
     if hit_object is not None:
         hit_object = MeshObject(hit_object)
     return hit, np.array(location), np.array(normal), index, hit_object, np.array(matrix)
+
+
+def bvh_ray_cast_batch(bvh_tree: mathutils.bvhtree.BVHTree, origins: np.ndarray, directions: np.ndarray,
+                       max_distance: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """ Casts one ray per given origin and direction onto the given bvh tree.
+
+    :param bvh_tree: The bvh tree to cast onto.
+    :param origins: The origins of the rays, either one origin of shape [3] used for all rays or one per ray of
+                    shape [N, 3].
+    :param directions: The directions of the rays of shape [N, 3]. They do not need to be normalized.
+    :param max_distance: The maximum distance of a hit, if None the rays are not limited.
+    :return: The distances of shape [N], which are inf for rays which did not hit anything, and the indices of the
+             hit faces of shape [N], which are -1 for no hit.
+    """
+    directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+    origins = np.broadcast_to(np.asarray(origins, dtype=np.float64), directions.shape)
+    distances = np.full(len(directions), np.inf)
+    face_indices = np.full(len(directions), -1, dtype=np.int64)
+    ray_cast = bvh_tree.ray_cast
+    extra_args = () if max_distance is None else (max_distance,)
+    # Converting the rays to lists once avoids building mathutils vectors for each ray
+    for i, (origin, direction) in enumerate(zip(origins.tolist(), directions.tolist())):
+        _, _, face_index, distance = ray_cast(origin, direction, *extra_args)
+        if distance is not None:
+            distances[i] = distance
+            face_indices[i] = face_index
+    return distances, face_indices
+
+
+class BatchedRayCaster:
+    """
+    Casts many rays at once, either onto all geometry of the scene or onto a fixed set of mesh objects.
+
+    For a fixed set of objects, one bvh tree containing all of them is built once, which is much faster than
+    casting onto the scene, but does not see later changes of the objects.
+
+    The hit objects are returned as ids, which index into `objects`. When casting onto the scene, each newly hit
+    object is appended to `objects`.
+    """
+
+    def __init__(self, mesh_objects: Optional[List[MeshObject]] = None):
+        """
+        :param mesh_objects: The objects to cast onto. If None, the rays are cast onto all geometry of the scene.
+        """
+        self.objects: List[MeshObject] = []
+        self._object_ids: dict = {}
+        self._bvh_tree: Optional[mathutils.bvhtree.BVHTree] = None
+        if mesh_objects is not None:
+            self.objects = list(mesh_objects)
+            self._bvh_tree = create_bvh_tree_multi_objects(self.objects)
+            # The faces of the objects are stored one after another in the bvh tree
+            self._face_offsets = np.cumsum([0] + [len(obj.get_mesh().polygons) for obj in self.objects])
+
+    def ray_cast(self, origins: np.ndarray, directions: np.ndarray,
+                 max_distance: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Casts one ray per given origin and direction.
+
+        :param origins: The origins of the rays in world space, either one origin of shape [3] used for all rays or
+                        one per ray of shape [N, 3].
+        :param directions: The directions of the rays in world space, of shape [N, 3]. They do not need to be
+                           normalized.
+        :param max_distance: The maximum distance of a hit, if None the rays are not limited.
+        :return: The distances of shape [N], which are inf for rays which did not hit anything, the hit flags of
+                 shape [N] and the ids of the hit objects in `objects` of shape [N], which are -1 for no hit.
+        """
+        if self._bvh_tree is not None:
+            distances, face_indices = bvh_ray_cast_batch(self._bvh_tree, origins, directions, max_distance)
+            hits = face_indices >= 0
+            object_ids = np.full(len(face_indices), -1, dtype=np.int64)
+            object_ids[hits] = np.searchsorted(self._face_offsets, face_indices[hits], side="right") - 1
+        else:
+            directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+            origins = np.broadcast_to(np.asarray(origins, dtype=np.float64), directions.shape)
+            distances = np.full(len(directions), np.inf)
+            object_ids = np.full(len(directions), -1, dtype=np.int64)
+            depsgraph = bpy.context.evaluated_depsgraph_get()
+            ray_cast = bpy.context.scene.ray_cast
+            distance_limit = 1.70141e+38 if max_distance is None else max_distance
+            locations = np.zeros_like(directions)
+            # Converting the rays to lists once avoids building mathutils vectors for each ray
+            for i, (origin, direction) in enumerate(zip(origins.tolist(), directions.tolist())):
+                hit, location, _, _, hit_object, _ = ray_cast(depsgraph, origin, direction, distance=distance_limit)
+                if hit:
+                    locations[i] = location
+                    if hit_object.name not in self._object_ids:
+                        self._object_ids[hit_object.name] = len(self.objects)
+                        self.objects.append(MeshObject(hit_object))
+                    object_ids[i] = self._object_ids[hit_object.name]
+            hits = object_ids >= 0
+            distances[hits] = np.linalg.norm(locations[hits] - origins[hits], axis=1)
+        return distances, hits, object_ids
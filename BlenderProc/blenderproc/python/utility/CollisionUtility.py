@@ -6,7 +6,7 @@
 import numpy as np
 from mathutils import Vector, Euler, Matrix
 
-from blenderproc.python.types.MeshObjectUtility import MeshObject
+from blenderproc.python.types.MeshObjectUtility import MeshObject, get_bound_boxes
 
 
 class CollisionUtility:
@@ -15,8 +15,9 @@ class CollisionUtility:
     """
 
     @staticmethod
-    def check_intersections(obj: MeshObject, bvh_cache: Optional[Dict[str, mathutils.bvhtree.BVHTree]],
-                            objects_to_check_against: List[MeshObject],
+    def check_intersections(obj: MeshObject,
+                            bvh_cache: Optional[Union[Dict[str, mathutils.bvhtree.BVHTree], "MeshBVHCache"]],
+                            objects_to_check_against: Union[List[MeshObject], "AABBBroadphase"],
                             list_of_objects_with_no_inside_check: List[MeshObject]):
         """ Checks if an object intersects with any object given in the list.
 
@@ -25,37 +26,49 @@ def check_intersections(obj: MeshObject, bvh_cache: Optional[Dict[str, mathutils
         If an object is already in the cache it is removed, before performing the check.
 
         :param obj: Object which should be checked. Type: :class:`bpy.types.Object`
-        :param bvh_cache: Dict of all the bvh trees, removes the `obj` from the cache before adding it again. \
-                          Type: :class:`dict`
-        :param objects_to_check_against: List of objects which the object is checked again \
-                                         Type: :class:`list`
+        :param bvh_cache: Dict of all the bvh trees, removes the `obj` from the cache before adding it again, or \
+                          a MeshBVHCache, which stays valid when objects are moved. Type: :class:`dict`
+        :param objects_to_check_against: List of objects which the object is checked again or a broadphase \
+                                         containing them, which performs the bounding box check for all objects \
+                                         at once. Type: :class:`list`
         :param list_of_objects_with_no_inside_check: List of objects on which no inside check is performed. \
                                                      This check is only done for the objects in \
                                                      `objects_to_check_against`. Type: :class:`list`
         :return: Type: :class:`bool`, True if no collision was found, false if at least one collision was found
         """
+        if isinstance(objects_to_check_against, AABBBroadphase):
+            # Only the objects whose bounding boxes collide have to be checked in detail
+            colliding_objects = objects_to_check_against.query_overlapping(obj, oriented=True)
+        else:
+            objects_to_check_against = list(objects_to_check_against)
+            indices = np.empty(0, dtype=np.int64)
+            if objects_to_check_against:
+                # First check for all objects at once if the bounding boxes collide
+                bb = obj.get_bound_box()
+                bound_boxes = get_bound_boxes(objects_to_check_against)
+                indices = np.flatnonzero(np.all((np.max(bound_boxes, axis=1) >= np.min(bb, axis=0)) &
+                                                (np.max(bb, axis=0) >= np.min(bound_boxes, axis=1)), axis=1))
+                # Then check if the oriented bounding boxes collide, which are much tighter for rotated objects
+                if len(indices) > 0:
+                    indices = indices[CollisionUtility.check_obb_intersections(bb, bound_boxes[indices])]
+            colliding_objects = [objects_to_check_against[index] for index in indices]
 
         no_collision = True
         # Now check for collisions
-        for collision_obj in objects_to_check_against:
+        for collision_obj in colliding_objects:
             # Do not check collisions with yourself
             if collision_obj == obj:
                 continue
-            # First check if bounding boxes collides
-            intersection = CollisionUtility.check_bb_intersection(obj, collision_obj)
-            # if they do
-            if intersection:
-                skip_inside_check = collision_obj in list_of_objects_with_no_inside_check
-                # then check for more refined collisions
-                intersection, bvh_cache = CollisionUtility.check_mesh_intersection(obj, collision_obj,
-                                                                                   bvh_cache=bvh_cache,
-                                                                                   skip_inside_check=skip_inside_check)
+            skip_inside_check = collision_obj in list_of_objects_with_no_inside_check
+            # then check for more refined collisions
+            intersection, bvh_cache = CollisionUtility.check_mesh_intersection(obj, collision_obj,
+                                                                               bvh_cache=bvh_cache,
+                                                                               skip_inside_check=skip_inside_check)
             if intersection:
                 no_collision = False
                 break
         return no_collision
 
-
     @staticmethod
     def check_bb_intersection(obj1: MeshObject, obj2: MeshObject):
         """
@@ -84,6 +97,55 @@ def min_and_max_point(bb):
         min_b2, max_b2 = min_and_max_point(b2w)
         return CollisionUtility.check_bb_intersection_on_values(min_b1, max_b1, min_b2, max_b2)
 
+    @staticmethod
+    def check_obb_intersection(obj1: MeshObject, obj2: MeshObject) -> bool:
+        """
+        Checks if the oriented bounding boxes of the two objects intersect.
+
+        The oriented bounding box is the local bounding box of an object in its world pose, so in contrast to
+        check_bb_intersection() it stays tight, if the object is rotated.
+
+        :param obj1: object 1 to check for intersection, must be a mesh
+        :param obj2: object 2 to check for intersection, must be a mesh
+        :return: True if the two oriented bounding boxes intersect with each other
+        """
+        return bool(CollisionUtility.check_obb_intersections(obj1.get_bound_box(),
+                                                             obj2.get_bound_box()[np.newaxis])[0])
+
+    @staticmethod
+    def check_obb_intersections(corners: np.ndarray, other_corners: np.ndarray, tolerance: float = 1e-6) \
+            -> np.ndarray:
+        """
+        Checks with the separating axis theorem, which of the given oriented bounding boxes intersect the first one.
+
+        The boxes are given by their eight world corners in the order of blender's bound_box, as returned by
+        get_bound_box(). As the boxes are affinely transformed cubes, they are separated if and only if they are
+        separated along one of their three face normals or one of the nine cross products of their edges.
+
+        :param corners: The corners of the first box in an array of shape (8, 3).
+        :param other_corners: The corners of the other boxes in an array of shape (N, 8, 3).
+        :param tolerance: Boxes which are closer than this along all axes are considered as intersecting.
+        :return: An array of shape (N,), which is True for all boxes, that intersect the first one.
+        """
+        corners = np.asarray(corners, dtype=np.float64)
+        other_corners = np.asarray(other_corners, dtype=np.float64)
+        # In the bound_box the corners 4, 3 and 1 are the neighbours of corner 0 along the local x, y and z axis
+        edges = corners[[4, 3, 1]] - corners[0]
+        other_edges = other_corners[:, [4, 3, 1]] - other_corners[:, [0]]
+        normals = np.broadcast_to(np.cross(edges, edges[[1, 2, 0]]), other_edges.shape)
+        other_normals = np.cross(other_edges, other_edges[:, [1, 2, 0]])
+        edge_crosses = np.cross(edges[np.newaxis, :, np.newaxis], other_edges[:, np.newaxis]).reshape(-1, 9, 3)
+        axes = np.concatenate([normals, other_normals, edge_crosses], axis=1)
+        # Axes of flat boxes or parallel edges are zero, they never separate the boxes
+        lengths = np.linalg.norm(axes, axis=2, keepdims=True)
+        axes = np.divide(axes, lengths, out=np.zeros_like(axes), where=lengths > 1e-12)
+
+        projections = np.einsum("nad,cd->nac", axes, corners)
+        other_projections = np.einsum("nad,ncd->nac", axes, other_corners)
+        is_separated = (projections.max(axis=2) + tolerance < other_projections.min(axis=2)) | \
+                       (other_projections.max(axis=2) + tolerance < projections.min(axis=2))
+        return ~np.any(is_separated, axis=1)
+
     @staticmethod
     def check_bb_intersection_on_values(min_b1: List[float], max_b1: List[float], min_b2: List[float],
                                         max_b2: List[float],
@@ -115,8 +177,9 @@ def is_overlapping_1D(x_min_1, x_max_1, x_min_2, x_max_2):
 
     @staticmethod
     def check_mesh_intersection(obj1: MeshObject, obj2: MeshObject, skip_inside_check: bool = False,
-                                bvh_cache: Optional[Dict[str, mathutils.bvhtree.BVHTree]] = None) \
-            -> Tuple[bool, Dict[str, mathutils.bvhtree.BVHTree]]:
+                                bvh_cache: Optional[Union[Dict[str, mathutils.bvhtree.BVHTree],
+                                                          "MeshBVHCache"]] = None) \
+            -> Tuple[bool, Union[Dict[str, mathutils.bvhtree.BVHTree], "MeshBVHCache"]]:
         """
         Checks if the two objects are intersecting.
 
@@ -129,7 +192,9 @@ def check_mesh_intersection(obj1: MeshObject, obj2: MeshObject, skip_inside_chec
         :param obj1: object 1 to check for intersection, must be a mesh
         :param obj2: object 2 to check for intersection, must be a mesh
         :param skip_inside_check: Disables checking whether one object is completely inside the other.
-        :param bvh_cache: Dict of all the bvh trees, removes the `obj` from the cache before adding it again.
+        :param bvh_cache: Dict of all the bvh trees, removes the `obj` from the cache before adding it again. If a
+                          MeshBVHCache is given, the trees are kept in the local space of the meshes instead, so
+                          they stay valid when the objects are moved.
         :return: True, if they are intersecting
         """
 
@@ -140,6 +205,9 @@ def check_mesh_intersection(obj1: MeshObject, obj2: MeshObject, skip_inside_chec
         if len(obj1.get_mesh().vertices) == 0 or len(obj2.get_mesh().vertices) == 0:
             return False, bvh_cache
 
+        if isinstance(bvh_cache, MeshBVHCache):
+            return bvh_cache.check_mesh_intersection(obj1, obj2, skip_inside_check), bvh_cache
+
         # create bvhtree for obj1
         if obj1.get_name() not in bvh_cache:
             obj1_BVHtree = obj1.create_bvh_tree()
@@ -200,3 +268,255 @@ def is_point_inside_object(obj: MeshObject, obj_bvh_tree: mathutils.bvhtree.BVHT
         # Compute dot product between direction and normal vector
         a = p2.normalized().dot((Euler(obj.get_rotation_euler()).to_matrix() @ normal).normalized())
         return a >= 0.0
+
+
+class MeshBVHCache:
+    """
+    Caches the bvh trees of meshes in their local space, keyed by their mesh datablock.
+
+    As the trees do not depend on the pose of the objects, they stay valid when an object is moved, and objects
+    which share a mesh, e.g. linked duplicates, share one tree. A cached tree is rebuilt if the amount of vertices,
+    loops or polygons of its mesh has changed, other edits of a mesh have to be announced via invalidate().
+
+    To check two objects, the edges of each mesh are transformed into the local space of the other mesh and cast as
+    rays into its cached tree, so no tree has to be built for a moved object. Only the edges, which lie inside the
+    local bounding box of the other mesh, are cast.
+    """
+
+    def __init__(self):
+        # Maps the mesh datablock to its size, its local vertices, its polygons, its edges, the bounds of its vertices
+        # and its local bvh tree
+        self._entries: Dict[Union[int, str], Tuple[Tuple[int, int, int], np.ndarray, List[List[int]], np.ndarray,
+                                                   np.ndarray, mathutils.bvhtree.BVHTree]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        """ Removes all cached trees. """
+        self._entries.clear()
+
+    @staticmethod
+    def _datablock_key(datablock) -> Union[int, str]:
+        """ Returns a key, which identifies the given datablock during the current session.
+
+        :param datablock: The blender datablock, e.g. a mesh.
+        :return: The session uid of the datablock or its full name, if the blender version has no session uids.
+        """
+        session_uid = getattr(datablock, "session_uid", None)
+        return session_uid if session_uid is not None else datablock.name_full
+
+    def invalidate(self, obj: MeshObject):
+        """ Removes the cached tree of the mesh of the given object, this is necessary after its mesh was edited.
+
+        :param obj: The object whose mesh has been edited.
+        """
+        self._entries.pop(MeshBVHCache._datablock_key(obj.get_mesh()), None)
+
+    def get(self, obj: MeshObject) -> Tuple[np.ndarray, List[List[int]], mathutils.bvhtree.BVHTree]:
+        """ Returns the local geometry and bvh tree of the mesh of the given object, they are built if necessary.
+
+        :param obj: The object.
+        :return: The vertices of shape [N, 3] and polygons of the mesh in its local space and its bvh tree.
+        """
+        _, vertices, polygons, _, _, bvh_tree = self._get_entry(obj)
+        return vertices, polygons, bvh_tree
+
+    def _get_entry(self, obj: MeshObject) -> Tuple[Tuple[int, int, int], np.ndarray, List[List[int]], np.ndarray,
+                                                   np.ndarray, mathutils.bvhtree.BVHTree]:
+        """ Returns the cached entry of the mesh of the given object, it is built if necessary.
+
+        :param obj: The object.
+        :return: The size of the mesh, its local vertices of shape [N, 3], its polygons, its edges of shape [E, 2],
+                 the minimum and maximum of its vertices of shape [2, 3] and its local bvh tree.
+        """
+        mesh = obj.get_mesh()
+        key = MeshBVHCache._datablock_key(mesh)
+        size = (len(mesh.vertices), len(mesh.loops), len(mesh.polygons))
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != size:
+            vertices = np.empty(size[0] * 3, dtype=np.float32)
+            mesh.vertices.foreach_get("co", vertices)
+            loop_vertices = np.empty(size[1], dtype=np.int32)
+            mesh.loops.foreach_get("vertex_index", loop_vertices)
+            loop_totals = np.empty(size[2], dtype=np.int32)
+            mesh.polygons.foreach_get("loop_total", loop_totals)
+            edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+            mesh.edges.foreach_get("vertices", edges)
+            vertices = vertices.reshape(-1, 3).astype(np.float64)
+            polygons = [polygon.tolist() for polygon in np.split(loop_vertices, np.cumsum(loop_totals)[:-1])]
+            entry = (size, vertices, polygons, edges.reshape(-1, 2),
+                     np.stack([vertices.min(axis=0), vertices.max(axis=0)]),
+                     mathutils.bvhtree.BVHTree.FromPolygons(vertices.tolist(), polygons))
+            self._entries[key] = entry
+        return entry
+
+    def check_mesh_intersection(self, obj1: MeshObject, obj2: MeshObject, skip_inside_check: bool = False) -> bool:
+        """ Checks if the two objects are intersecting, see CollisionUtility.check_mesh_intersection().
+
+        :param obj1: object 1 to check for intersection, must be a mesh
+        :param obj2: object 2 to check for intersection, must be a mesh
+        :param skip_inside_check: Disables checking whether one object is completely inside the other.
+        :return: True, if they are intersecting
+        """
+        _, vertices1, _, edges1, bounds1, bvh_tree1 = self._get_entry(obj1)
+        _, vertices2, _, edges2, bounds2, bvh_tree2 = self._get_entry(obj2)
+        # Transforms from the local space of obj2 into the local space of obj1 and the other way round
+        obj2_to_obj1 = np.linalg.inv(obj1.get_local2world_mat()) @ obj2.get_local2world_mat()
+        obj1_to_obj2 = np.linalg.inv(obj2_to_obj1)
+
+        # Two meshes intersect, if an edge of one of them crosses a face of the other one
+        inter = MeshBVHCache.do_edges_hit_tree(vertices2 @ obj2_to_obj1[:3, :3].T + obj2_to_obj1[:3, 3], edges2,
+                                               bvh_tree1, bounds1) or \
+            MeshBVHCache.do_edges_hit_tree(vertices1 @ obj1_to_obj2[:3, :3].T + obj1_to_obj2[:3, 3], edges1,
+                                           bvh_tree2, bounds2)
+        if inter or skip_inside_check:
+            return inter
+
+        # Check whether obj2 is contained in obj1
+        inter = MeshBVHCache.is_local_point_inside(bvh_tree1, obj2_to_obj1[:3, :3] @ vertices2[0] +
+                                                   obj2_to_obj1[:3, 3])
+        if inter:
+            print("Warning: Detected that " + obj2.get_name() + " is completely inside " + obj1.get_name() +
+                  ". This might be wrong, if " + obj1.get_name() +
+                  " is not water tight or has incorrect normals. If that is the case, consider setting "
+                  "skip_inside_check to True.")
+
+        # Check whether obj1 is contained in obj2
+        if not inter:
+            inter = MeshBVHCache.is_local_point_inside(bvh_tree2, obj1_to_obj2[:3, :3] @ vertices1[0] +
+                                                       obj1_to_obj2[:3, 3])
+            if inter:
+                print("Warning: Detected that " + obj1.get_name() + " is completely inside " + obj2.get_name() +
+                      ". This might be wrong, if " + obj2.get_name() + " is not water tight or has incorrect "
+                                                                       "normals. If that is the case, consider "
+                                                                       "setting skip_inside_check to True.")
+        return inter
+
+    @staticmethod
+    def do_edges_hit_tree(points: np.ndarray, edges: np.ndarray, bvh_tree: mathutils.bvhtree.BVHTree,
+                          bounds: np.ndarray) -> bool:
+        """ Checks whether any of the given edges crosses a face of the mesh of the tree.
+
+        :param points: The vertices of the edges in the local space of the tree, in an array of shape (N, 3).
+        :param edges: The indices of the two vertices of each edge, in an array of shape (E, 2).
+        :param bvh_tree: The local bvh tree of the mesh.
+        :param bounds: The minimum and maximum of the vertices of the mesh, in an array of shape (2, 3).
+        :return: True, if at least one edge hits a face of the mesh.
+        """
+        starts, ends = points[edges[:, 0]], points[edges[:, 1]]
+        # Only edges, whose bounding box overlaps the one of the mesh, can hit it
+        candidates = np.flatnonzero(np.all(np.minimum(starts, ends) <= bounds[1], axis=1) &
+                                    np.all(np.maximum(starts, ends) >= bounds[0], axis=1))
+        for i in candidates:
+            direction = Vector(ends[i] - starts[i])
+            length = direction.length
+            if length > 0 and bvh_tree.ray_cast(Vector(starts[i]), direction / length, length)[0] is not None:
+                return True
+        return False
+
+    @staticmethod
+    def is_local_point_inside(bvh_tree: mathutils.bvhtree.BVHTree, point: np.ndarray) -> bool:
+        """ Checks whether the given point, given in the local space of the tree, is inside the mesh of the tree.
+
+        This only works if the mesh is watertight and has correct normals.
+
+        :param bvh_tree: The local bvh tree of the mesh.
+        :param point: The point in the local space of the mesh.
+        :return: True, if the point is inside the mesh
+        """
+        point = Vector(point)
+        # Look for closest point on the mesh, in local space the normal does not have to be transformed
+        nearest, normal, _, _ = bvh_tree.find_nearest(point)
+        return (nearest - point).normalized().dot(normal.normalized()) >= 0.0
+
+
+class AABBBroadphase:
+    """
+    Keeps the world axis-aligned bounding boxes and the locations of a growing set of objects in numpy arrays.
+
+    This allows to find all objects whose bounding box intersects the one of a query object and the distance to the
+    closest object in one vectorized operation, instead of iterating over all objects in python. The objects are
+    expected to not move anymore after they have been added, e.g. because they have already been placed.
+    """
+
+    def __init__(self, objects: Optional[List[MeshObject]] = None):
+        """
+        :param objects: The objects, which should be added initially.
+        """
+        self._objects: List[MeshObject] = []
+        # The arrays are allocated with spare capacity, only the first len(self._objects) rows are valid
+        self._bb_mins = np.empty((16, 3))
+        self._bb_maxs = np.empty((16, 3))
+        self._locations = np.empty((16, 3))
+        self._corners = np.empty((16, 8, 3))
+        if objects is not None:
+            for obj in objects:
+                self.add(obj)
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def get_objects(self) -> List[MeshObject]:
+        """ Returns all objects, which have been added so far.
+
+        :return: The list of objects.
+        """
+        return list(self._objects)
+
+    def add(self, obj: MeshObject):
+        """ Adds the given object with its current pose.
+
+        :param obj: The object to add.
+        """
+        if len(self._objects) == len(self._bb_mins):
+            # Double the capacity, so adding objects takes amortized constant time
+            self._bb_mins = np.concatenate([self._bb_mins, np.empty_like(self._bb_mins)])
+            self._bb_maxs = np.concatenate([self._bb_maxs, np.empty_like(self._bb_maxs)])
+            self._locations = np.concatenate([self._locations, np.empty_like(self._locations)])
+            self._corners = np.concatenate([self._corners, np.empty_like(self._corners)])
+        bb = obj.get_bound_box()
+        index = len(self._objects)
+        self._corners[index] = bb
+        self._bb_mins[index] = np.min(bb, axis=0)
+        self._bb_maxs[index] = np.max(bb, axis=0)
+        self._locations[index] = obj.get_location()
+        self._objects.append(obj)
+
+    def query_overlapping(self, obj: MeshObject, oriented: bool = False) -> List[MeshObject]:
+        """ Returns all added objects whose axis-aligned bounding box intersects the one of the given object.
+
+        :param obj: The query object in its current pose.
+        :param oriented: If True, the objects whose axis-aligned bounding box intersects are additionally filtered
+                         by intersecting their oriented bounding boxes, see check_obb_intersections().
+        :return: The list of objects, whose bounding box intersects. The query object itself is never returned.
+        """
+        bb = obj.get_bound_box()
+        amount = len(self._objects)
+        is_overlapping = np.all((self._bb_maxs[:amount] >= np.min(bb, axis=0)) &
+                                (np.max(bb, axis=0) >= self._bb_mins[:amount]), axis=1)
+        indices = np.flatnonzero(is_overlapping)
+        if oriented and len(indices) > 0:
+            indices = indices[CollisionUtility.check_obb_intersections(bb, self._corners[indices])]
+        return [self._objects[index] for index in indices if self._objects[index] != obj]
+
+    def closest_distance(self, location: Union[np.ndarray, Vector]) -> Optional[float]:
+        """ Determines the distance from the given location to the closest location of all added objects.
+
+        :param location: The query location.
+        :return: The distance or None, if no objects have been added yet.
+        """
+        if not self._objects:
+            return None
+        return float(self.closest_distances(np.array(location)[np.newaxis])[0])
+
+    def closest_distances(self, locations: np.ndarray) -> np.ndarray:
+        """ Determines for many locations at once the distance to the closest location of all added objects.
+
+        :param locations: The query locations in an array of shape (N, 3).
+        :return: The distances in an array of shape (N,), which is filled with inf, if no objects have been added.
+        """
+        if not self._objects:
+            return np.full(len(locations), np.inf)
+        differences = locations[:, np.newaxis] - self._locations[np.newaxis, :len(self._objects)]
+        return np.min(np.linalg.norm(differences, axis=2), axis=1)
@@ -11,6 +11,8 @@
 from blenderproc.python.camera import CameraUtility
 from blenderproc.python.utility.DefaultConfig import DefaultConfig
 from blenderproc.python.renderer import RendererUtility
+from blenderproc.python.types.EntityUtility import BoundBoxStore
+from blenderproc.python.loader.BlendLoader import clear_blend_cache
 
 
 def init(clean_up_scene: bool = True):
@@ -54,6 +56,11 @@ def init(clean_up_scene: bool = True):
         random.seed(random_seed)
         np_random.seed(random_seed)
 
+    cpu_threads = os.getenv("BLENDER_PROC_CPU_THREADS")
+    if cpu_threads:
+        print(f"Got amount of cpu threads: {cpu_threads}")
+        RendererUtility.set_cpu_threads(int(cpu_threads))
+
     # Remember init was completed
     GlobalStorage.add("bproc_init_complete", True)
 
@@ -73,6 +80,9 @@ def clean_up(clean_up_camera: bool = False):
     # Clean up
     _Initializer.remove_all_data(clean_up_camera)
     _Initializer.remove_custom_properties()
+    # The rows and templates of the removed objects are not valid anymore
+    BoundBoxStore.clear()
+    clear_blend_cache()
 
     # Create new world
     new_world = bpy.data.worlds.new("World")
@@ -90,6 +100,19 @@ def clean_up(clean_up_camera: bool = False):
     reset_keyframes()
 
 
+def reset():
+    """ Resets Blender and BlenderProc to the state they had right after startup.
+
+    Blender loads its factory settings with an empty scene and all keys BlenderProc stored globally are removed,
+    so bproc.init() can be called again afterwards. This allows one Blender process to generate multiple scenes
+    one after another without paying the startup costs each time.
+    """
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    GlobalStorage.clear()
+    BoundBoxStore.clear()
+    clear_blend_cache()
+
+
 class _Initializer:
     """
     This is the initializer class used to init a BlenderProc scene.
@@ -105,6 +105,24 @@ def build_transformation_mat(translation: Union[np.ndarray, List[float], Vector]
     return mat
 
 
+def euler_to_rotation_matrices(rotations: np.ndarray) -> np.ndarray:
+    """ Converts many XYZ euler angles into rotation matrices at once, like mathutils.Euler.to_matrix() does for one.
+
+    :param rotations: The euler angles in an array of shape (N, 3).
+    :return: The rotation matrices in an array of shape (N, 3, 3).
+    """
+    rotations = np.asarray(rotations, dtype=np.float64).reshape(-1, 3)
+    cos, sin = np.cos(rotations), np.sin(rotations)
+    cx, cy, cz = cos[:, 0], cos[:, 1], cos[:, 2]
+    sx, sy, sz = sin[:, 0], sin[:, 1], sin[:, 2]
+    # Rz @ Ry @ Rx
+    return np.stack([
+        np.stack([cy * cz, sx * sy * cz - cx * sz, cx * sy * cz + sx * sz], axis=-1),
+        np.stack([cy * sz, sx * sy * sz + cx * cz, cx * sy * sz - sx * cz], axis=-1),
+        np.stack([-sy, sx * cy, cx * cy], axis=-1)
+    ], axis=1)
+
+
 class MathUtility:
     """
     Math utility class
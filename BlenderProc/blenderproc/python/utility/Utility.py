@@ -650,6 +650,11 @@ def __exit__(self, exc_type: Optional[Type[BaseException]],
             # Therefore, we now go over all instances and update their references using their name as unique identifier.
             for name, struct in self.struct_instances:
                 struct.update_blender_ref(name)
+            # The poses and meshes of all objects have been reverted
+            # pylint: disable=import-outside-toplevel,cyclic-import
+            from blenderproc.python.types.EntityUtility import BoundBoxStore
+            # pylint: enable=import-outside-toplevel,cyclic-import
+            BoundBoxStore.invalidate()
 
 
 # KeyFrameState should be thread-specific
@@ -689,6 +694,11 @@ def __exit__(self, exc_type: Optional[Type[BaseException]],
         KeyFrame.state.depth -= 1
         if self._prev_frame is not None:
             bpy.context.scene.frame_set(self._prev_frame)
+            # Animated objects have been evaluated at another frame in the meantime
+            # pylint: disable=import-outside-toplevel,cyclic-import
+            from blenderproc.python.types.EntityUtility import BoundBoxStore
+            # pylint: enable=import-outside-toplevel,cyclic-import
+            BoundBoxStore.invalidate()
 
     @staticmethod
     def is_any_active() -> bool:
@@ -5,10 +5,12 @@
 import json
 import os
 import shutil
-from typing import Optional, Dict, Union, Tuple, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Union, Tuple, List, Any
 import csv
 
 import numpy as np
+from scipy import ndimage
 from skimage import measure
 import cv2
 import bpy
@@ -24,7 +26,7 @@ def write_coco_annotations(output_dir: str, instance_segmaps: Optional[List[np.n
                            append_to_existing_output: bool = True, segmap_output_key: str = "segmap",
                            segcolormap_output_key: str = "segcolormap", rgb_output_key: str = "colors",
                            jpg_quality: int = 95, label_mapping: Optional[LabelIdMapping] = None,
-                           file_prefix: str = ""):
+                           file_prefix: str = "", num_workers: int = 0):
     """ Writes coco annotations in the following steps:
     1. Locate the seg images
     2. Locate the rgb maps
@@ -42,7 +44,9 @@ def write_coco_annotations(output_dir: str, instance_segmaps: Optional[List[np.n
                           by 'bop_dataset_name' or any loaded object with specified 'cp_supercategory'
     :param append_to_existing_output: If true and if there is already a coco_annotations.json file in the output
                                       directory, the new coco annotations will be appended to the existing file.
-                                      Also, the rgb images will be named such that there are no collisions.
+                                      Also, the rgb images will be named such that there are no collisions. Files
+                                      written by this function are extended in place, without reading all their
+                                      annotations again.
     :param segmap_output_key: The output key with which the segmentation images were registered. Should be the same
                               as the output_key of the SegMapRenderer module. Default: segmap.
     :param segcolormap_output_key: The output key with which the csv file for object name/class correspondences
@@ -55,6 +59,8 @@ def write_coco_annotations(output_dir: str, instance_segmaps: Optional[List[np.n
                           If None, is given then the `name` field in the csv files is used or - if not existing -
                           the category id itself is used.
     :param file_prefix: Optional prefix for image file names
+    :param num_workers: If larger than one, the annotations of the frames are generated by this many threads in
+                        parallel.
     """
     if instance_segmaps is None:
         instance_segmaps = []
@@ -89,13 +95,19 @@ def write_coco_annotations(output_dir: str, instance_segmaps: Optional[List[np.n
 
     coco_annotations_path = os.path.join(output_dir, "coco_annotations.json")
     # Calculate image numbering offset, if append_to_existing_output is activated and coco data exists
+    existing_coco_annotations = None
+    appendable_coco_annotations = None
     if append_to_existing_output and os.path.exists(coco_annotations_path):
-        with open(coco_annotations_path, 'r', encoding="utf-8") as fp:
-            existing_coco_annotations = json.load(fp)
-        image_offset = max(image["id"] for image in existing_coco_annotations["images"]) + 1
+        # Only the end of the file is read, if it has been written by this function before
+        appendable_coco_annotations = _CocoWriterUtility.read_appendable_coco_annotations(coco_annotations_path)
+        if appendable_coco_annotations is None:
+            with open(coco_annotations_path, 'r', encoding="utf-8") as fp:
+                existing_coco_annotations = json.load(fp)
+            image_offset = max(image["id"] for image in existing_coco_annotations["images"]) + 1
+        else:
+            image_offset = max(image["id"] for image in appendable_coco_annotations["images"]) + 1
     else:
         image_offset = 0
-        existing_coco_annotations = None
 
     # collect all RGB paths
     new_coco_image_paths = []
@@ -158,11 +170,14 @@ def write_coco_annotations(output_dir: str, instance_segmaps: Optional[List[np.n
                                                                supercategory,
                                                                mask_encoding_format,
                                                                existing_coco_annotations,
-                                                               label_mapping)
+                                                               label_mapping,
+                                                               num_workers)
 
     print("Writing coco annotations to " + coco_annotations_path)
-    with open(coco_annotations_path, 'w', encoding="utf-8") as fp:
-        json.dump(coco_output, fp)
+    if appendable_coco_annotations is not None:
+        _CocoWriterUtility.append_coco_annotations(coco_annotations_path, appendable_coco_annotations, coco_output)
+    else:
+        _CocoWriterUtility.dump_coco_annotations(coco_annotations_path, coco_output)
 
 
 def binary_mask_to_rle(binary_mask: np.ndarray) -> Dict[str, List[int]]:
@@ -181,6 +196,41 @@ def binary_mask_to_rle(binary_mask: np.ndarray) -> Dict[str, List[int]]:
     return rle
 
 
+def cropped_binary_mask_to_rle(cropped_mask: np.ndarray, offset: Tuple[int, int],
+                               image_size: Tuple[int, int]) -> Dict[str, List[int]]:
+    """Converts the crop of a binary mask to COCOs run-length encoding (RLE) format of the full image.
+
+    The result is the same as binary_mask_to_rle() of the full mask, but only the pixels of the crop are visited.
+
+    :param cropped_mask: a 2D binary numpy array of the crop, where '1's represent the object
+    :param offset: The row and column of the upper left corner of the crop in the full image.
+    :param image_size: The height and width of the full image.
+    :return: Mask in RLE format
+    """
+    height = image_size[0]
+    crop_height = cropped_mask.shape[0]
+    if crop_height < height:
+        # an empty row at the end of each column separates the runs of consecutive columns, as they are not
+        # neighbours in the full image
+        cropped_mask = np.pad(cropped_mask, ((0, 1), (0, 0)))
+    flat_mask = np.concatenate(([0], cropped_mask.ravel(order='F').astype(np.int8), [0]))
+    changes = np.flatnonzero(np.diff(flat_mask))
+    starts, lengths = changes[::2], changes[1::2] - changes[::2]
+    # map the positions in the crop to positions in the full image
+    padded_height = cropped_mask.shape[0]
+    starts = (offset[1] + starts // padded_height) * height + offset[0] + starts % padded_height
+    ends = starts + lengths
+
+    runs = np.empty(2 * len(starts), dtype=np.int64)
+    runs[0::2] = starts
+    runs[1::2] = ends
+    counts = np.diff(np.concatenate(([0], runs))).tolist()
+    total_size = int(height * image_size[1])
+    if len(runs) == 0 or runs[-1] < total_size:
+        counts.append(total_size - (int(runs[-1]) if len(runs) > 0 else 0))
+    return {'counts': counts, 'size': list(image_size)}
+
+
 def rle_to_binary_mask(rle: Dict[str, List[int]]) -> np.ndarray:
     """Converts a COCOs run-length encoding (RLE) to binary mask.
     :param rle: Mask in RLE format
@@ -205,7 +255,7 @@ class _CocoWriterUtility:
     @staticmethod
     def generate_coco_annotations(inst_segmaps, inst_attribute_maps, image_paths, supercategory,
                                   mask_encoding_format, existing_coco_annotations=None,
-                                  label_mapping: LabelIdMapping = None):
+                                  label_mapping: LabelIdMapping = None, num_workers: int = 0):
         """Generates coco annotations for images
 
         :param inst_segmaps: List of instance segmentation maps
@@ -218,6 +268,8 @@ def generate_coco_annotations(inst_segmaps, inst_attribute_maps, image_paths, su
         :param label_mapping: The label mapping which should be used to label the categories based on their ids.
                               If None, is given then the `name` field in the csv files is used or - if not existing -
                               the category id itself is used.
+        :param num_workers: If larger than one, the annotations of the frames are generated by this many threads
+                            in parallel.
         :return: dict containing coco annotations
         """
 
@@ -271,29 +323,28 @@ def generate_coco_annotations(inst_segmaps, inst_attribute_maps, image_paths, su
         images: List[Dict[str, Union[str, int]]] = []
         annotations: List[Dict[str, Union[str, int]]] = []
 
-        for inst_segmap, image_path, instance_2_category_map in zip(inst_segmaps, image_paths,
-                                                                    instance_2_category_maps):
+        frames = list(zip(inst_segmaps, image_paths, instance_2_category_maps))
+        if num_workers > 1 and len(frames) > 1:
+            # The annotations of each frame are independent, so they can be generated in parallel. Threads are used,
+            # as forking the multi-threaded blender process is not safe.
+            with ThreadPoolExecutor(min(num_workers, len(frames))) as executor:
+                frame_annotations = list(executor.map(_CocoWriterUtility.create_frame_annotations,
+                                                      [frame[0] for frame in frames], [frame[2] for frame in frames],
+                                                      [mask_encoding_format] * len(frames)))
+        else:
+            frame_annotations = [_CocoWriterUtility.create_frame_annotations(inst_segmap, instance_2_category_map,
+                                                                             mask_encoding_format)
+                                 for inst_segmap, _, instance_2_category_map in frames]
 
+        for (inst_segmap, image_path, _), annotations_of_frame in zip(frames, frame_annotations):
             # Add coco info for image
             image_id = len(images)
             images.append(_CocoWriterUtility.create_image_info(image_id, image_path, inst_segmap.shape))
 
-            # Go through all objects visible in this image
-            instances = np.unique(inst_segmap)
-            # Remove background
-            instances = np.delete(instances, np.where(instances == 0))
-            for inst in instances:
-                if inst in instance_2_category_map:
-                    # Calc object mask
-                    binary_inst_mask = np.where(inst_segmap == inst, 1, 0)
-                    # Add coco info for object in this image
-                    annotation = _CocoWriterUtility.create_annotation_info(len(annotations) + 1,
-                                                                           image_id,
-                                                                           instance_2_category_map[inst],
-                                                                           binary_inst_mask,
-                                                                           mask_encoding_format)
-                    if annotation is not None:
-                        annotations.append(annotation)
+            for annotation in annotations_of_frame:
+                annotation["id"] = len(annotations) + 1
+                annotation["image_id"] = image_id
+                annotations.append(annotation)
 
         new_coco_annotations = {
             "info": info,
@@ -309,6 +360,165 @@ def generate_coco_annotations(inst_segmaps, inst_attribute_maps, image_paths, su
 
         return new_coco_annotations
 
+    @staticmethod
+    def create_frame_annotations(inst_segmap: np.ndarray, instance_2_category_map: Dict[int, int],
+                                 mask_encoding_format: str, tolerance: int = 2) -> List[Dict[str, Any]]:
+        """Creates the annotations of all objects visible in one frame.
+
+        The areas and bounding boxes of all instances are computed in one pass over the segmap, afterwards each
+        mask is only encoded inside its bounding box.
+
+        :param inst_segmap: The instance segmentation map of the frame.
+        :param instance_2_category_map: Maps the instance ids, which should be annotated, to their category id.
+        :param mask_encoding_format: Encoding format of the mask. Type: string.
+        :param tolerance: The tolerance for fitting polygons to the objects mask.
+        :return: The annotations of the frame, their ids and image ids are set to 0.
+        """
+        if inst_segmap.size == 0:
+            return []
+        labels = inst_segmap
+        instance_ids = None
+        if not np.issubdtype(labels.dtype, np.integer) or labels.min() < 0 or labels.max() > labels.size:
+            # Relabel sparse or unusual ids, so they can be counted, the labels start at one, as find_objects()
+            # ignores the label zero
+            instance_ids, labels = np.unique(inst_segmap, return_inverse=True)
+            labels = labels.reshape(inst_segmap.shape) + 1
+
+        areas = np.bincount(labels.ravel())
+        annotations = []
+        # find_objects returns the bounding box of label i at position i - 1
+        for label, bbox_slices in enumerate(ndimage.find_objects(labels), start=1):
+            inst = label if instance_ids is None else instance_ids[label - 1]
+            # the relabelled ids can be floats or negative, only integral ids can be annotated
+            if inst != int(inst):
+                continue
+            inst = int(inst)
+            # Skip background, not visible and not annotated instances
+            if bbox_slices is None or inst == 0 or inst not in instance_2_category_map:
+                continue
+            cropped_mask = labels[bbox_slices] == label
+            offset = (bbox_slices[0].start, bbox_slices[1].start)
+            annotation = _CocoWriterUtility.create_cropped_annotation_info(0, 0, instance_2_category_map[inst],
+                                                                           cropped_mask, offset, inst_segmap.shape,
+                                                                           int(areas[label]), mask_encoding_format,
+                                                                           tolerance)
+            if annotation is not None:
+                annotations.append(annotation)
+        return annotations
+
+    @staticmethod
+    def read_appendable_coco_annotations(coco_annotations_path: str) -> Optional[Dict[str, Any]]:
+        """Reads the images and categories at the end of a file written by dump_coco_annotations().
+
+        The annotations in the middle of the file are not read, only the position where they end and the id of the
+        last one are determined.
+
+        :param coco_annotations_path: The path of the coco annotations file.
+        :return: The images, categories, the byte position of the end of the annotations and the last annotation
+                 id. None, if the file has not been written by dump_coco_annotations().
+        """
+        # Quotes inside of json strings are escaped, so the markers can only appear as part of the structure
+        annotations_end_marker = b'], "images": ['
+        annotation_start_marker = b'{"id": '
+        with open(coco_annotations_path, "rb") as file:
+            file_size = file.seek(0, os.SEEK_END)
+            annotations_end = _CocoWriterUtility.rfind_in_file(file, annotations_end_marker, file_size)
+            if annotations_end is None:
+                return None
+            file.seek(annotations_end + 1)
+            try:
+                tail = json.loads(b"{" + file.read()[1:])
+            except ValueError:
+                return None
+            if not tail.get("images") or "categories" not in tail:
+                return None
+
+            file.seek(annotations_end - len(b'"annotations": ['))
+            if file.read(len(b'"annotations": [')) == b'"annotations": [':
+                # There are no annotations yet
+                last_annotation_id = None
+            else:
+                last_annotation_start = _CocoWriterUtility.rfind_in_file(file, annotation_start_marker,
+                                                                         annotations_end)
+                if last_annotation_start is None:
+                    return None
+                file.seek(last_annotation_start + len(annotation_start_marker))
+                last_annotation_id = int(file.read(32).split(b",")[0])
+        return {"images": tail["images"], "categories": tail["categories"], "annotations_end": annotations_end,
+                "last_annotation_id": last_annotation_id}
+
+    @staticmethod
+    def rfind_in_file(file, marker: bytes, end: int, block_size: int = 1 << 16) -> Optional[int]:
+        """Finds the last occurrence of the marker before the given position, only the end of the file is read.
+
+        :param file: The file opened in binary mode.
+        :param marker: The bytes to search for.
+        :param end: The position before which the marker has to end.
+        :param block_size: The amount of bytes, which is read at once.
+        :return: The position of the marker or None, if it is not found.
+        """
+        start = end
+        while start > 0:
+            start = max(0, start - block_size)
+            file.seek(start)
+            # The blocks overlap, so markers at the border of two blocks are found
+            position = file.read(min(end, start + block_size + len(marker)) - start).rfind(marker)
+            if position != -1:
+                return start + position
+        return None
+
+    @staticmethod
+    def dump_coco_annotations(coco_annotations_path: str, coco_annotations: Dict[str, Any]):
+        """Writes the coco annotations, so that new annotations can be appended later without reading them again.
+
+        The annotations are written before the images and the categories, so only those have to be rewritten, when
+        more annotations are appended.
+
+        :param coco_annotations_path: The path of the coco annotations file.
+        :param coco_annotations: A dict containing the coco annotations.
+        """
+        ordered_keys = [key for key in coco_annotations if key not in ["annotations", "images", "categories"]]
+        ordered_keys += ["annotations", "images", "categories"]
+        with open(coco_annotations_path, 'w', encoding="utf-8") as fp:
+            json.dump({key: coco_annotations[key] for key in ordered_keys}, fp)
+
+    @staticmethod
+    def append_coco_annotations(coco_annotations_path: str, existing_coco_annotations: Dict[str, Any],
+                                new_coco_annotations: Dict[str, Any]):
+        """Appends the new coco annotations in place to a file written by dump_coco_annotations().
+
+        The ids are adjusted in the same way as in merge_coco_annotations().
+
+        :param coco_annotations_path: The path of the coco annotations file.
+        :param existing_coco_annotations: The end of the existing file, as returned by
+                                          read_appendable_coco_annotations().
+        :param new_coco_annotations: A dict describing the new coco annotations.
+        """
+        categories = existing_coco_annotations["categories"]
+        for cat_dict in new_coco_annotations["categories"]:
+            if cat_dict not in categories:
+                categories.append(cat_dict)
+
+        image_id_offset = max(image["id"] for image in existing_coco_annotations["images"]) + 1
+        for image in new_coco_annotations["images"]:
+            image["id"] += image_id_offset
+        images = existing_coco_annotations["images"] + new_coco_annotations["images"]
+
+        last_annotation_id = existing_coco_annotations["last_annotation_id"]
+        annotation_id_offset = 0 if last_annotation_id is None else last_annotation_id + 1
+        for annotation in new_coco_annotations["annotations"]:
+            annotation["id"] += annotation_id_offset
+            annotation["image_id"] += image_id_offset
+
+        new_annotations = ", ".join(json.dumps(annotation) for annotation in new_coco_annotations["annotations"])
+        if new_annotations and last_annotation_id is not None:
+            new_annotations = ", " + new_annotations
+        with open(coco_annotations_path, "r+b") as file:
+            file.seek(existing_coco_annotations["annotations_end"])
+            file.write((new_annotations + '], "images": ' + json.dumps(images) + ', "categories": ' +
+                        json.dumps(categories) + "}").encode("utf-8"))
+            file.truncate()
+
     @staticmethod
     def merge_coco_annotations(existing_coco_annotations, new_coco_annotations):
         """ Merges the two given coco annotation dicts into one.
@@ -406,6 +616,50 @@ def create_annotation_info(annotation_id: int, image_id: int, category_id: int,
         }
         return annotation_info
 
+    @staticmethod
+    def create_cropped_annotation_info(annotation_id: int, image_id: int, category_id: int, cropped_mask: np.ndarray,
+                                       offset: Tuple[int, int], image_size: Tuple[int, int], area: int,
+                                       mask_encoding_format: str, tolerance: int = 2) \
+            -> Optional[Dict[str, Union[str, int]]]:
+        """Creates info section of coco annotation from the mask inside the bounding box of the object
+
+        :param annotation_id: integer to uniquly identify the annotation
+        :param image_id: integer to uniquly identify image
+        :param category_id: Id of the category
+        :param cropped_mask: The binary mask of the object inside its bounding box.
+        :param offset: The row and column of the upper left corner of the bounding box in the image.
+        :param image_size: The height and width of the image.
+        :param area: The amount of pixels of the object.
+        :param mask_encoding_format: Encoding format of the mask. Type: string.
+        :param tolerance: The tolerance for fitting polygons to the objects mask.
+        """
+        if area < 1:
+            return None
+
+        bounding_box = [int(offset[1]), int(offset[0]), int(cropped_mask.shape[1]), int(cropped_mask.shape[0])]
+
+        if mask_encoding_format == 'rle':
+            segmentation = cropped_binary_mask_to_rle(cropped_mask, offset, image_size)
+        elif mask_encoding_format == 'polygon':
+            segmentation = _CocoWriterUtility.binary_mask_to_polygon(cropped_mask, tolerance, offset)
+            if not segmentation:
+                return None
+        else:
+            raise RuntimeError(f"Unknown encoding format: {mask_encoding_format}")
+
+        annotation_info: Dict[str, Union[str, int]] = {
+            "id": annotation_id,
+            "image_id": image_id,
+            "category_id": category_id,
+            "iscrowd": 0,
+            "area": area,
+            "bbox": bounding_box,
+            "segmentation": segmentation,
+            "width": image_size[1],
+            "height": image_size[0],
+        }
+        return annotation_info
+
     @staticmethod
     def bbox_from_binary_mask(binary_mask: np.ndarray) -> List[int]:
         """ Returns the smallest bounding box containing all pixels marked "1" in the given image mask.
@@ -446,20 +700,22 @@ def close_contour(contour: np.ndarray) -> np.ndarray:
         return contour
 
     @staticmethod
-    def binary_mask_to_polygon(binary_mask: np.ndarray, tolerance: int = 0) -> List[np.ndarray]:
+    def binary_mask_to_polygon(binary_mask: np.ndarray, tolerance: int = 0,
+                               offset: Tuple[int, int] = (0, 0)) -> List[np.ndarray]:
         """Converts a binary mask to COCO polygon representation
 
          :param binary_mask: a 2D binary numpy array where '1's represent the object
          :param tolerance: Maximum distance from original points of polygon to approximated polygonal chain. If
                            tolerance is 0, the original coordinate array is returned.
+         :param offset: The row and column of the mask in the image, if the mask is only a crop of the image.
         """
         polygons = []
         # pad mask to close contours of shapes which start and end at an edge
         padded_binary_mask = np.pad(binary_mask, pad_width=1, mode='constant', constant_values=0)
-        contours = np.array(measure.find_contours(padded_binary_mask, 0.5))
-        # Reverse padding
-        contours -= 1
+        contours = measure.find_contours(padded_binary_mask, 0.5)
         for contour in contours:
+            # Reverse padding and move the contour into the image, if the mask is a crop
+            contour = contour - 1 + np.array(offset)
             # Make sure contour is closed
             contour = _CocoWriterUtility.close_contour(contour)
             # Approximate contour by polygon
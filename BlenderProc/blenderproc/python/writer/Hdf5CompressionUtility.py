@@ -0,0 +1,166 @@
+"""Configurable compression of the datasets in .hdf5 containers.
+
+This module does not depend on blender, so it can also be used by the scripts and by data loaders.
+"""
+
+from fnmatch import fnmatch
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+# The compression which is used if no settings are given for a key, this is what write_hdf5 always used
+DEFAULT_COMPRESSION_SETTINGS: Dict[str, Any] = {"compression": "gzip"}
+
+# Compressions which are provided via the hdf5plugin package
+PLUGIN_COMPRESSIONS = ["blosc", "zstd"]
+
+
+def get_compression_settings(key: str, compression_settings: Optional[Dict[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """ Returns the compression settings for the given key.
+
+    :param key: The key of the dataset, e.g. "colors" or "class_segmaps".
+    :param compression_settings: Maps keys or glob patterns like "*_segmaps" to their settings. A key is matched
+                                 exactly first, afterwards the patterns are tried in the given order.
+    :return: The settings for the key, if none match the default settings are returned.
+    """
+    if compression_settings:
+        if key in compression_settings:
+            return compression_settings[key]
+        for pattern, settings in compression_settings.items():
+            if fnmatch(key, pattern):
+                return settings
+    return DEFAULT_COMPRESSION_SETTINGS
+
+
+def uses_plugin_compression(compression_settings: Optional[Dict[str, Dict[str, Any]]]) -> bool:
+    """ Checks whether any of the given settings requires the hdf5plugin package.
+
+    :param compression_settings: Maps keys or glob patterns to their settings.
+    :return: True, if a compression of the hdf5plugin package is used.
+    """
+    return compression_settings is not None and any(settings.get("compression") in PLUGIN_COMPRESSIONS
+                                                    for settings in compression_settings.values())
+
+
+def get_auto_dtype(data_blocks: Iterable[np.ndarray]) -> Optional[np.dtype]:
+    """ Determines the smallest unsigned integer type, which can store all values of the given data.
+
+    :param data_blocks: The data, e.g. the segmentation maps of all frames of one key.
+    :return: The unsigned integer type or None, if not all data is integer data without negative values.
+    """
+    max_value = 0
+    for data in data_blocks:
+        if not isinstance(data, np.ndarray) or not np.issubdtype(data.dtype, np.integer):
+            return None
+        if data.size > 0:
+            if np.min(data) < 0:
+                return None
+            max_value = max(max_value, int(np.max(data)))
+    for uint_type in [np.uint8, np.uint16, np.uint32, np.uint64]:
+        if np.iinfo(uint_type).max >= max_value:
+            return np.dtype(uint_type)
+    return None
+
+
+def narrow_dtype(data: np.ndarray, dtype: Optional[str]) -> np.ndarray:
+    """ Converts the data into the given dtype to reduce its size.
+
+    :param data: The data to convert.
+    :param dtype: The target dtype, e.g. "float16" or "uint8". If this is "auto", integer data is converted into the
+                  smallest unsigned integer type, which can store all its values, and all other data is kept. As this
+                  only looks at the given data, the chosen dtype can differ between frames, use
+                  resolve_auto_dtypes() to pick one dtype for all frames of a key. If this is None, the data is kept.
+    :return: The converted data.
+    """
+    if dtype is None:
+        return data
+    if dtype == "auto":
+        auto_dtype = get_auto_dtype([data])
+        return data if auto_dtype is None else data.astype(auto_dtype)
+    return data.astype(dtype)
+
+
+def resolve_auto_dtypes(output_data_dict: Dict[str, Union[List[Any], np.ndarray]],
+                        compression_settings: Optional[Dict[str, Dict[str, Any]]]) \
+        -> Optional[Dict[str, Dict[str, Any]]]:
+    """ Replaces the "auto" dtype by one fixed dtype per key, which can store the values of all given frames.
+
+    This way e.g. the instance_segmaps of all frames are stored in the same dtype, even if only some frames contain
+    ids above 255.
+
+    :param output_data_dict: Maps each key to the data of all frames.
+    :param compression_settings: Maps keys or glob patterns to their compression settings.
+    :return: The compression settings with an exact entry for every key, whose dtype was "auto".
+    """
+    if not compression_settings:
+        return compression_settings
+    resolved_settings = {}
+    for key, data_block in output_data_dict.items():
+        frames = data_block if isinstance(data_block, list) else [data_block]
+        # stereo images might be stored in the separate keys key_0 and key_1
+        for stored_key in [key, key + "_0", key + "_1"]:
+            settings = get_compression_settings(stored_key, compression_settings)
+            if settings.get("dtype") == "auto":
+                auto_dtype = get_auto_dtype(np.asarray(frame) if isinstance(frame, list) else frame
+                                            for frame in frames)
+                resolved_settings[stored_key] = dict(settings, dtype=None if auto_dtype is None else auto_dtype.name)
+    return {**compression_settings, **resolved_settings}
+
+
+def get_dataset_options(data: np.ndarray, settings: Dict[str, Any]) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """ Determines the arguments for h5py's create_dataset() based on the given compression settings.
+
+    The settings can contain:
+        - "compression": None, "gzip", "lzf", "blosc" or "zstd". The last two require the hdf5plugin package, if it
+          is not available gzip is used instead.
+        - "compression_level": The level of gzip (0-9), blosc (0-9) or zstd (1-22).
+        - "chunks": The chunk shape, True for automatic chunking or None.
+        - "shuffle": Whether the bytes should be shuffled before compressing, this mostly helps multi-byte dtypes.
+        - "dtype": The dtype to store the data in, see narrow_dtype(). With "auto" the dtype only fits the given
+          data, so write_hdf5() and write_shards() resolve it once per key via resolve_auto_dtypes().
+
+    :param data: The data which should be stored.
+    :param settings: The compression settings.
+    :return: The data converted into the stored dtype and the keyword arguments for create_dataset().
+    """
+    data = narrow_dtype(data, settings.get("dtype"))
+    # h5py can not compress or chunk scalars
+    if data.ndim == 0:
+        return data, {}
+
+    compression = settings.get("compression")
+    level = settings.get("compression_level")
+    shuffle = settings.get("shuffle", False)
+    options: Dict[str, Any] = {}
+    if compression in PLUGIN_COMPRESSIONS:
+        try:
+            # pylint: disable=import-outside-toplevel
+            import hdf5plugin
+            # pylint: enable=import-outside-toplevel
+        except ImportError:
+            print(f"Warning: The compression {compression} requires the hdf5plugin package, using gzip instead.")
+            compression = "gzip"
+            level = None
+        else:
+            if compression == "blosc":
+                # blosc comes with its own shuffle
+                options.update(hdf5plugin.Blosc(cname="zstd", clevel=5 if level is None else level,
+                                                shuffle=hdf5plugin.Blosc.SHUFFLE if shuffle
+                                                else hdf5plugin.Blosc.NOSHUFFLE))
+                shuffle = False
+            else:
+                options.update(hdf5plugin.Zstd(clevel=3 if level is None else level))
+            compression = None
+    if compression is not None:
+        options["compression"] = compression
+        if compression == "gzip" and level is not None:
+            options["compression_opts"] = level
+    if shuffle:
+        options["shuffle"] = True
+    if settings.get("chunks") is not None:
+        chunks = settings["chunks"]
+        if chunks is not True:
+            # the chunks can not be larger than the data, missing trailing dimensions are not split
+            chunks = tuple(min(c, s) for c, s in zip(chunks, data.shape)) + data.shape[len(chunks):]
+        options["chunks"] = chunks
+    return data, options
@@ -0,0 +1,374 @@
+"""Reads the frames of generated .hdf5 containers or shards lazily.
+
+This module does not depend on blender, so it can be used directly in the data loaders of a training.
+"""
+
+import io
+import json
+import mmap
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union, Any, Tuple, Iterator, Sequence
+
+import h5py
+import numpy as np
+
+try:
+    # registers the blosc and zstd filters, which are needed to decode datasets compressed with them
+    import hdf5plugin  # pylint: disable=unused-import
+except ImportError:
+    hdf5plugin = None
+
+# The index, which is written by write_shards() next to the shards
+SHARD_INDEX_FILE_NAME = "index.jsonl"
+
+
+def read_shard_index(index_path: str) -> List[Dict[str, Any]]:
+    """ Reads the records of all frames from the index of shards, which is written by write_shards().
+
+    If a scene has been written multiple times, only the frames of its last write are returned.
+
+    :param index_path: The path of the index.jsonl.
+    :return: The records of the frames, in the order in which their scenes have been written first.
+    """
+    # Maps each scene to the shard and offset of its last container and the records of the frames in it
+    scenes: Dict[str, Tuple[Tuple[str, int], List[Dict[str, Any]]]] = {}
+    with open(index_path, "r", encoding="utf-8") as file:
+        for line in file:
+            # the last line might still be written by another process
+            if not line.endswith("\n"):
+                break
+            record = json.loads(line)
+            container = (record["shard"], record["container_offset"])
+            if record["scene_id"] not in scenes or scenes[record["scene_id"]][0] != container:
+                scenes[record["scene_id"]] = (container, [])
+            scenes[record["scene_id"]][1].append(record)
+    return [record for _, records in scenes.values() for record in records]
+
+
+class Hdf5Frame:
+    """
+    One frame of an Hdf5Reader, its keys are only read, when they are accessed.
+
+    Datasets which are stored without compression are returned as read-only views into the memory mapped file, all
+    other datasets are decoded on access.
+    """
+
+    def __init__(self, reader: "Hdf5Reader", index: int):
+        """
+        :param reader: The reader the frame belongs to.
+        :param index: The index of the frame in the reader.
+        """
+        self._reader = reader
+        self._index = index
+
+    def keys(self) -> List[str]:
+        """ Returns the keys, which are stored for this frame.
+
+        :return: The keys of the frame.
+        """
+        return self._reader.get_frame_keys(self._index)
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        return self._reader.read_key(self._index, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+
+class Hdf5Reader:
+    """
+    Gives access to the frames written by write_hdf5(), Hdf5StreamWriter or write_shards().
+
+    The given path can either be a single .hdf5 container, a folder with one container per frame or a folder with
+    shards and their index.jsonl. No data is read, until it is accessed:
+
+    .. code-block:: python
+
+        reader = Hdf5Reader("output/shards", keys=["colors", "class_segmaps"])
+        frame = reader[0]              # lazy frame, frame["colors"] reads only the colors
+        batch = reader[[4, 17, 23]]    # {"colors": (3, H, W, 3), "class_segmaps": (3, H, W)}
+
+    Datasets which are stored without compression (compression None) are memory mapped, so reading them does not
+    copy any data. For all other datasets only the requested keys are decompressed.
+    """
+
+    def __init__(self, path: str, keys: Optional[List[str]] = None, use_mmap: bool = True,
+                 max_open_files: int = 64):
+        """
+        :param path: The path to a .hdf5 container, a folder of containers or a folder of shards.
+        :param keys: The keys which are read in batches. If None, all keys of the first frame are used.
+        :param use_mmap: If True, uncompressed datasets are memory mapped instead of read via h5py.
+        :param max_open_files: The maximum amount of files which are kept open at the same time.
+        """
+        self._keys = keys
+        self._use_mmap = use_mmap
+        self._max_open_files = max_open_files
+        # Each frame is given as file path, byte offset and size of its container in a shard, group in the container
+        # and the known datasets of the group
+        self._frames: List[Tuple[str, Optional[Tuple[int, int]], str, Optional[Dict[str, Dict[str, Any]]]]] = []
+        # Maps (scene_id, frame_id) to the index of the frame, only filled for shards
+        self._scene_frames: Dict[Tuple[str, int], int] = {}
+        # Maps the file path and the container to the opened container and for shards the opened shard
+        self._open_files: "OrderedDict[Tuple[str, Optional[Tuple[int, int]]], Tuple[h5py.File, Any]]" = \
+            OrderedDict()
+        self._mapped_files: Dict[str, Tuple[Any, mmap.mmap]] = {}
+
+        index_path = os.path.join(path, SHARD_INDEX_FILE_NAME)
+        if os.path.isdir(path) and os.path.exists(index_path):
+            self._load_shard_index(path, index_path)
+        elif os.path.isdir(path):
+            file_names = [file_name for file_name in os.listdir(path) if file_name.endswith(".hdf5")]
+            # containers are numbered by their frame
+            file_names.sort(key=lambda name: (0, int(name[:-len(".hdf5")])) if name[:-len(".hdf5")].isdigit()
+                            else (1, name))
+            self._frames = [(os.path.join(path, file_name), None, "/", None) for file_name in file_names]
+        elif os.path.isfile(path):
+            self._frames = [(path, None, "/", None)]
+        else:
+            raise FileNotFoundError(f"The path does not exist: {path}")
+
+    def _load_shard_index(self, path: str, index_path: str):
+        """ Loads the index of the shards, see read_shard_index().
+
+        :param path: The folder of the shards.
+        :param index_path: The path of the index.
+        """
+        for record in read_shard_index(index_path):
+            self._scene_frames[(record["scene_id"], record["frame_id"])] = len(self._frames)
+            self._frames.append((os.path.join(path, record["shard"]),
+                                 (record["container_offset"], record["container_size"]), record["group"],
+                                 record["keys"]))
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def index_of(self, scene_id: str, frame_id: int) -> int:
+        """ Returns the index of the given frame of a scene, this is only available for shards.
+
+        :param scene_id: The id of the scene, as given to write_shards().
+        :param frame_id: The frame in the scene.
+        :return: The index of the frame in this reader.
+        """
+        return self._scene_frames[(scene_id, frame_id)]
+
+    def __getitem__(self, index: Union[int, slice, Sequence[int], np.ndarray]) \
+            -> Union[Hdf5Frame, Dict[str, Union[np.ndarray, List[Any]]]]:
+        """ Returns a single lazy frame or for a slice or a list of indices a batch of the selected keys.
+
+        :param index: The index of a frame, a slice or a list of indices.
+        :return: A lazy frame for a single index, otherwise a dict mapping each key to the stacked data of the
+                 frames. Keys which can not be stacked, e.g. json strings or data of different shapes, are returned
+                 as list.
+        """
+        if isinstance(index, (int, np.integer)):
+            if index < 0:
+                index += len(self)
+            if not 0 <= index < len(self):
+                raise IndexError(f"The frame {index} does not exist, there are only {len(self)} frames.")
+            return Hdf5Frame(self, int(index))
+        if isinstance(index, slice):
+            index = range(*index.indices(len(self)))
+        return self.read_batch(index)
+
+    def read_batch(self, indices: Sequence[int], keys: Optional[List[str]] = None) \
+            -> Dict[str, Union[np.ndarray, List[Any]]]:
+        """ Reads the given keys of multiple frames.
+
+        :param indices: The indices of the frames.
+        :param keys: The keys to read, if None the keys given to the reader are used.
+        :return: A dict mapping each key to the stacked data of the frames. Numeric data of the same shape is
+                 stacked in a common dtype, e.g. if the segmaps were narrowed differently per container.
+        """
+        indices = [int(index) for index in indices]
+        if keys is None:
+            keys = self._keys if self._keys is not None else (self.get_frame_keys(indices[0]) if indices else [])
+        batch: Dict[str, Union[np.ndarray, List[Any]]] = {}
+        for key in keys:
+            values = [self.read_key(index, key) for index in indices]
+            if values and all(isinstance(value, np.ndarray) and value.dtype.kind in "biuf" and
+                              value.shape == values[0].shape
+                              for value in values):
+                batch[key] = np.stack(values)
+            else:
+                batch[key] = values
+        return batch
+
+    def get_frame_keys(self, index: int) -> List[str]:
+        """ Returns the keys, which are stored for the given frame.
+
+        :param index: The index of the frame.
+        :return: The keys of the frame.
+        """
+        return list(self._get_datasets(index).keys())
+
+    def read_key(self, index: int, key: str) -> Union[np.ndarray, Any]:
+        """ Reads one key of the given frame.
+
+        :param index: The index of the frame.
+        :param key: The key to read.
+        :return: The data, uncompressed datasets are returned as read-only view into the file. Json strings are
+                 returned decoded.
+        """
+        file_path, container, group, _ = self._frames[index]
+        info = self._get_datasets(index)[key]
+        if self._use_mmap and info["offset"] is not None and np.dtype(info["dtype"]).kind in "biuf":
+            return self._map_dataset(file_path, info)
+        data = self._get_file(file_path, container)[group][key][()]
+        if isinstance(data, bytes):
+            try:
+                return json.loads(data)
+            except ValueError:
+                return data
+        return data
+
+    def _get_datasets(self, index: int) -> Dict[str, Dict[str, Any]]:
+        """ Returns shape, dtype and offset of all datasets of the given frame, they are read once if unknown.
+
+        :param index: The index of the frame.
+        :return: Maps each key to its shape, dtype and byte offset in the file, which is None for compressed
+                 datasets.
+        """
+        file_path, container, group, datasets = self._frames[index]
+        if datasets is None:
+            datasets = {}
+            for key, dataset in self._get_file(file_path, container)[group].items():
+                if isinstance(dataset, h5py.Dataset):
+                    offset = dataset.id.get_offset()
+                    if offset is not None and container is not None:
+                        offset += container[0]
+                    datasets[key] = {"shape": list(dataset.shape), "dtype": dataset.dtype.str, "offset": offset}
+            self._frames[index] = (file_path, container, group, datasets)
+        return datasets
+
+    def _get_file(self, file_path: str, container: Optional[Tuple[int, int]]) -> h5py.File:
+        """ Returns the opened container, the least recently used container is closed, if too many are open.
+
+        :param file_path: The path of the file.
+        :param container: The byte offset and size of the container in the shard or None, if the file is the
+                          container itself.
+        :return: The opened h5py file.
+        """
+        key = (file_path, container)
+        if key in self._open_files:
+            self._open_files.move_to_end(key)
+        else:
+            if len(self._open_files) >= self._max_open_files:
+                _, opened_files = self._open_files.popitem(last=False)
+                Hdf5Reader._close_files(opened_files)
+            if container is None:
+                self._open_files[key] = (h5py.File(file_path, "r"), None)
+            else:
+                # pylint: disable=consider-using-with
+                shard = open(file_path, "rb")
+                # pylint: enable=consider-using-with
+                self._open_files[key] = (h5py.File(_ContainerInShard(shard, *container), "r"), shard)
+        return self._open_files[key][0]
+
+    @staticmethod
+    def _close_files(opened_files: Tuple[h5py.File, Any]):
+        """ Closes an opened container and its shard, the container has to be closed first.
+
+        :param opened_files: The opened container and the opened shard or None.
+        """
+        container_file, shard = opened_files
+        container_file.close()
+        if shard is not None:
+            shard.close()
+
+    def _map_dataset(self, file_path: str, info: Dict[str, Any]) -> np.ndarray:
+        """ Returns a contiguous dataset as view into the memory mapped file.
+
+        :param file_path: The path of the file.
+        :param info: The shape, dtype and offset of the dataset.
+        :return: The read-only view of the dataset.
+        """
+        dtype = np.dtype(info["dtype"])
+        end = info["offset"] + int(np.prod(info["shape"])) * dtype.itemsize
+        # shards grow, while they are read, so they are mapped again if the dataset lies behind the mapped part
+        if file_path not in self._mapped_files or len(self._mapped_files[file_path][1]) < end:
+            self._unmap(file_path)
+            # pylint: disable=consider-using-with
+            file = open(file_path, "rb")
+            # pylint: enable=consider-using-with
+            self._mapped_files[file_path] = (file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+        buffer = self._mapped_files[file_path][1]
+        return np.frombuffer(buffer, dtype=dtype, count=int(np.prod(info["shape"])),
+                             offset=info["offset"]).reshape(info["shape"])
+
+    def _unmap(self, file_path: str):
+        """ Drops the memory map of the given file, views which are still in use keep it alive.
+
+        :param file_path: The path of the file.
+        """
+        if file_path in self._mapped_files:
+            file, _ = self._mapped_files.pop(file_path)
+            file.close()
+
+    def close(self):
+        """ Closes all opened files. """
+        for opened_files in self._open_files.values():
+            Hdf5Reader._close_files(opened_files)
+        self._open_files.clear()
+        for file_path in list(self._mapped_files.keys()):
+            self._unmap(file_path)
+
+    def __enter__(self) -> "Hdf5Reader":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # open files can not be shared with the worker processes of a data loader, they are opened again there
+        state = self.__dict__.copy()
+        state["_open_files"] = OrderedDict()
+        state["_mapped_files"] = {}
+        return state
+
+
+class _ContainerInShard(io.RawIOBase):
+    """
+    A read-only file object for one .hdf5 container, which is stored at the given byte range inside of a shard.
+    """
+
+    def __init__(self, shard, offset: int, size: int):
+        """
+        :param shard: The opened shard.
+        :param offset: The byte offset of the container in the shard.
+        :param size: The size of the container in bytes.
+        """
+        super().__init__()
+        self._shard = shard
+        self._offset = offset
+        self._size = size
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        else:
+            self._position = self._size + offset
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        amount = max(0, min(len(buffer), self._size - self._position))
+        self._shard.seek(self._offset + self._position)
+        data = self._shard.read(amount)
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
@@ -0,0 +1,160 @@
+"""Writes frames into .hdf5 containers in the background, while the next frames are generated."""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Union, Optional, Any
+
+import bpy
+import numpy as np
+
+from blenderproc.python.utility.SetupUtility import SetupUtility
+from blenderproc.python.utility.Utility import Utility
+from blenderproc.python.writer.Hdf5CompressionUtility import uses_plugin_compression
+from blenderproc.python.writer.WriterUtility import _WriterUtility
+
+
+class Hdf5StreamWriter:
+    """
+    Writes frames into .hdf5 containers in the background, so compressing and writing them does not block the
+    generation of the next frames. To overlap writing with rendering, the frames are handed over by render() right
+    after each of them has been rendered, so only a few frames are in memory at the same time.
+
+    Each frame is written into its own container, exactly as write_hdf5() does. At most `max_pending_frames` frames
+    are kept in memory, if more frames are handed over, write_frame() blocks until one of them has been written. A
+    container only appears under its final name after it has been completely written and synced to disk.
+
+    .. code-block:: python
+
+        with bproc.writer.Hdf5StreamWriter(output_dir) as writer:
+            bproc.renderer.render(frame_callback=writer.write_frame)
+    """
+
+    def __init__(self, output_dir_path: str, append_to_existing_output: bool = False,
+                 stereo_separate_keys: bool = False, max_pending_frames: int = 4, num_workers: int = 2,
+                 compression_settings: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        :param output_dir_path: The folder path in which the .hdf5 containers will be generated
+        :param append_to_existing_output: If this is True, the output_dir_path folder will be scanned for pre-existing
+                                          .hdf5 containers and the numbering of the newly added containers, will start
+                                          right where the last run left off.
+        :param stereo_separate_keys: If this is True and the rendering was done in stereo mode, than the stereo images
+                                     won't be saved in one tensor [2, img_x, img_y, channels], where the img[0] is
+                                     the left image and img[1] the right. They will be saved in separate keys: for
+                                     example for colors in colors_0 and colors_1.
+        :param max_pending_frames: The maximum amount of frames, which are handed over but not yet written.
+        :param num_workers: The amount of threads, which compress and write frames in parallel.
+        :param compression_settings: Maps keys or glob patterns like "*_segmaps" to their compression settings, see
+                                     write_hdf5(). As the frames are written one by one, the "auto" dtype is
+                                     chosen per frame and can differ between the containers, set an explicit
+                                     dtype like "uint16" if all frames have to match.
+        """
+        if max_pending_frames < 1 or num_workers < 1:
+            raise ValueError("The max_pending_frames and num_workers have to be at least one.")
+        self._output_dir_path = output_dir_path
+        self._stereo_separate_keys = stereo_separate_keys
+        self._compression_settings = compression_settings
+        os.makedirs(output_dir_path, exist_ok=True)
+        if uses_plugin_compression(compression_settings):
+            SetupUtility.setup_pip(["hdf5plugin"])
+
+        self._next_index = 0
+        # if append to existing output is turned on the existing folder is searched for the highest occurring
+        # index, which is then used as starting point for this run
+        if append_to_existing_output:
+            for path in os.listdir(output_dir_path):
+                if path.endswith(".hdf5"):
+                    index = path[:-len(".hdf5")]
+                    if index.isdigit():
+                        self._next_index = max(self._next_index, int(index) + 1)
+
+        self._blender_proc_version = Utility.get_current_version()
+        self._pending_frames = threading.BoundedSemaphore(max_pending_frames)
+        self._futures: List[Future] = []
+        # Threads are used, as forking the multi-threaded blender process is not safe. The compression filters and
+        # the file io release the GIL, so they run in parallel to rendering.
+        self._executor: Optional[ThreadPoolExecutor] = ThreadPoolExecutor(num_workers)
+
+    def write_frame(self, frame_data: Dict[str, Union[np.ndarray, list, dict]]) -> str:
+        """ Hands over the data of one frame, which is then written in the background.
+
+        :param frame_data: The data of the frame, each key will be saved as its own key in the .hdf5 container.
+        :return: The path of the .hdf5 container, which will contain the frame.
+        """
+        if self._executor is None:
+            raise RuntimeError("The writer has already been closed.")
+        hdf5_path = os.path.join(self._output_dir_path, str(self._next_index) + ".hdf5")
+        self._next_index += 1
+
+        # Blocks until there is space for another frame
+        self._pending_frames.acquire()  # pylint: disable=consider-using-with
+        try:
+            future = self._executor.submit(_write_frame, hdf5_path, frame_data, self._stereo_separate_keys,
+                                           bpy.context.scene.render.use_multiview, self._blender_proc_version,
+                                           self._compression_settings)
+        except Exception:
+            self._pending_frames.release()
+            raise
+        future.add_done_callback(lambda _: self._pending_frames.release())
+        self._futures.append(future)
+        return hdf5_path
+
+    def write(self, output_data_dict: Dict[str, List[Union[np.ndarray, list, dict]]]) -> List[str]:
+        """ Hands over all frames of the given output, as returned by bproc.renderer.render().
+
+        :param output_data_dict: The container, which keeps the different images, which should be saved to disc.
+                                 Each key will be saved as its own key in the .hdf5 container.
+        :return: The paths of the .hdf5 containers, one per frame.
+        """
+        amount_of_frames = max([len(data_block) for data_block in output_data_dict.values()
+                                if isinstance(data_block, list)], default=0)
+        for key, data_block in output_data_dict.items():
+            if len(data_block) < amount_of_frames:
+                raise Exception(f"There are more frames {amount_of_frames} then there are blocks of information "
+                                f" {len(data_block)} in the given list for key {key}.")
+        return [self.write_frame({key: data_block[frame] for key, data_block in output_data_dict.items()})
+                for frame in range(amount_of_frames)]
+
+    def flush(self):
+        """ Waits until all handed over frames have been written and synced to disk.
+
+        If writing one of the frames has failed, its error is raised here.
+        """
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """ Flushes all frames and stops the background workers. """
+        if self._executor is not None:
+            try:
+                self.flush()
+            finally:
+                self._executor.shutdown()
+                self._executor = None
+
+    def __enter__(self) -> "Hdf5StreamWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _write_frame(hdf5_path: str, frame_data: Dict[str, Union[np.ndarray, list, dict]], stereo_separate_keys: bool,
+                 is_stereo: bool, blender_proc_version: Optional[str],
+                 compression_settings: Optional[Dict[str, Dict[str, Any]]]):
+    """ Writes one frame into a temporary file, which is renamed after it has been synced to disk.
+
+    :param hdf5_path: The final path of the .hdf5 container.
+    :param frame_data: The data of the frame.
+    :param stereo_separate_keys: If this is True, stereo images are saved in separate keys.
+    :param is_stereo: Whether the rendering was done in stereo mode.
+    :param blender_proc_version: The version of BlenderProc, which is stored in the container if given.
+    :param compression_settings: Maps keys or glob patterns to their compression settings.
+    """
+    temp_path = hdf5_path + ".incomplete"
+    _WriterUtility.write_hdf5_frame(temp_path, frame_data, stereo_separate_keys, is_stereo, blender_proc_version,
+                                    compression_settings)
+    with open(temp_path, "rb") as file:
+        os.fsync(file.fileno())
+    os.replace(temp_path, hdf5_path)
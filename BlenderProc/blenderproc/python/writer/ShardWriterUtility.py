@@ -0,0 +1,290 @@
+"""Writes the frames of many scenes into a few large shards of .hdf5 containers with a global index."""
+
+import io
+import json
+import os
+import re
+import uuid
+from typing import List, Dict, Union, Optional, Any, Tuple
+
+import h5py
+import numpy as np
+
+from blenderproc.python.writer.Hdf5CompressionUtility import uses_plugin_compression, resolve_auto_dtypes
+from blenderproc.python.writer.Hdf5Reader import SHARD_INDEX_FILE_NAME, read_shard_index
+from blenderproc.python.writer.WriterUtility import _WriterUtility
+from blenderproc.python.utility.SetupUtility import SetupUtility
+
+try:
+    import fcntl
+except ImportError:
+    # on windows msvcrt is used for locking
+    fcntl = None
+    import msvcrt  # pylint: disable=import-error
+
+
+def write_shards(output_dir_path: str, output_data_dict: Dict[str, List[Union[np.ndarray, list, dict]]],
+                 scene_id: Optional[str] = None, shard_size_mb: float = 1024.0,
+                 compression_settings: Optional[Dict[str, Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """ Appends all frames of the given output to a large shard, instead of writing one container per frame.
+
+    The frames of the scene are written into one .hdf5 container in memory, with the groups "<scene_id>/<frame_id>",
+    which is then appended to the end of a shard. A shard is therefore a sequence of such containers. A new shard is
+    started, as soon as all existing shards are larger than `shard_size_mb`. Each written frame is recorded in the
+    global index `index.jsonl` in the output_dir_path, which contains the shard, the byte range of the container in
+    the shard, the group, the keys and for not compressed datasets the byte offset inside the shard, so each frame can
+    be accessed directly.
+
+    Several processes can append to the same output_dir_path at the same time, as every shard is only written by
+    one process at a time and the index is only appended to while holding a lock. If a scene is written again, e.g.
+    after a failed run, only the frames of its last write are read.
+
+    The bytes, which are already in a shard, are never modified and the index records are appended only after the
+    container has been synced to disk, so they are the commit point of the scene. If the process crashes or is killed
+    while writing, the incomplete bytes at the end of the shard are not referenced by the index and all earlier scenes
+    stay intact. These bytes and the containers of rewritten scenes are removed by compact_shards().
+
+    :param output_dir_path: The folder in which the shards and the index are stored.
+    :param output_data_dict: The container, which keeps the different images, which should be saved to disc.
+                             Each key will be saved as its own dataset in the group of the frame.
+    :param scene_id: The id of the scene, which has to be unique over all scenes written to the output_dir_path.
+                     If None, a random id is used.
+    :param shard_size_mb: The size in MB after which no more scenes are appended to a shard.
+    :param compression_settings: Maps keys or glob patterns like "*_segmaps" to their compression settings, see
+                                 write_hdf5(). The "auto" dtype is chosen once for all frames of the scene, so
+                                 different scenes can still use different dtypes, set an explicit dtype if all
+                                 scenes have to match.
+    :return: The index records of the written frames.
+    """
+    os.makedirs(output_dir_path, exist_ok=True)
+    if scene_id is None:
+        scene_id = uuid.uuid4().hex
+    if "/" in scene_id:
+        raise ValueError(f"The scene id can not contain a \"/\": {scene_id}")
+    if uses_plugin_compression(compression_settings):
+        SetupUtility.setup_pip(["hdf5plugin"])
+
+    amount_of_frames = max([len(data_block) for data_block in output_data_dict.values()
+                            if isinstance(data_block, list)], default=0)
+    for key, data_block in output_data_dict.items():
+        if len(data_block) < amount_of_frames:
+            raise Exception(f"There are more frames {amount_of_frames} then there are blocks of information "
+                            f" {len(data_block)} in the given list for key {key}.")
+
+    # the "auto" dtype is determined over all frames, so each key is stored in the same dtype in every frame
+    compression_settings = resolve_auto_dtypes(output_data_dict, compression_settings)
+    container, records = _ShardWriter.create_container(output_data_dict, scene_id, amount_of_frames,
+                                                       compression_settings)
+
+    shard_path, lock_file = _ShardWriter.acquire_shard(output_dir_path, shard_size_mb)
+    try:
+        container_offset = _ShardWriter.append_container(shard_path, container)
+    finally:
+        _ShardWriter.unlock(lock_file)
+        lock_file.close()
+
+    for record in records:
+        record.update({"shard": os.path.basename(shard_path), "container_offset": container_offset,
+                       "container_size": len(container)})
+        for info in record["keys"].values():
+            if info["offset"] is not None:
+                info["offset"] += container_offset
+    _ShardWriter.append_to_index(os.path.join(output_dir_path, SHARD_INDEX_FILE_NAME), records)
+    print(f"Appended {amount_of_frames} frames of scene {scene_id} to {shard_path}")
+    return records
+
+
+def compact_shards(output_dir_path: str, shard_size_mb: float = 1024.0):
+    """ Rewrites the shards, so they only contain the containers, which are referenced by the index.
+
+    This removes the containers of scenes, which have been written again, and the incomplete bytes of crashed
+    processes. The referenced containers are copied into new shards, then the index is replaced and the old shards
+    are removed. No other process may write to or read from the output_dir_path in the meantime.
+
+    :param output_dir_path: The folder in which the shards and the index are stored.
+    :param shard_size_mb: The size in MB after which no more containers are copied into a shard.
+    """
+    index_path = os.path.join(output_dir_path, SHARD_INDEX_FILE_NAME)
+    frame_records = read_shard_index(index_path)
+    old_shards = {file_name for file_name in os.listdir(output_dir_path)
+                  if re.fullmatch(_ShardWriter.shard_file_pattern, file_name)}
+    next_shard_id = max([int(re.fullmatch(_ShardWriter.shard_file_pattern, file_name).group(1))
+                         for file_name in old_shards], default=-1) + 1
+
+    # the referenced containers in the order they have been written
+    containers: Dict[Tuple[str, int], int] = {}
+    for record in frame_records:
+        containers[(record["shard"], record["container_offset"])] = record["container_size"]
+
+    new_offsets: Dict[Tuple[str, int], Tuple[str, int]] = {}
+    new_shard, new_file = None, None
+    try:
+        for (shard, container_offset), container_size in containers.items():
+            if new_file is None or new_file.tell() >= shard_size_mb * 1024 * 1024:
+                if new_file is not None:
+                    _ShardWriter.sync_and_close(new_file)
+                new_shard = _ShardWriter.shard_file_name.format(next_shard_id)
+                next_shard_id += 1
+                # pylint: disable=consider-using-with
+                new_file = open(os.path.join(output_dir_path, new_shard), "wb")
+                # pylint: enable=consider-using-with
+            new_offsets[(shard, container_offset)] = (new_shard, new_file.tell())
+            with open(os.path.join(output_dir_path, shard), "rb") as file:
+                file.seek(container_offset)
+                new_file.write(file.read(container_size))
+    finally:
+        if new_file is not None:
+            _ShardWriter.sync_and_close(new_file)
+
+    lines = []
+    for record in frame_records:
+        new_shard, new_offset = new_offsets[(record["shard"], record["container_offset"])]
+        for info in record["keys"].values():
+            if info["offset"] is not None:
+                info["offset"] += new_offset - record["container_offset"]
+        record.update({"shard": new_shard, "container_offset": new_offset})
+        lines.append(json.dumps(record) + "\n")
+    with open(index_path + ".incomplete", "w", encoding="utf-8") as file:
+        file.write("".join(lines))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(index_path + ".incomplete", index_path)
+
+    for shard in old_shards:
+        os.remove(os.path.join(output_dir_path, shard))
+        if os.path.exists(os.path.join(output_dir_path, shard + ".lock")):
+            os.remove(os.path.join(output_dir_path, shard + ".lock"))
+    print(f"Compacted {len(old_shards)} shards into {len({shard for shard, _ in new_offsets.values()})} shards")
+
+
+class _ShardWriter:
+
+    # the shards are no valid .hdf5 files themselves, only the containers inside of them
+    shard_file_name = "shard_{:06d}.shard"
+    shard_file_pattern = r"shard_(\d{6})\.shard"
+
+    @staticmethod
+    def create_container(output_data_dict: Dict[str, List[Union[np.ndarray, list, dict]]], scene_id: str,
+                         amount_of_frames: int, compression_settings: Optional[Dict[str, Dict[str, Any]]]) \
+            -> Tuple[bytes, List[Dict[str, Any]]]:
+        """ Writes all frames of a scene into an .hdf5 container in memory.
+
+        :param output_data_dict: The container, which keeps the different images of the frames.
+        :param scene_id: The id of the scene.
+        :param amount_of_frames: The amount of frames of the scene.
+        :param compression_settings: Maps keys or glob patterns to their compression settings.
+        :return: The bytes of the container and the index records of its frames, their dataset offsets are relative
+                 to the start of the container.
+        """
+        buffer = io.BytesIO()
+        records = []
+        with h5py.File(buffer, "w") as file:
+            for frame in range(amount_of_frames):
+                group_name = f"{scene_id}/{frame}"
+                group = file.create_group(group_name)
+                keys = {}
+                for key, data_block in output_data_dict.items():
+                    _WriterUtility.write_to_hdf_file(group, key, data_block[frame],
+                                                     compression_settings=compression_settings)
+                    dataset = group[key]
+                    keys[key] = {"shape": list(dataset.shape), "dtype": dataset.dtype.str,
+                                 "offset": dataset.id.get_offset()}
+                records.append({"scene_id": scene_id, "frame_id": frame, "group": group_name, "keys": keys})
+        return buffer.getvalue(), records
+
+    @staticmethod
+    def append_container(shard_path: str, container: bytes) -> int:
+        """ Appends the container to the end of the shard and syncs it to disk.
+
+        :param shard_path: The path of the shard, which has to be locked by this process.
+        :param container: The bytes of the container.
+        :return: The byte offset of the container in the shard.
+        """
+        with open(shard_path, "ab") as file:
+            container_offset = file.seek(0, os.SEEK_END)
+            file.write(container)
+            # the index must never point to data, which is not on the disk yet
+            file.flush()
+            os.fsync(file.fileno())
+        return container_offset
+
+    @staticmethod
+    def sync_and_close(file):
+        """ Syncs the given file to disk and closes it.
+
+        :param file: The opened file.
+        """
+        file.flush()
+        os.fsync(file.fileno())
+        file.close()
+
+    @staticmethod
+    def acquire_shard(output_dir_path: str, shard_size_mb: float) -> Tuple[str, Any]:
+        """ Finds a shard, which is not full and not written by another process, and locks it.
+
+        :param output_dir_path: The folder in which the shards are stored.
+        :param shard_size_mb: The size in MB after which no more scenes are appended to a shard.
+        :return: The path of the shard and the opened lock file, which has to be unlocked and closed afterwards.
+        """
+        shard_id = 0
+        while True:
+            shard_path = os.path.join(output_dir_path, _ShardWriter.shard_file_name.format(shard_id))
+            if not os.path.exists(shard_path) or os.path.getsize(shard_path) < shard_size_mb * 1024 * 1024:
+                # pylint: disable=consider-using-with
+                lock_file = open(shard_path + ".lock", "a+b")
+                # pylint: enable=consider-using-with
+                if _ShardWriter.lock(lock_file, blocking=False):
+                    # another process might have filled the shard in the meantime
+                    if not os.path.exists(shard_path) or \
+                            os.path.getsize(shard_path) < shard_size_mb * 1024 * 1024:
+                        return shard_path, lock_file
+                    _ShardWriter.unlock(lock_file)
+                lock_file.close()
+            shard_id += 1
+
+    @staticmethod
+    def append_to_index(index_path: str, records: List[Dict[str, Any]]):
+        """ Appends the given records to the index, while holding a lock on it.
+
+        :param index_path: The path of the index file.
+        :param records: The records to append, one line per record is written.
+        """
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        with open(index_path, "a", encoding="utf-8") as file:
+            _ShardWriter.lock(file, blocking=True)
+            try:
+                file.write(lines)
+                file.flush()
+                os.fsync(file.fileno())
+            finally:
+                _ShardWriter.unlock(file)
+
+    @staticmethod
+    def lock(file, blocking: bool) -> bool:
+        """ Locks the given file exclusively, the lock is released automatically, if the process dies.
+
+        :param file: The opened file.
+        :param blocking: If True, this waits until the lock is available.
+        :return: True, if the lock has been acquired.
+        """
+        try:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def unlock(file):
+        """ Releases the lock of the given file.
+
+        :param file: The opened and locked file.
+        """
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -2,7 +2,7 @@
 
 
 import os
-from typing import List, Dict, Union, Any, Set, Tuple
+from typing import List, Dict, Union, Any, Set, Tuple, Optional
 import json
 
 import csv
@@ -16,17 +16,32 @@
 from blenderproc.python.postprocessing.PostProcessingUtility import dist2depth, depth2dist
 from blenderproc.python.types.EntityUtility import Entity
 from blenderproc.python.utility.BlenderUtility import load_image
+from blenderproc.python.utility.SetupUtility import SetupUtility
 from blenderproc.python.utility.Utility import resolve_path, Utility, NumpyEncoder
 from blenderproc.python.utility.MathUtility import change_coordinate_frame_of_point, \
     change_source_coordinate_frame_of_transformation_matrix, change_target_coordinate_frame_of_transformation_matrix
 from blenderproc.python.camera import CameraUtility
+from blenderproc.python.writer.Hdf5CompressionUtility import get_compression_settings, get_dataset_options, \
+    uses_plugin_compression, resolve_auto_dtypes
 
 
 def write_hdf5(output_dir_path: str, output_data_dict: Dict[str, List[Union[np.ndarray, list, dict]]],
-               append_to_existing_output: bool = False, stereo_separate_keys: bool = False):
+               append_to_existing_output: bool = False, stereo_separate_keys: bool = False,
+               compression_settings: Optional[Dict[str, Dict[str, Any]]] = None):
     """
     Saves the information provided inside of the output_data_dict into a .hdf5 container
 
+    The compression of each key can be configured, e.g. to store the distance as float16 and to use a faster to
+    decode compression:
+
+    .. code-block:: python
+
+        bproc.writer.write_hdf5(output_dir, data, compression_settings={
+            "colors": {"compression": "lzf", "chunks": (128, 128, 3)},
+            "distance": {"compression": "lzf", "shuffle": True, "dtype": "float16"},
+            "*_segmaps": {"compression": "gzip", "compression_level": 1, "dtype": "auto"}
+        })
+
     :param output_dir_path: The folder path in which the .hdf5 containers will be generated
     :param output_data_dict: The container, which keeps the different images, which should be saved to disc.
                              Each key will be saved as its own key in the .hdf5 container.
@@ -37,10 +52,15 @@ def write_hdf5(output_dir_path: str, output_data_dict: Dict[str, List[Union[np.n
                                  won't be saved in one tensor [2, img_x, img_y, channels], where the img[0] is the
                                  left image and img[1] the right. They will be saved in separate keys: for example
                                  for colors in colors_0 and colors_1.
+    :param compression_settings: Maps keys or glob patterns like "*_segmaps" to their compression settings, the
+                                 possible settings are described in Hdf5CompressionUtility.get_dataset_options().
+                                 Keys without settings are compressed with gzip.
     """
 
     if not os.path.exists(output_dir_path):
         os.makedirs(output_dir_path)
+    if uses_plugin_compression(compression_settings):
+        SetupUtility.setup_pip(["hdf5plugin"])
 
     amount_of_frames = 0
     for data_block in output_data_dict.values():
@@ -64,31 +84,26 @@ def write_hdf5(output_dir_path: str, output_data_dict: Dict[str, List[Union[np.n
         raise Exception("The amount of images stored in the output_data_dict does not correspond with the amount"
                         "of images specified by frame_start to frame_end.")
 
+    # the "auto" dtype is determined over all frames, so each key is stored in the same dtype in every container
+    compression_settings = resolve_auto_dtypes(output_data_dict, compression_settings)
+    blender_proc_version = Utility.get_current_version()
     for frame in range(bpy.context.scene.frame_start, bpy.context.scene.frame_end):
         # for each frame a new .hdf5 file is generated
         hdf5_path = os.path.join(output_dir_path, str(frame + frame_offset) + ".hdf5")
-        with h5py.File(hdf5_path, "w") as file:
-            # Go through all the output types
-            print(f"Merging data for frame {frame} into {hdf5_path}")
-
-            adjusted_frame = frame - bpy.context.scene.frame_start
-            for key, data_block in output_data_dict.items():
-                if adjusted_frame < len(data_block):
-                    # get the current data block for the current frame
-                    used_data_block = data_block[adjusted_frame]
-                    if stereo_separate_keys and (bpy.context.scene.render.use_multiview or
-                                                 used_data_block.shape[0] == 2):
-                        # stereo mode was activated
-                        _WriterUtility.write_to_hdf_file(file, key + "_0", data_block[adjusted_frame][0])
-                        _WriterUtility.write_to_hdf_file(file, key + "_1", data_block[adjusted_frame][1])
-                    else:
-                        _WriterUtility.write_to_hdf_file(file, key, data_block[adjusted_frame])
-                else:
-                    raise Exception(f"There are more frames {adjusted_frame} then there are blocks of information "
-                                    f" {len(data_block)} in the given list for key {key}.")
-            blender_proc_version = Utility.get_current_version()
-            if blender_proc_version is not None:
-                _WriterUtility.write_to_hdf_file(file, "blender_proc_version", np.string_(blender_proc_version))
+        print(f"Merging data for frame {frame} into {hdf5_path}")
+
+        adjusted_frame = frame - bpy.context.scene.frame_start
+        frame_data = {}
+        for key, data_block in output_data_dict.items():
+            if adjusted_frame < len(data_block):
+                # get the current data block for the current frame
+                frame_data[key] = data_block[adjusted_frame]
+            else:
+                raise Exception(f"There are more frames {adjusted_frame} then there are blocks of information "
+                                f" {len(data_block)} in the given list for key {key}.")
+        _WriterUtility.write_hdf5_frame(hdf5_path, frame_data, stereo_separate_keys,
+                                        bpy.context.scene.render.use_multiview, blender_proc_version,
+                                        compression_settings)
 
 
 class _WriterUtility:
@@ -341,12 +356,47 @@ def _get_shapenet_attribute(shapenet_obj: bpy.types.Object, attribute_name: str,
                                                    world_frame_change)
 
     @staticmethod
-    def write_to_hdf_file(file, key: str, data: Union[np.ndarray, list, dict], compression: str = "gzip"):
+    def write_hdf5_frame(hdf5_path: str, frame_data: Dict[str, Union[np.ndarray, list, dict]],
+                         stereo_separate_keys: bool, is_stereo: bool, blender_proc_version: Optional[str],
+                         compression_settings: Optional[Dict[str, Dict[str, Any]]] = None):
+        """ Writes the data of one frame into a new .hdf5 container.
+
+        This does not access blender, so it can also be used from other processes.
+
+        :param hdf5_path: The path of the .hdf5 container.
+        :param frame_data: The data of the frame, each key will be saved as its own key in the .hdf5 container.
+        :param stereo_separate_keys: If this is True, stereo images are saved in separate keys, e.g. colors_0 and
+                                     colors_1.
+        :param is_stereo: Whether the rendering was done in stereo mode.
+        :param blender_proc_version: The version of BlenderProc, which is stored in the container if given.
+        :param compression_settings: Maps keys or glob patterns to their compression settings, see
+                                     Hdf5CompressionUtility.get_dataset_options(). If None, gzip is used.
+        """
+        with h5py.File(hdf5_path, "w") as file:
+            # Go through all the output types
+            for key, data in frame_data.items():
+                if stereo_separate_keys and (is_stereo or data.shape[0] == 2):
+                    # stereo mode was activated
+                    _WriterUtility.write_to_hdf_file(file, key + "_0", data[0],
+                                                     compression_settings=compression_settings)
+                    _WriterUtility.write_to_hdf_file(file, key + "_1", data[1],
+                                                     compression_settings=compression_settings)
+                else:
+                    _WriterUtility.write_to_hdf_file(file, key, data, compression_settings=compression_settings)
+            if blender_proc_version is not None:
+                _WriterUtility.write_to_hdf_file(file, "blender_proc_version", np.string_(blender_proc_version))
+
+    @staticmethod
+    def write_to_hdf_file(file, key: str, data: Union[np.ndarray, list, dict], compression: str = "gzip",
+                          compression_settings: Optional[Dict[str, Dict[str, Any]]] = None):
         """ Adds the given data as a new entry to the given hdf5 file.
 
         :param file: The hdf5 file handle. Type: hdf5.File
         :param key: The key at which the data should be stored in the hdf5 file.
         :param data: The data to store.
+        :param compression: The compression to use, if no compression_settings are given.
+        :param compression_settings: Maps keys or glob patterns to their compression settings, see
+                                     Hdf5CompressionUtility.get_dataset_options().
         """
         if not isinstance(data, np.ndarray) and not isinstance(data, np.bytes_):
             if isinstance(data, (list, dict)):
@@ -362,4 +412,9 @@ def write_to_hdf_file(file, key: str, data: Union[np.ndarray, list, dict], compr
         if data.dtype.char == 'S':
             file.create_dataset(key, data=data, dtype=data.dtype)
         else:
-            file.create_dataset(key, data=data, compression=compression)
+            if compression_settings is None:
+                settings = {"compression": compression}
+            else:
+                settings = get_compression_settings(key, compression_settings)
+            data, options = get_dataset_options(data, settings)
+            file.create_dataset(key, data=data, **options)
@@ -0,0 +1,121 @@
+""" Benchmarks different compression settings on existing .hdf5 containers """
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Dict, Any, List
+
+import h5py
+import numpy as np
+
+from blenderproc.python.writer.Hdf5CompressionUtility import get_compression_settings, get_dataset_options
+
+# The compared settings, they can directly be used as compression_settings in bproc.writer.write_hdf5()
+default_candidates: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "gzip": {"*": {"compression": "gzip"}},
+    "gzip-1+shuffle": {"*": {"compression": "gzip", "compression_level": 1, "shuffle": True}},
+    "lzf": {"*": {"compression": "lzf"}},
+    "lzf+narrow": {
+        "distance": {"compression": "lzf", "shuffle": True, "dtype": "float16"},
+        "depth": {"compression": "lzf", "shuffle": True, "dtype": "float16"},
+        "*_segmaps": {"compression": "lzf", "dtype": "auto"},
+        "*": {"compression": "lzf"}
+    },
+    "blosc+narrow": {
+        "distance": {"compression": "blosc", "shuffle": True, "dtype": "float16"},
+        "depth": {"compression": "blosc", "shuffle": True, "dtype": "float16"},
+        "*_segmaps": {"compression": "blosc", "shuffle": True, "dtype": "auto"},
+        "*": {"compression": "blosc", "shuffle": True}
+    },
+    "zstd": {"*": {"compression": "zstd"}},
+    "none": {"*": {"compression": None}}
+}
+
+
+def load_frames(hdf5_paths: List[str]) -> List[Dict[str, np.ndarray]]:
+    """ Loads all numeric datasets of the given containers.
+
+    :param hdf5_paths: The paths of the .hdf5 containers.
+    :return: The datasets of each container.
+    """
+    frames = []
+    for hdf5_path in hdf5_paths:
+        with h5py.File(hdf5_path, "r") as file:
+            frames.append({key: np.array(file[key]) for key in file.keys()
+                           if file[key].dtype.kind in "biuf" and file[key].ndim > 0})
+    return frames
+
+
+def benchmark(frames: List[Dict[str, np.ndarray]], compression_settings: Dict[str, Dict[str, Any]],
+              temp_dir: str) -> Dict[str, float]:
+    """ Writes and reads all frames with the given settings.
+
+    :param frames: The datasets of each frame.
+    :param compression_settings: Maps keys or glob patterns to their compression settings.
+    :param temp_dir: The directory to write the containers to.
+    :return: The average bytes per frame and the write and read speed in MB/s of uncompressed data.
+    """
+    raw_bytes = sum(data.nbytes for frame in frames for data in frame.values())
+    paths = [os.path.join(temp_dir, f"{i}.hdf5") for i in range(len(frames))]
+
+    start = time.perf_counter()
+    for path, frame in zip(paths, frames):
+        with h5py.File(path, "w") as file:
+            for key, data in frame.items():
+                data, options = get_dataset_options(data, get_compression_settings(key, compression_settings))
+                file.create_dataset(key, data=data, **options)
+    write_time = time.perf_counter() - start
+    file_bytes = sum(os.path.getsize(path) for path in paths)
+
+    start = time.perf_counter()
+    for path in paths:
+        with h5py.File(path, "r") as file:
+            for key in file.keys():
+                file[key][()]
+    read_time = time.perf_counter() - start
+
+    for path in paths:
+        os.remove(path)
+    return {
+        "bytes_per_frame": file_bytes / len(frames),
+        "write_mb_per_s": raw_bytes / 1e6 / write_time,
+        "read_mb_per_s": raw_bytes / 1e6 / read_time
+    }
+
+
+def cli():
+    """
+    Command line function
+    """
+    parser = argparse.ArgumentParser("Benchmarks different compression settings on existing .hdf5 containers. "
+                                     "The speeds are given in MB of uncompressed data per second.")
+    parser.add_argument('hdf5_paths', nargs='+', help='Path to .hdf5 containers, which are used as sample data.')
+    parser.add_argument('--candidates', nargs='*', default=list(default_candidates.keys()),
+                        choices=list(default_candidates.keys()), help='The compression settings to compare.')
+    parser.add_argument('--repetitions', type=int, default=3, help='How often each benchmark is repeated, the '
+                                                                   'fastest run is reported.')
+    args = parser.parse_args()
+
+    hdf5_paths = []
+    for path in args.hdf5_paths:
+        if os.path.isdir(path):
+            hdf5_paths.extend(os.path.join(path, file_name) for file_name in sorted(os.listdir(path))
+                              if file_name.endswith(".hdf5"))
+        else:
+            hdf5_paths.append(path)
+    frames = load_frames(hdf5_paths)
+    if not frames:
+        raise RuntimeError("No .hdf5 containers have been found.")
+
+    print(f"{'settings':<16}{'bytes/frame':>14}{'write MB/s':>12}{'read MB/s':>12}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in args.candidates:
+            runs = [benchmark(frames, default_candidates[name], temp_dir) for _ in range(args.repetitions)]
+            print(f"{name:<16}{runs[0]['bytes_per_frame']:>14.0f}"
+                  f"{max(run['write_mb_per_s'] for run in runs):>12.1f}"
+                  f"{max(run['read_mb_per_s'] for run in runs):>12.1f}")
+
+
+if __name__ == "__main__":
+    cli()
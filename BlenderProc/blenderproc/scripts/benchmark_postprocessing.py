@@ -0,0 +1,108 @@
+""" Benchmarks the segmap noise removal and the oil paint filter on synthetic frames """
+
+import argparse
+import time
+from typing import Dict, Tuple, Callable
+
+import numpy as np
+
+from blenderproc.python.postprocessing.ImageFilterUtility import determine_noisy_pixels, fill_noisy_pixels, \
+    window_modes
+
+
+def create_frame(height: int, width: int, amount_of_objects: int, rng: np.random.Generator) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """ Creates a segmap with noisy object borders and a depth image, consisting of random rectangles.
+
+    :param height: The height of the frame.
+    :param width: The width of the frame.
+    :param amount_of_objects: The amount of rectangles.
+    :param rng: The random number generator.
+    :return: The segmap of shape [H, W, 3], scaled like the .exr segmaps, and the depth image of shape [H, W].
+    """
+    labels = np.zeros((height, width), dtype=np.int64)
+    depth = np.full((height, width), 10.0, dtype=np.float32)
+    for label in range(1, amount_of_objects + 1):
+        top, left = rng.integers(0, height), rng.integers(0, width)
+        bottom, right = top + rng.integers(5, max(6, height // 4)), left + rng.integers(5, max(6, width // 4))
+        labels[top:bottom, left:right] = label * 5
+        depth[top:bottom, left:right] = rng.uniform(1.0, 10.0)
+    segmap = (labels * 65536 / 37).astype(np.float32)
+
+    # blender interpolates the values at the borders of the objects
+    borders = np.zeros((height, width), dtype=bool)
+    borders[:, 1:] |= labels[:, 1:] != labels[:, :-1]
+    borders[1:] |= labels[1:] != labels[:-1]
+    noise = segmap + rng.uniform(1, 4, segmap.shape).astype(np.float32) * 65536 / 37
+    segmap = np.where(borders & (rng.random(segmap.shape) < 0.5), noise, segmap)
+    return np.repeat(segmap[:, :, np.newaxis], 3, axis=2), depth
+
+
+def remove_segmap_noise(segmap: np.ndarray):
+    """ Removes the noise of the given segmap, like bproc.postprocessing.remove_segmap_noise().
+
+    :param segmap: The segmap of shape [H, W, 3].
+    """
+    noisy_pixels = determine_noisy_pixels(segmap)
+    fill_noisy_pixels(segmap[:, :, 0], noisy_pixels)
+
+
+def oil_paint_filter(depth: np.ndarray, filter_size: int, edge_fraction: float):
+    """ Applies the oil paint filter, like bproc.postprocessing.oil_paint_filter(), on the given fraction of pixels.
+
+    :param depth: The depth image of shape [H, W].
+    :param filter_size: The filter size.
+    :param edge_fraction: The fraction of pixels, which are filtered. With edges_only these are the edge pixels.
+    """
+    pixels = np.flatnonzero(np.random.default_rng(0).random(depth.size) < edge_fraction)
+    window_modes(depth, filter_size, pixels // depth.shape[1], pixels % depth.shape[1])
+
+
+def benchmark(function: Callable[[], None], repetitions: int) -> float:
+    """ Runs the given function multiple times.
+
+    :param function: The function to run.
+    :param repetitions: How often the function is run.
+    :return: The time of the fastest run in milliseconds.
+    """
+    times = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def cli():
+    """
+    Command line function
+    """
+    parser = argparse.ArgumentParser("Benchmarks the segmap noise removal and the oil paint filter on synthetic "
+                                     "frames. The times are given in milliseconds per frame.")
+    parser.add_argument('--resolutions', nargs='+', default=["512x512", "1920x1080"],
+                        help='The resolutions of the frames as <width>x<height>.')
+    parser.add_argument('--objects', type=int, default=40, help='The amount of objects per frame.')
+    parser.add_argument('--filter_size', type=int, default=5, help='The filter size of the oil paint filter.')
+    parser.add_argument('--edge_fraction', type=float, default=0.1, help='The fraction of pixels, which are edges '
+                                                                         'for the oil paint filter with edges_only.')
+    parser.add_argument('--repetitions', type=int, default=3, help='How often each benchmark is repeated, the '
+                                                                   'fastest run is reported.')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'resolution':<12}{'noisy px':>10}{'segmap noise':>14}{'oil paint edges':>17}{'oil paint full':>16}")
+    for resolution in args.resolutions:
+        width, height = (int(value) for value in resolution.split("x"))
+        segmap, depth = create_frame(height, width, args.objects, rng)
+        results: Dict[str, float] = {
+            "noise": benchmark(lambda: remove_segmap_noise(segmap), args.repetitions),
+            "edges": benchmark(lambda: oil_paint_filter(depth, args.filter_size, args.edge_fraction),
+                               args.repetitions),
+            "full": benchmark(lambda: oil_paint_filter(depth, args.filter_size, 1.0), args.repetitions)
+        }
+        print(f"{resolution:<12}{int(np.sum(determine_noisy_pixels(segmap))):>10}{results['noise']:>14.1f}"
+              f"{results['edges']:>17.1f}{results['full']:>16.1f}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -28,10 +28,11 @@ def convert_hdf(base_file_path: str, output_folder: Optional[str] = None):
             with h5py.File(base_file_path, 'r') as data:
                 print(f"{base_file_path}:")
                 for key, val in data.items():
-                    val = np.array(val)
-                    if np.issubdtype(val.dtype, np.string_) or len(val.shape) == 1:
+                    # the metadata is skipped without reading it
+                    if np.issubdtype(val.dtype, np.string_) or len(val.shape) <= 1:
                         pass  # metadata
                     else:
+                        val = np.array(val)
                         print(f"key: {key} {val.shape} {val.dtype.name}")
 
                         if val.shape[0] != 2:
@@ -175,9 +175,11 @@ def vis_file(path, keys_to_visualize=None, rgb_keys=None, flow_keys=None, segmap
                 # Visualize every key
                 res = []
                 for key in keys:
-                    value = np.array(data[key])
+                    # only small datasets are read for the summary
+                    value = data[key]
 
                     if sum(ele for ele in value.shape) < 5 or "version" in key:
+                        value = np.array(value)
                         if value.dtype == "|S5":
                             res.append(
                                 (key, str(value).replace("[", "").replace("]", "").replace("b'", "").replace("'", "")))
@@ -1,42 +1,361 @@
+import argparse
+import json
+import os
+import queue
+import secrets
+import shutil
 import subprocess
 import sys
-import os
+import threading
+import time
+from multiprocessing.connection import Listener
+
 from tqdm import tqdm
 
 # set the folder in which the cli.py is located
 rerun_folder = os.path.abspath(os.path.dirname(__file__))
 
-# the first one is the rerun.py script, the last is the output
-used_arguments = sys.argv[3:-1]
 
-# this sets the amount of runs, which are performed
-amount_of_runs = int(sys.argv[1])
+class SceneManifest:
+    """ Keeps track of the state of all runs in an append-only json lines file.
+
+    Each run writes into a temporary folder first, which is only moved to its final place in the output location,
+    if the run succeeded. Like this, a run folder in the output location is always complete, even if rerun.py or the
+    machine crashed in between. The manifest records for each run its status, seed, timing and output files, which
+    allows to only redo missing or failed runs via --resume.
+    """
+
+    def __init__(self, output_location, manifest_path=None, seed=None):
+        """
+        :param output_location: The folder in which a sub folder per run is created.
+        :param manifest_path: The path of the manifest file. Per default, manifest.jsonl in the output location.
+        :param seed: If given, run i uses the random seed seed + i. Otherwise, a random seed is drawn for each run.
+        """
+        self.output_location = output_location
+        self.manifest_path = manifest_path if manifest_path is not None \
+            else os.path.join(output_location, "manifest.jsonl")
+        self._temp_location = os.path.join(output_location, ".incomplete")
+        self._seed = seed
+        self._lock = threading.Lock()
+        self.failed_runs = []
+
+    def finished_runs(self):
+        """ Determines all runs, which have been finished successfully in a previous call of rerun.py.
+
+        :return: The set of ids of all runs whose last record is a success and whose output folder still exists.
+        """
+        last_status = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # the last line might be incomplete, if rerun.py was killed while writing it
+                        continue
+                    last_status[record["run_id"]] = record["status"]
+        return {run_id for run_id, status in last_status.items()
+                if status == "success" and os.path.exists(self.run_location(run_id))}
+
+    def run_location(self, run_id):
+        """ Returns the final output folder of the given run.
+
+        :param run_id: The id of the run.
+        :return: The path of the output folder.
+        """
+        return os.path.join(self.output_location, str(run_id))
+
+    def start_run(self, run_id):
+        """ Prepares an empty temporary output folder for the given run and records its start.
+
+        :param run_id: The id of the run.
+        :return: The temporary output folder and the random seed, the run should use.
+        """
+        temp_location = os.path.join(self._temp_location, str(run_id))
+        # remove the leftovers of a previous crashed attempt
+        shutil.rmtree(temp_location, ignore_errors=True)
+        seed = self._seed + run_id if self._seed is not None else secrets.randbelow(2 ** 31)
+        self._record({"run_id": run_id, "status": "started", "seed": seed, "time": time.time()})
+        return temp_location, seed
+
+    def finish_run(self, run_id, success, duration):
+        """ Moves the output of a successful run to its final place and records the result.
+
+        :param run_id: The id of the run.
+        :param success: True, if the run finished successfully.
+        :param duration: The time in seconds the run took.
+        """
+        temp_location = os.path.join(self._temp_location, str(run_id))
+        output_files = []
+        if success:
+            # scripts which write their frames somewhere else, e.g. into shards, still get a run folder, so the run
+            # is known to be finished
+            os.makedirs(temp_location, exist_ok=True)
+            output_files = sorted(os.path.relpath(os.path.join(root, file_name), temp_location)
+                                  for root, _, file_names in os.walk(temp_location) for file_name in file_names)
+            final_location = self.run_location(run_id)
+            outdated_location = temp_location + ".outdated"
+            # the output of an older run of the same id is replaced by one rename
+            if os.path.exists(final_location):
+                os.replace(final_location, outdated_location)
+            os.replace(temp_location, final_location)
+            shutil.rmtree(outdated_location, ignore_errors=True)
+        else:
+            shutil.rmtree(temp_location, ignore_errors=True)
+        self._record({"run_id": run_id, "status": "success" if success else "failed", "time": time.time(),
+                      "duration": round(duration, 3), "output_files": output_files})
+        if not success:
+            with self._lock:
+                self.failed_runs.append(run_id)
+
+    def _record(self, record):
+        """ Appends the given record to the manifest and makes sure it is written to disk.
+
+        :param record: The record, which should be stored.
+        """
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+            with open(self.manifest_path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(record) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+
+def run_cold(run_ids, used_arguments, manifest, threads_per_worker=0):
+    """ Starts a new BlenderProc process for each run, one after another.
+
+    :param run_ids: The ids of the runs, which should be performed.
+    :param used_arguments: The script and its arguments, without the output location.
+    :param manifest: The manifest, which determines the output folders and records the results.
+    :param threads_per_worker: The amount of cpu cores each run is pinned to, 0 means no limit.
+    """
+    for run_id in tqdm(run_ids):
+        # in each run, the arguments are reused
+        cmd_render = ["python", os.path.join(rerun_folder, "cli.py")]
+        cmd_render.extend(["run"])
+        cmd_render.extend(used_arguments)
+        # the only exception is the output, which gets changed for each run, so that the examples are not overwritten
+        new_location, seed = manifest.start_run(run_id)
+        cmd_render.append(new_location)
+        # uncomment next line if you dont wish to see blenderproc prints
+        #cmd_render.append("> /dev/null")
+        print(" ".join(cmd_render))
+        used_environment = worker_environment(threads_per_worker)
+        used_environment["BLENDER_PROC_RANDOM_SEED"] = str(seed)
+        start_time = time.time()
+        return_code = subprocess.call(" ".join(cmd_render), shell=True, env=used_environment,
+                                      preexec_fn=pin_to_cpu_cores(0, threads_per_worker))
+        manifest.finish_run(run_id, return_code == 0, time.time() - start_time)
+
+
+def run_worker_pool(run_ids, used_arguments, manifest, amount_of_workers, threads_per_worker=0):
+    """ Starts long-living Blender processes, which each pull runs from a shared queue.
+
+    Each worker only pays the Blender startup once and resets the scene between two runs, see rerun_worker.py.
+    If a worker dies during a run, the run is counted as failed and a new worker is started for the remaining runs.
+
+    :param run_ids: The ids of the runs, which should be performed.
+    :param used_arguments: The script and its arguments, without the output location.
+    :param manifest: The manifest, which determines the output folders and records the results.
+    :param amount_of_workers: The amount of Blender processes, which run at the same time.
+    :param threads_per_worker: The amount of cpu cores each worker is pinned to, 0 means no limit.
+    """
+    jobs = queue.Queue()
+    for run_id in run_ids:
+        jobs.put(run_id)
+    progress_bar = tqdm(total=len(run_ids))
+    # only processes started by this script are allowed to connect
+    authkey = secrets.token_bytes(32)
+    if threads_per_worker > 0 and amount_of_workers * threads_per_worker > len(_available_cpu_cores()):
+        print(f"Warning: {amount_of_workers} workers with {threads_per_worker} threads need more than the "
+              f"{len(_available_cpu_cores())} available cpu cores, some workers will share cores.")
+
+    def on_finished(run_id, success, duration):
+        manifest.finish_run(run_id, success, duration)
+        progress_bar.update(1)
+
+    workers = [threading.Thread(target=_serve_worker, args=(worker_id, jobs, used_arguments, manifest,
+                                                             authkey, threads_per_worker, on_finished))
+               for worker_id in range(amount_of_workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    progress_bar.close()
+
+
+def worker_environment(threads_per_worker):
+    """ Creates the environment of a BlenderProc process, which should only use the given amount of threads.
+
+    :param threads_per_worker: The amount of threads the process should use, 0 means no limit.
+    :return: The environment for the process.
+    """
+    used_environment = dict(os.environ)
+    if threads_per_worker > 0:
+        # read by bproc.init(), which then sets the amount of threads used for rendering
+        used_environment["BLENDER_PROC_CPU_THREADS"] = str(threads_per_worker)
+        # also limit the thread pools of numpy, opencv and co.
+        used_environment["OMP_NUM_THREADS"] = str(threads_per_worker)
+    return used_environment
+
+
+def pin_to_cpu_cores(worker_id, threads_per_worker):
+    """ Creates a function, which pins the calling process to the cpu cores of the given worker.
+
+    Each worker gets its own consecutive block of cores, as long as there are enough cores for all workers.
+    Blender and all its child processes inherit the pinning.
+
+    :param worker_id: The id of the worker.
+    :param threads_per_worker: The amount of cores each worker gets, 0 means no pinning.
+    :return: The function, which can be used as preexec_fn of subprocess or None, if no pinning should be done.
+    """
+    if threads_per_worker <= 0 or not hasattr(os, "sched_setaffinity"):
+        return None
+    available_cores = _available_cpu_cores()
+    first_core = worker_id * threads_per_worker
+    cores = {available_cores[(first_core + i) % len(available_cores)] for i in range(threads_per_worker)}
+    return lambda: os.sched_setaffinity(0, cores)
+
+
+def _available_cpu_cores():
+    """ Returns the sorted list of cpu cores, this process is allowed to run on. """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count()))
+
+
+def _serve_worker(worker_id, jobs, used_arguments, manifest, authkey, threads_per_worker, on_finished):
+    """ Keeps one Blender worker alive and sends it runs, until the queue is empty.
+
+    :param worker_id: The id of this worker, determines the cpu cores it is pinned to.
+    :param jobs: The queue of run ids, which still have to be performed.
+    :param used_arguments: The script and its arguments, without the output location.
+    :param manifest: The manifest, which determines the output folders of the runs.
+    :param authkey: The key the worker has to use to connect.
+    :param threads_per_worker: The amount of cpu cores the worker is pinned to, 0 means no limit.
+    :param on_finished: Is called with the run id, the success and the duration of each finished run.
+    """
+    used_environment = worker_environment(threads_per_worker)
+    used_environment["BLENDER_PROC_WORKER_AUTHKEY"] = authkey.hex()
+    while not jobs.empty():
+        with Listener(("localhost", 0), authkey=authkey) as listener:
+            host, port = listener.address
+            cmd_worker = ["python", os.path.join(rerun_folder, "cli.py"), "run",
+                          os.path.join(rerun_folder, "rerun_worker.py"), f"{host}:{port}"]
+            cmd_worker.extend(used_arguments)
+            print(" ".join(cmd_worker))
+            # pylint: disable=consider-using-with
+            process = subprocess.Popen(cmd_worker, env=used_environment,
+                                       preexec_fn=pin_to_cpu_cores(worker_id, threads_per_worker))
+            # pylint: enable=consider-using-with
+            connection = _accept_worker(listener, process)
+            if connection is None:
+                print(f"Worker {worker_id} stopped before it was ready, no further runs are given to it.")
+                return
+            with connection:
+                _send_jobs(connection, jobs, manifest, on_finished)
+        process.wait()
 
-# init runs
-starting_run_id = int(sys.argv[2])
 
-print("starting at ", starting_run_id)
+def _accept_worker(listener, process):
+    """ Waits until the given worker process has connected to the listener.
 
-output_location = os.path.abspath(sys.argv[-1])
-for run_id in tqdm(range(amount_of_runs)):
-    # in each run, the arguments are reused
-    cmd_render = ["python", os.path.join(rerun_folder, "cli.py")]
-    cmd_render.extend(["run"])
-    cmd_render.extend(used_arguments)
-    # the only exception is the output, which gets changed for each run, so that the examples are not overwritten
-    new_location = os.path.join(output_location, str(run_id + starting_run_id))
-    cmd_render.append(new_location)
-    # uncomment next line if you dont wish to see blenderproc prints
-    #cmd_render.append("> /dev/null")
-    print(" ".join(cmd_render))
-    subprocess.call(" ".join(cmd_render), shell=True)
+    :param listener: The listener, the worker connects to.
+    :param process: The started worker process.
+    :return: The connection to the worker or None, if the process stopped before connecting.
+    """
+    accepted = queue.Queue()
 
+    def accept():
+        try:
+            accepted.put(listener.accept())
+        except (OSError, EOFError):
+            pass
 
+    threading.Thread(target=accept, daemon=True).start()
+    while True:
+        try:
+            return accepted.get(timeout=1)
+        except queue.Empty:
+            if process.poll() is not None:
+                return None
 
-    
 
+def _send_jobs(connection, jobs, manifest, on_finished):
+    """ Hands out runs to one connected worker until the queue is empty or the worker dies.
 
+    :param connection: The connection to the worker.
+    :param jobs: The queue of run ids, which still have to be performed.
+    :param manifest: The manifest, which determines the output folders of the runs.
+    :param on_finished: Is called with the run id, the success and the duration of each finished run.
+    """
+    current_run_id, current_start_time = None, None
+    while True:
+        try:
+            # the worker either reports that it is ready or the result of the last run
+            result = connection.recv()
+        except EOFError:
+            # the blender process died during the current run
+            if current_run_id is not None:
+                on_finished(current_run_id, False, time.time() - current_start_time)
+            return
+        if result is not None:
+            run_id, success, duration = result
+            print(f"Run {run_id} {'finished' if success else 'failed'} after {duration:.1f}s")
+            on_finished(run_id, success, duration)
+        try:
+            current_run_id = jobs.get_nowait()
+        except queue.Empty:
+            # no runs left, let the worker shut down
+            connection.send(None)
+            return
+        current_start_time = time.time()
+        connection.send((current_run_id, *manifest.start_run(current_run_id)))
 
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the given BlenderProc script multiple times, the output of "
+                                                 "each run is written into its own sub folder of the output folder. "
+                                                 "Options have to be given before the amount of runs.")
+    parser.add_argument("amount_of_runs", type=int, help="The amount of runs, which are performed.")
+    parser.add_argument("starting_run_id", type=int, help="The id of the first run, it determines the name of "
+                                                          "the output sub folder.")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="If bigger than zero, this amount of long-living Blender processes is started, which "
+                             "generate scenes at the same time without restarting Blender. Otherwise, a new "
+                             "BlenderProc process is started for each run, one after another.")
+    parser.add_argument("--threads-per-worker", dest="threads_per_worker", type=int, default=0,
+                        help="If bigger than zero, each worker is pinned to its own set of this many cpu cores and "
+                             "renders with this amount of threads. By default, all cores are used.")
+    parser.add_argument("--resume", action="store_true",
+                        help="If set, runs which have been finished successfully according to the manifest are "
+                             "skipped, so only missing or failed runs are performed.")
+    parser.add_argument("--manifest", default=None,
+                        help="The path of the manifest, which records the state of each run. Per default, "
+                             "manifest.jsonl in the output folder is used.")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="If given, run i uses the random seed seed + i, which makes runs reproducible. Otherwise, "
+                             "a random seed is drawn for each run. The used seed is stored in the manifest.")
+    parser.add_argument("arguments", nargs=argparse.REMAINDER,
+                        help="The python script and its arguments, the last argument is the output folder.")
+    args = parser.parse_args()
 
+    # the last argument is the output, the others are reused in each run
+    used_arguments = args.arguments[:-1]
+    output_location = os.path.abspath(args.arguments[-1])
+    manifest = SceneManifest(output_location, args.manifest, args.seed)
+    run_ids = list(range(args.starting_run_id, args.starting_run_id + args.amount_of_runs))
+    if args.resume:
+        finished_runs = manifest.finished_runs()
+        print(f"Skipping {len(finished_runs.intersection(run_ids))} already finished runs")
+        run_ids = [run_id for run_id in run_ids if run_id not in finished_runs]
 
+    print("starting at ", args.starting_run_id)
+    if args.workers > 0:
+        run_worker_pool(run_ids, used_arguments, manifest, args.workers, args.threads_per_worker)
+    else:
+        run_cold(run_ids, used_arguments, manifest, args.threads_per_worker)
+    if manifest.failed_runs:
+        print(f"{len(manifest.failed_runs)} runs failed: {sorted(manifest.failed_runs)}, "
+              f"call again with --resume to redo them")
+        sys.exit(1)
@@ -0,0 +1,52 @@
+""" A long-living worker, which generates multiple scenes inside of one Blender process.
+
+This script is started by rerun.py via "cli.py run" if a worker pool is used. It connects to the given address,
+receives the output directories of the scenes it should generate and runs the given python script once per scene.
+Between two scenes, Blender and BlenderProc are reset, so the script sees the same state as in a fresh process.
+"""
+import blenderproc as bproc  # pylint: disable=unused-import
+
+# pylint: disable=wrong-import-order
+import os
+import sys
+import time
+import runpy
+import traceback
+from multiprocessing.connection import Client
+
+from blenderproc.python.utility.Initializer import reset
+# pylint: enable=wrong-import-order
+
+# the first argument is the address of the rerun.py process, then the script and its arguments follow
+host, port = sys.argv[1].rsplit(":", 1)
+script_path = sys.argv[2]
+used_arguments = sys.argv[3:]
+
+authkey = bytes.fromhex(os.environ["BLENDER_PROC_WORKER_AUTHKEY"])
+with Client((host, int(port)), authkey=authkey) as connection:
+    # tell rerun.py that this worker is ready for the first scene
+    connection.send(None)
+    while True:
+        job = connection.recv()
+        if job is None:
+            break
+        run_id, output_location, seed = job
+        # read by bproc.init()
+        os.environ["BLENDER_PROC_RANDOM_SEED"] = str(seed)
+
+        # the script sees the same arguments as in a cold "cli.py run" call
+        sys.argv = [script_path] + used_arguments + [output_location]
+        start_time = time.time()
+        try:
+            runpy.run_path(script_path, run_name="__main__")
+            success = True
+        except SystemExit as e:
+            success = e.code in [None, 0]
+        except Exception:  # pylint: disable=broad-except
+            traceback.print_exc()
+            success = False
+        duration = time.time() - start_time
+
+        # start the next scene from the factory settings, the user script calls bproc.init() again
+        reset()
+        connection.send((run_id, success, duration))
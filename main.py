@@ -1,12 +1,14 @@
 import blenderproc as bproc
 import argparse
+import json
 import numpy as np
 import random
 import os
 import glob
 from pathlib import Path
 
-os.environ["CUDA_VISIBLE_DEVICES"] = "4"
+# can be overwritten from outside, e.g. to give each worker of rerun.py its own gpu
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "4")
 
 ####-------------Used Costum Functions------------------####
 
@@ -35,16 +37,22 @@ parser.add_argument('cc_material_path', nargs='?', default="resources/cctextures
 parser.add_argument('objects_dir', nargs='?', default="resources/haven_objects", help="Path to the opaque objects")
 parser.add_argument('transparent_shader_path', nargs='?', default="resources/material", help="Path to the downloaded transparent shader")
 parser.add_argument('output_dir', nargs='?', default="./output", help="Path to where the final files, will be saved")
+parser.add_argument('--shards_dir', default=None, help="If given, the frames are appended to the shards in this folder instead of being written to the output_dir")
 args = parser.parse_args()
 
 bproc.init()
 
-bproc.renderer.set_cpu_threads(8)
+# rerun.py --threads-per-worker already set the threads via BLENDER_PROC_CPU_THREADS in bproc.init()
+if "BLENDER_PROC_CPU_THREADS" not in os.environ:
+    bproc.renderer.set_cpu_threads(8)
 
 ####-------------Random Room construct-----------####
 
 # Load materials and objects that can be placed into the room
-materials = bproc.loader.load_ccmaterials(args.cc_material_path, ["Bricks", "Wood", "Carpet", "Tile", "Marble"])
+# the textures are only loaded for the few materials, which are used by the room, right before rendering
+# 1K maps are sufficient for the 512x512 renderings
+materials = bproc.loader.load_ccmaterials(args.cc_material_path, ["Bricks", "Wood", "Carpet", "Tile", "Marble"],
+                                          lazy=True, texture_resolution="1K")
 
 paths = get_blends_paths(args.furniture_dir)
 random_path_fun = random.choice(paths)
@@ -63,21 +71,26 @@ interior_objects = []
 amount_objects = random.randint(3, 6)
 for i in range(amount_objects):
     random_path = random.choice(paths)
-    opaque_object = bproc.loader.load_blend(random_path)
+    # the same .blend file is often drawn multiple times, so it is only loaded once and then instanced
+    opaque_object = bproc.loader.load_blend(random_path, use_cache=True)
     interior_objects.extend(opaque_object)
 
-# Define a function that samples the pose of a given object
-def sample_pose(obj: bproc.types.MeshObject):
-    # Sample the spheres location above the surface
-    obj.set_location(bproc.sampler.upper_region(
-        objects_to_sample_on=furniture,
-        min_height=0.1,
-        max_height=0.3,
-        use_ray_trace_check=False
-    ))
-    obj.set_rotation_euler(np.random.uniform([0, 0, 0], [np.pi * 2, np.pi * 2, np.pi * 2]))
+# The regions above the furniture only have to be determined once for all objects
+upper_region_sampler = bproc.sampler.UpperRegionSampler(
+    objects_to_sample_on=furniture,
+    min_height=0.1,
+    max_height=0.3,
+    use_ray_trace_check=False
+)
+
+# Define a function that samples candidate poses of a given object
+def sample_poses(obj: bproc.types.MeshObject, amount: int):
+    # Sample the spheres locations above the surface
+    locations = upper_region_sampler.sample(amount)
+    rotations = np.random.uniform([0, 0, 0], [np.pi * 2, np.pi * 2, np.pi * 2], size=(amount, 3))
+    return locations, rotations
 
-placed_objects = bproc.object.sample_poses_on_surface(interior_objects, furniture[0], sample_pose, max_tries=30, min_distance=0.05, max_distance=0.4)
+placed_objects = bproc.object.sample_poses_on_surface_batched(interior_objects, furniture[0], sample_poses, max_tries=30, min_distance=0.05, max_distance=0.4)
 
 if len(placed_objects) ==0 :
     raise Exception("Could not place any object on furniture: ", random_path_fun)
@@ -102,6 +115,8 @@ for inObjOpaq in placed_objects:
         if np.random.uniform(0, 1) <= 0.75:
             inObjOpaq.set_cp("category_id", 1)
             material = random.choice(materials)
+            # the mesh is shared with the other instances of the same .blend file
+            inObjOpaq.make_mesh_single_user()
             for i in range(len(inObjOpaq.get_materials())):   
                 # Replace the material with a transmissive one
                 inObjOpaq.set_material(i, material)    
@@ -109,7 +124,8 @@ for inObjOpaq in placed_objects:
 bproc.object.simulate_physics_and_fix_final_poses(
     min_simulation_time=2,
     max_simulation_time=5,
-    check_object_interval=1
+    check_object_interval=1,
+    settle_incrementally=True
 )
 
 # poses_dict needs to be converted as Vector object is not serializable
@@ -146,21 +162,19 @@ bvh_tree = bproc.object.create_bvh_tree_multi_objects(placed_objects)
 # Determine point of interest in scene as the object closest to the mean of a subset of objects
 poi = bproc.object.compute_poi(placed_objects)
 furniture_loc = furniture[0].get_location()
-poses = 0
-tries = 0
-while tries < 10000 and poses < 10:
+
+
+def propose_camera_poses(amount):
     # Compute rotation based on vector going from location towards poi
-    location = furniture_loc + np.random.uniform([-1.0, -1.0, 1.0], [1.0, 1.0, 1.0])
-    rotation_matrix = bproc.camera.rotation_from_forward_vec(poi - location)
-    # Add homog cam pose based on location an rotation
-    cam2world_matrix = bproc.math.build_transformation_mat(location, rotation_matrix)
+    locations = furniture_loc + np.random.uniform([-1.0, -1.0, 1.0], [1.0, 1.0, 1.0], size=(amount, 3))
+    # Build homog cam poses based on location an rotation
+    return np.stack([bproc.math.build_transformation_mat(location, bproc.camera.rotation_from_forward_vec(poi - location))
+                     for location in locations])
+
 
-    # Check that obstacles are at least 0.3 meter away from the camera and make sure the view interesting enough
-    if bproc.camera.perform_obstacle_in_view_check(cam2world_matrix, {"min": 0.4}, bvh_tree):
-        # Persist camera pose
-        bproc.camera.add_camera_pose(cam2world_matrix)
-        poses += 1
-    tries += 1
+# Check that obstacles are at least 0.4 meter away from the camera, the accepted poses are added to the scene
+bproc.camera.sample_valid_poses(10, propose_camera_poses, [bproc.camera.ProximityCheck({"min": 0.4}, bvh_tree)],
+                                batch=64, max_tries=10000)
 
 
 
@@ -170,32 +184,49 @@ while tries < 10000 and poses < 10:
 bproc.renderer.enable_distance_output(activate_antialiasing=False)
 bproc.renderer.set_light_bounces(max_bounces=200, diffuse_bounces=200, glossy_bounces=200, transmission_bounces=200, transparent_max_bounces=200)
 
-# render the whole pipeline
-data = bproc.renderer.render()
-
-# Render segmentation masks (per class and per instance)
-trans_map = bproc.renderer.render_segmap(map_by=["class"])
-data.update(trans_map)
-
-
-for inObjOpaq in placed_objects:
-    inObjOpaq.set_cp("category_id", 1)
-
+# render the segmentation masks in the same pass, a threshold of zero gives the transmissive objects their own ids
+bproc.renderer.enable_segmentation_output(map_by=["instance", "class"], default_values={"category_id": 0},
+                                          pass_alpha_threshold=0)
 
+# the relabelled class of each object, which is stored under the instance key, the rendered class maps keep the
+# category ids from above. A separate property is used, so the frames can be relabelled right after rendering them.
+for obj in placed_objects + furniture:
+    obj.set_cp("relabelled_category_id", 1)
 for obj in room_objects:
-    obj.set_cp("category_id", 0)
-
-for obj in furniture:
-    obj.set_cp("category_id", 1)
-
-
-d = bproc.renderer.render_segmap(map_by=["class"])
-s = bproc.renderer.render_segmap(map_by=["instance"])
-
-s['instance_segmaps'] = d['class_segmaps']
-data.update(s)
-
-
-# write the data to a .hdf5 container
-bproc.writer.write_hdf5(args.output_dir, data)
-
+    obj.set_cp("relabelled_category_id", 0)
+
+
+def relabel_frame(frame_data: dict) -> dict:
+    """ Replaces the instance segmap of the rendered frame by the relabelled classes of the objects. """
+    relabelled = bproc.renderer.map_instance_segmaps([frame_data["instance_segmaps"]],
+                                                     [frame_data["instance_attribute_maps"]],
+                                                     map_by="cp_relabelled_category_id",
+                                                     default_values={"cp_relabelled_category_id": 0})
+    frame_data["instance_segmaps"] = relabelled["cp_relabelled_category_id_segmaps"][0]
+    return frame_data
+
+
+# write the data to .hdf5 containers, the frames are compressed in parallel
+# lzf is much faster to decode than gzip, distances and segmaps are stored in smaller dtypes
+compression_settings = {
+    "distance": {"compression": "lzf", "shuffle": True, "dtype": "float16"},
+    "*_segmaps": {"compression": "lzf", "dtype": "auto"},
+    "*": {"compression": "lzf"}
+}
+if args.shards_dir is not None:
+    # all runs append to the same large shards, the scenes are identified by their output folder
+    data = {}
+    def collect_frame(frame_data: dict):
+        for key, value in relabel_frame(frame_data).items():
+            data.setdefault(key, []).append(value)
+    bproc.renderer.render(frame_callback=collect_frame)
+    records = bproc.writer.write_shards(args.shards_dir, data,
+                                        scene_id=os.path.basename(os.path.normpath(args.output_dir)),
+                                        compression_settings=compression_settings)
+    # the run folder records where the frames have been written, so rerun.py --resume knows the scene is done
+    with open(os.path.join(args.output_dir, "shard_records.json"), "w", encoding="utf-8") as file:
+        json.dump(records, file)
+else:
+    # each frame is written in the background, while the next one is rendered
+    with bproc.writer.Hdf5StreamWriter(args.output_dir, compression_settings=compression_settings) as writer:
+        bproc.renderer.render(frame_callback=lambda frame_data: writer.write_frame(relabel_frame(frame_data)))